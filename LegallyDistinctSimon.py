@@ -1,26 +1,79 @@
+import argparse
+import atexit
+import functools
 import os
 import random
+import signal
+import subprocess
+import sys
 import time
 import typing
 from enum import Enum
 
-import gpiozero
-import pygame
-import serial
-import subprocess
-import json
-import datetime
+# pygame, gpiozero and numpy only get imported once something needs them (the sound
+# loader, the buttons), so the pawbeans can light up before any of that is done
+from boot import BootTimer, sd_notify
+from button_events import ButtonEvent, ButtonEvents
+from cheat_codes import CheatCodeMatcher, MatchState
+from game_store import GameStore
+from hardware import Cabinet, PiHardware, SimulatedHardware
+from media_player import MediaPlayer
+from metrics import GameMetrics
+from pawbeans import NUM_BEANS, Framebuffer, encode_anim, encode_on, encode_quiet
+from recording import GameRecording, new_seed
+from serial_link import SerialLink
+from sound_registry import AudioConfig, SoundRegistry
+from timeline import Scheduler, Timeline
+from tracing import TRACER
 
 DEBUG=False
-NUM_BEANS = 4
+# Mix each SAY sequence into one sound up front (needs numpy) instead of playing bean by bean
+PRERENDERED_SAY_AUDIO = False
+# Open the mixer with LOW_LATENCY_AUDIO_CONFIG instead of AUDIO_CONFIG, see below
+LOW_LATENCY_AUDIO = False
+# Level, high score and leaderboard on the attached display, see scoreboard.py
+SHOW_SCOREBOARD = False
 
 #           RED          GREEN      BLUE     YELLOW
 COLORS = ('255 0 0', '0 255 0', '0 0 255', '255 255 0')
 
-BUTTONS = [ gpiozero.Button("GPIO23", bounce_time=0.01),
-            gpiozero.Button("GPIO22", bounce_time=0.01),
-            gpiozero.Button("GPIO17", bounce_time=0.01),
-            gpiozero.Button("GPIO27", bounce_time=0.01) ]
+# Speedrun mode's sanic swarm: an xpenguins theme, drawn by sprite_overlay.py in one process
+SANIC_THEME = "Sonic the Hedgehog"
+SPRITE_OVERLAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sprite_overlay.py")
+# What throttle_overlay() sends it, see launch_overlay()
+OVERLAY_SIGNALS = {signal.SIGUSR1, signal.SIGUSR2}
+
+# Dim white on every bean from the moment the serial port opens until attract mode takes over
+BOOT_COLOR = '32 32 32'
+# Seconds from the process starting to attract mode, see boot.py. Over it and the boot report says so
+BOOT_BUDGET = 2.0
+BOOT = BootTimer(BOOT_BUDGET)
+
+# Where the buttons are wired, in bean order, and where the pawbeans are plugged in
+BUTTON_PINS = ("GPIO23", "GPIO22", "GPIO17", "GPIO27")
+SERIAL_PORT = "/dev/ttyUSB0"
+# The same thing for simon_async.py and cabinets.py, which can drive more than one
+CABINET = Cabinet("", BUTTON_PINS, SERIAL_PORT)
+
+# The buttons don't exist until main() asks the hardware for them, so importing this file
+# on something that isn't a Pi doesn't blow up
+HARDWARE = None
+BUTTONS = []
+
+# Everything that waits on a player reads edges from here instead of spinning on the pins
+BUTTON_EVENTS = None
+
+# The one mplayer blue and ogre mode's videos go through, see media_player.py
+MEDIA_PLAYER = None
+
+# The scoreboard.Scoreboard when SHOW_SCOREBOARD is on, None otherwise
+SCOREBOARD = None
+
+# How long (in seconds) the player gets to press the next button, and to enter a cheat code
+TIMEOUT_VALUE = 10
+CHEAT_TIMEOUT_VALUE = 3
+# After a code that's also the start of a longer code, how long we wait to see if they keep going
+CHEAT_TAIL_TIMEOUT_VALUE = 0.75
 
 # Cheat mode strings with passwords as lists
 CHEAT_MODES = {
@@ -32,6 +85,105 @@ CHEAT_MODES = {
     "speedrun_mode": [2,3,1,4],
 }
 
+CHEAT_MATCHER = CheatCodeMatcher(CHEAT_MODES)
+
+# Games, scores, cheat modes and where the time goes, for Prometheus, see metrics.py.
+# HOST:PORT or unix:PATH (--metrics), None for no endpoint
+METRICS = GameMetrics(CHEAT_MODES)
+METRICS_ADDRESS = "127.0.0.1:9464"
+
+
+# The four bean sounds for each mode, relative to this file. A string means "every file in that directory".
+# Dog and cat mode only come from here without numpy, see VOICED_MODES.
+SOUNDBOARDS = {
+    "normal": "sounds",
+    "dog_mode": [
+        "espeak_sounds/normal/espeak_woof_p0_a200.wav",
+        "espeak_sounds/normal/espeak_woof_p50_a200.wav",
+        "espeak_sounds/normal/espeak_woof_p75_a200.wav",
+        "espeak_sounds/normal/espeak_woof_p100_a200.wav",
+    ],
+    "cat_mode": [
+        "espeak_sounds/normal/espeak_meow_p0_a200.wav",
+        "espeak_sounds/normal/espeak_meow_p50_a200.wav",
+        "espeak_sounds/normal/espeak_meow_p75_a200.wav",
+        "espeak_sounds/normal/espeak_meow_p100_a200.wav",
+    ],
+    "ogre_mode": [
+        "ogre_sounds/swamp.wav",
+        "ogre_sounds/donkey.wav",
+        "ogre_sounds/layers.wav",
+        "ogre_sounds/onions.wav",
+    ],
+}
+
+# One espeak recording per word (the default -p 50), every other pitch gets made from it, see sound_variants.py
+ESPEAK_WORDS = {
+    word: f"espeak_sounds/normal/espeak_{word}_p50_a200.wav"
+    for word in ("bark", "dook", "meow", "merp", "owo", "rawr", "ribbit", "uwu", "woof")
+}
+# There's a sweary one in espeak_sounds/fail too, but kids play this thing
+FAIL_WORDS = {
+    word: f"espeak_sounds/fail/espeak_{word}_p50_a200.wav"
+    for word in ("extremely incorrect buzzer sound", "fail", "incorrect", "nope", "womp womp", "wrong")
+}
+# Modes whose board is one word at four pitches, and that get a random fail cue instead of the buzzer
+VOICED_MODES = {
+    "dog_mode": "woof",
+    "cat_mode": "meow",
+}
+
+SOUND_EFFECTS = {
+    "game_over": "buzzer_3.wav",
+    "cheat_unlocked": "zelda_secret.wav",
+}
+
+# Generated pitch variants we keep around before the least recently played get dropped
+SOUND_VARIANT_MEMORY_BUDGET = 2 * 1024 * 1024
+
+# What the mixer gets opened with. pygame's default 512 sample buffer at 8kHz is 64ms of
+# audio queued up between the flash and the tone. The low latency one runs at the espeak
+# clips' own rate with a much smaller buffer, scripts/audio_latency.py finds the smallest
+# buffer the sound card keeps up with.
+AUDIO_CONFIG = AudioConfig(frequency=8000, size=-16, channels=2, buffer=512)
+LOW_LATENCY_AUDIO_CONFIG = AudioConfig(frequency=22050, size=-16, channels=1, buffer=256)
+
+# Decoded audio we're willing to keep around for the cheat mode packs before the least recently used gets dropped
+SOUND_MEMORY_BUDGET = 8 * 1024 * 1024
+
+# WAVs already at the mixer's rate, from scripts/build_assets.py sounds. Anything not in
+# there (or older than its WAV) gets converted as it's decoded, like it always did.
+SOUND_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "asset_cache", "sounds")
+
+# Plays SAY sequences on monotonic deadlines, so 50ms speedrun flashes really are 50ms
+SCHEDULER = Scheduler()
+
+# Every game played, for high scores and bragging rights
+STORE = GameStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "games.sqlite3"))
+
+# The game being played, seed, sequence and every button edge, see recording.py. Saved at
+# game over when RECORDINGS_DIR is set (--record), scripts/replay.py plays them back.
+RECORDING = None
+RECORDINGS_DIR = None
+
+SOUNDS = SoundRegistry(
+    root_dir=os.path.dirname(os.path.abspath(__file__)),
+    soundboards=SOUNDBOARDS,
+    effects=SOUND_EFFECTS,
+    memory_budget=SOUND_MEMORY_BUDGET,
+    audio=LOW_LATENCY_AUDIO_CONFIG if LOW_LATENCY_AUDIO else AUDIO_CONFIG,
+    # One channel per bean, so a bean's tone never waits on the mixer finding a free one
+    reserved_channels=NUM_BEANS,
+    cache_dir=SOUND_CACHE_DIR,
+)
+
+# Latency spans, see tracing.py. Set SIMON_TRACE=1 to record them.
+SOUND_PLAY_SPAN = TRACER.span("sound_play")
+SOUND_WAIT_SPAN = TRACER.span("sound_wait")
+PRESS_TO_DEQUEUE_SPAN = TRACER.span("press_to_dequeue")
+PRESS_TO_LIGHT_SPAN = TRACER.span("press_to_light_set")
+PRESS_TO_SOUND_SPAN = TRACER.span("press_to_sound_play")
+
 
 class BeanColors(Enum):
     red = COLORS[0]
@@ -41,303 +193,316 @@ class BeanColors(Enum):
     off = "0 0 0"
 
 
-def light_command(ser, command):
-    if DEBUG:
-        print(time.time(), "LIGHT:", command)
-    ser.write(command.encode("latin1"))
-    ser.flush()
+def play_sound(sound, channel=None):
+    """Plays on the given channel if there is one, whatever's free if not. Returns the channel."""
+    started = TRACER.begin()
+    if channel is not None:
+        channel.play(sound)
+    else:
+        channel = sound.play()
+    TRACER.end(SOUND_PLAY_SPAN, started)
+    return channel
 
 
-def get_soundboard():
-    """Play an audio file as a buffered sound sample
+def bean_channel(index):
+    """The mixer channel reserved for a 1-indexed bean"""
+    return SOUNDS.channel(index - 1)
 
-    :param str file_path: audio file (default data/secosmic_low.wav)
-    """
-    # choose a desired audio format
-    pygame.mixer.init(8000)  # raises exception on fail
 
-    # load the sounds
-    sounds = []
-    root_dir = os.path.dirname(__file__)
-    sounds_directory = os.path.join(root_dir, "sounds")
-    for f in os.listdir(sounds_directory):
-        sounds.append(pygame.mixer.Sound(os.path.join(sounds_directory, f)))
+def wait_for_sound(channel):
+    # poll until finished playing sound
+    started = TRACER.begin()
+    while channel.get_busy():
+        time.sleep(0.01)
+    TRACER.end(SOUND_WAIT_SPAN, started)
 
-    return sounds
 
 
-def get_dog_soundboard():
-    """Play an audio file as a buffered sound sample, but with dogs
+def get_soundboard():
+    """The normal soundboard, straight out of the sound registry"""
+    return SOUNDS.soundboard("normal")
 
-    :param str file_path: audio file (default data/secosmic_low.wav)
-    """
-    # choose a desired audio format
-    pygame.mixer.init(8000)  # raises exception on fail
 
-    # load the sounds
-    sounds = []
-    root_dir = os.path.dirname(__file__)
-    sounds_directory = os.path.join(root_dir, "espeak_sounds/normal")
-    sounds = [
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_woof_p0_a200.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_woof_p50_a200.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_woof_p75_a200.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_woof_p100_a200.wav")),
-    ]
+# SoundVariants over SOUNDS, see sound_variants(). False if numpy isn't installed.
+VARIANTS = None
 
-    return sounds
 
+def sound_variants():
+    """The SoundVariants for ESPEAK_WORDS and FAIL_WORDS, or None without numpy"""
+    global VARIANTS
+    if VARIANTS is None:
+        try:
+            from sound_variants import SoundVariants
+        except ImportError as e:
+            print(f"No pitch variants ({e}), using the pre-pitched WAVs")
+            VARIANTS = False
+        else:
+            VARIANTS = SoundVariants(SOUNDS, {**ESPEAK_WORDS, **FAIL_WORDS}, SOUND_VARIANT_MEMORY_BUDGET)
+    return VARIANTS or None
 
-def get_ogre_soundboard():
-    """Play an audio file as a buffered sound sample, but with more Mike Meyers
 
-    :param str file_path: audio file (default data/secosmic_low.wav)
-    """
-    # choose a desired audio format
-    pygame.mixer.init(8000)  # raises exception on fail
+def get_voiced_soundboard(mode):
+    """One word at four pitches for a VOICED_MODES mode"""
+    variants = sound_variants()
+    if variants is None:
+        return SOUNDS.soundboard(mode)
+    return variants.board(VOICED_MODES[mode])
 
-    # load the sounds
-    sounds = []
-    root_dir = os.path.dirname(__file__)
-    sounds_directory = os.path.join(root_dir, "ogre_sounds")
-    sounds = [
-        pygame.mixer.Sound(os.path.join(sounds_directory, "swamp.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "donkey.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "layers.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "onions.wav")),
-    ]
 
-    return sounds
+def get_fail_cue():
+    """A random FAIL_WORDS word at a random pitch, or None without numpy"""
+    variants = sound_variants()
+    if variants is None:
+        return None
+    return variants.fail_cue(list(FAIL_WORDS))
 
 
-def get_cat_soundboard():
-    """Play an audio file as a buffered sound sample, but with dogs
+def get_dog_soundboard():
+    """The normal soundboard, but with dogs"""
+    return get_voiced_soundboard("dog_mode")
 
-    :param str file_path: audio file (default data/secosmic_low.wav)
-    """
-    # choose a desired audio format
-    pygame.mixer.init(8000)  # raises exception on fail
 
-    # load the sounds
-    sounds = []
-    root_dir = os.path.dirname(__file__)
-    sounds_directory = os.path.join(root_dir, "espeak_sounds/normal")
-    sounds = [
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_meow_p0_a200.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_meow_p50_a200.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_meow_p75_a200.wav")),
-        pygame.mixer.Sound(os.path.join(sounds_directory, "espeak_meow_p100_a200.wav")),
-    ]
+def get_ogre_soundboard():
+    """The normal soundboard, but with more Mike Meyers"""
+    return SOUNDS.soundboard("ogre_mode")
+
 
-    return sounds
+def get_cat_soundboard():
+    """The normal soundboard, but with cats"""
+    return get_voiced_soundboard("cat_mode")
 
 
 class AttractMode:
     def __init__(
         self,
-        ser: typing.Optional[serial.Serial],
-        seed: float = time.time(),
+        lights: typing.Optional[Framebuffer],
+        seed: typing.Optional[int] = None,
         dummy: bool = False,
     ):
-        random.seed(seed)
-        self._ser: typing.Optional[serial.Serial] = ser
+        # Its own generator, so the animations never touch the game's sequence
+        self._rng = random.Random(seed)
+        self._lights: typing.Optional[Framebuffer] = lights
         self._bean_statuses: typing.List[bool, ...] = [False, False, False, False]
         self._all_animations: typing.List[typing.Callable, ...] = [
             self.twinkle,
             self.all_on_all_off,
+            self.rainbow,
+            self.theater_chase,
+            self.color_wipe,
         ]
         self._dummy: bool = dummy
+        self.woken_by: typing.Optional[ButtonEvent] = None  # the press that ended play()
 
     def _poll_wait(self, delay_ms: int) -> bool:
-        for _ in range(round((delay_ms * 0.9))):  # approximate the delay here
-            pygame.time.wait(1)
-            if not self._dummy and poll_buttons():
-                return True
-        return False
+        if self._dummy:
+            time.sleep(delay_ms / 1000)
+            return False
+        # Sleeps on the event queue, so we wake up for a press or the deadline and nothing else
+        deadline = time.monotonic() + delay_ms / 1000
+        self.woken_by = BUTTON_EVENTS.wait_for_press(deadline)
+        return self.woken_by is not None
 
     @classmethod
     def _gen_bean_command(cls, bean: int, color: BeanColors) -> str:
-        if 1 > bean > NUM_BEANS + 1:
-            raise ValueError(f"Incorrect bean index {bean}")
-        return f"ON {bean + 1} {color.value}\n"
-
-    @classmethod
-    def _random_color(cls) -> BeanColors:
-        return random.choice(BeanColors)
+        return encode_on(bean + 1, color.value)
 
-    @classmethod
-    def _correct_bean_color(cls, bean) -> BeanColors:
-        return BeanColors(COLORS[bean])
-
-    @classmethod
-    def _random_bean(cls) -> int:
-        return random.randrange(0, NUM_BEANS)
-
-    def _random_off_bean(self) -> int:
-        return random.choice(
-            [bean for bean in range(NUM_BEANS) if self._bean_statuses[bean] is False]
-        )
-
-    def _random_on_bean(self) -> int:
-        return random.choice(
-            [bean for bean in range(NUM_BEANS) if self._bean_statuses[bean] is True]
-        )
-
-    @property
-    def _all_beans_off(self) -> bool:
-        return self._bean_statuses == [False, False, False, False]
-
-    @property
-    def _all_beans_on(self) -> bool:
-        return self._bean_statuses == [True, True, True, True]
+    def _random_color(self) -> BeanColors:
+        return self._rng.choice(list(BeanColors))
 
     def _set_bean(self, bean: int, color: BeanColors):
         if not self._dummy:
-            light_command(
-                ser=self._ser, command=self._gen_bean_command(bean=bean, color=color)
-            )
+            self._lights.set(bean + 1, color.value)
         else:
             print(f"Attract Mode: {self._gen_bean_command(bean=bean, color=color)}")
         self._bean_statuses[bean] = False if color == BeanColors.off else True
 
-    def _flash_random_bean(self, on_time_ms: int = 500) -> bool:
-        bean = self._random_bean()
-        self._set_bean(bean=bean, color=self._correct_bean_color(bean=bean))
-        if self._poll_wait(delay_ms=on_time_ms):
-            return True
-        self._set_bean(bean=bean, color=BeanColors.off)
-        return False
+    def _animate(self, name: str, duration_ms: int, *params) -> bool:
+        """
+        Hands one whole animation to the pawbean firmware and waits it out. The firmware
+        drops it the moment we send anything else, so after a press the next light
+        command takes over without us having to stop it first.
+        """
+        command = encode_anim(name, duration_ms, *params)
+        if not self._dummy:
+            self._lights.send(command)
+            # The firmware is drawing now, so we don't know what's lit anymore
+            self._lights.invalidate()
+            self._bean_statuses = [False, False, False, False]
+        else:
+            print(f"Attract Mode: {command}")
+        return self._poll_wait(delay_ms=duration_ms)
 
-    def twinkle(self, num_flashes: int = random.randrange(10, 20)) -> bool:
+    def twinkle(self, num_flashes: typing.Optional[int] = None) -> bool:
         print("Playing twinkle animation")
-        for _ in range(num_flashes):
-            if self._flash_random_bean():
-                return True
-        self._clear_all_beans()
-        return False
+        num_flashes = num_flashes or self._rng.randrange(10, 20)
+        return self._animate("TWINKLE", num_flashes * 500, 500)
 
-    def all_on_all_off(self, num_cycles=random.randrange(2, 5)):
+    def all_on_all_off(self, num_cycles: typing.Optional[int] = None) -> bool:
         print("Playing all on all off animation")
-        for _ in range(num_cycles):
-            self._clear_all_beans()
-            while not self._all_beans_on:
-                bean = self._random_off_bean()
-                self._set_bean(bean=bean, color=self._correct_bean_color(bean))
-                if self._poll_wait(500):
-                    return True
-            while not self._all_beans_off:
-                self._set_bean(bean=self._random_on_bean(), color=BeanColors.off)
-                if self._poll_wait(500):
-                    return True
-        return False
-
-    def game_over(self):
+        num_cycles = num_cycles or self._rng.randrange(2, 5)
+        # Every bean on one at a time, then every bean off one at a time
+        return self._animate("CYCLE", num_cycles * 2 * NUM_BEANS * 500, 500)
+
+    def rainbow(self, num_loops: typing.Optional[int] = None) -> bool:
+        print("Playing rainbow animation")
+        num_loops = num_loops or self._rng.randrange(1, 3)
+        # 256 frames to get all the way around the color wheel
+        return self._animate("RAINBOW", num_loops * 256 * 20, 20)
+
+    def theater_chase(self, duration_ms: typing.Optional[int] = None) -> bool:
+        print("Playing theater chase animation")
+        duration_ms = duration_ms or self._rng.randrange(5000, 10000)
+        return self._animate("CHASE", duration_ms, self._rng.choice(COLORS), 50, 3)
+
+    def color_wipe(self, duration_ms: typing.Optional[int] = None) -> bool:
+        print("Playing color wipe animation")
+        duration_ms = duration_ms or self._rng.randrange(5000, 10000)
+        return self._animate("WIPE", duration_ms, self._rng.choice(COLORS), 10)
+
+    def game_over(self, cue=None):
+        """:param cue: what to play instead of the buzzer"""
         self._set_bean(bean=-1, color=BeanColors.red)
-        root_dir = os.path.dirname(__file__)
-        game_over_sound_path = os.path.join(root_dir, "buzzer_3.wav")
-        sound = pygame.mixer.Sound(game_over_sound_path)
-        channel = sound.play()
-        # poll until finished playing sound
-        while channel.get_busy():
-            pygame.time.wait(10)
+        channel = play_sound(cue or SOUNDS.effect("game_over"))
+        wait_for_sound(channel)
         self._clear_all_beans()
 
     def _clear_all_beans(self):
         if not self._dummy:
-            light_command(ser=self._ser, command="ON 0 0 0 0\n")
+            blank_all_beans(self._lights)
         self._bean_statuses = [False, False, False, False]
 
     def play(self) -> None:
         while True:
-            random.shuffle(self._all_animations)
+            self._rng.shuffle(self._all_animations)
             for animation in self._all_animations:
                 if animation():
                     self._clear_all_beans()
                     return
 
 
-def get_cheat_mode_str(input_list):
-    # It's not efficient, but goddammit it's 2024
-    # and if we have enough cheat modes for it to
-    # matter, I'm very proud of us. - Kataze
-    if input_list not in CHEAT_MODES.values():
-        cheat_mode_str = None
-    else:
-        cheat_mode_str = list(CHEAT_MODES.keys())[list(CHEAT_MODES.values()).index(input_list)]
-    return cheat_mode_str
+def light_all_beans(lights):
+    lights.fill(COLORS)
 
 
-def light_all_beans(ser):
-    for i, color in enumerate(COLORS):
-        bean_idx = i + 1
-        light_command(ser, f"ON {bean_idx} {color}\n")
+def blank_all_beans(lights):
+    lights.set(0, BeanColors.off.value)
 
 
-def blank_all_beans(ser):
-    light_command(ser, "ON 0 0 0 0\n")
+# (sounds it was built for, SequenceRenderer), see sequence_renderer()
+SEQUENCE_RENDERER = None
 
 
-def beep_and_flash(ser, index, interruptable=False):
-    global SPEEDRUN_TIMER
+def sequence_renderer():
+    """The SequenceRenderer for whatever soundboard is in LIGHTS_AND_SOUND right now"""
+    global SEQUENCE_RENDERER
+    # numpy only gets pulled in if PRERENDERED_SAY_AUDIO is on
+    from sequence_audio import SequenceRenderer
 
-    assert index > 0 and index <= 4
-    light, sound = LIGHTS_AND_SOUND[index - 1]
+    sounds = [sound for _, sound in LIGHTS_AND_SOUND]
+    if SEQUENCE_RENDERER is None or SEQUENCE_RENDERER[0] != sounds:
+        SEQUENCE_RENDERER = (sounds, SequenceRenderer(SOUNDS, sounds))
+    return SEQUENCE_RENDERER[1]
 
-    light_command(ser, f"ON {index} {light}\n")
-    channel = sound.play()
 
-    if SPEEDRUN_TIMER:
-        pygame.time.wait(SPEEDRUN_TIMER)
-        channel.stop()
-        if SPEEDRUN_TIMER > 50:
-            SPEEDRUN_TIMER = SPEEDRUN_TIMER - 10
-            print(f"Decreasing flash time to {SPEEDRUN_TIMER}ms!")
-    else:
-        # poll until finished playing sound
-        while channel.get_busy():
-            pygame.time.wait(10)
-
-    # turn off light
-    light_command(ser, f"ON {index} 0 0 0\n")
+def say_timeline(lights, beans, gap_ms=100):
+    """
+    Works out the whole flash sequence up front: light on and sound start together,
+    then sound stop and light off once the sound is done (or the speedrun timer is up),
+    then gap_ms of nothing before the next bean.
+    """
+    global SPEEDRUN_TIMER
 
+    flashes = []
+    for index in beans:
+        assert index > 0 and index <= 4
+        light, sound = LIGHTS_AND_SOUND[index - 1]
 
-def beep_and_flash_input(ser, index):
+        if SPEEDRUN_TIMER:
+            on_time = SPEEDRUN_TIMER / 1000
+            if SPEEDRUN_TIMER > 50:
+                SPEEDRUN_TIMER = SPEEDRUN_TIMER - 10
+                print(f"Decreasing flash time to {SPEEDRUN_TIMER}ms!")
+        else:
+            on_time = sound.get_length()
+        flashes.append((index, on_time))
+
+    timeline = Timeline()
+    if PRERENDERED_SAY_AUDIO and len(flashes) > 1:
+        # One sound for the lot, lights go on and off at the sample offsets of each bean
+        sequence = sequence_renderer().render(flashes, gap_ms)
+        timeline.add(0.0, "sound_start", functools.partial(play_sound, sequence.sound))
+        for (index, _), offset, length in zip(flashes, sequence.offsets, sequence.lengths):
+            light = LIGHTS_AND_SOUND[index - 1][0]
+            timeline.add(offset / sequence.frequency, "light_on", functools.partial(lights.set, index, light))
+            timeline.add(
+                (offset + length) / sequence.frequency,
+                "light_off",
+                functools.partial(lights.set, index, BeanColors.off.value),
+            )
+        timeline.end = sequence.duration
+        return timeline
+
+    at = 0.0
+    for index, on_time in flashes:
+        light, sound = LIGHTS_AND_SOUND[index - 1]
+        channel = bean_channel(index)
+        timeline.add(at, "light_on", functools.partial(lights.set, index, light))
+        timeline.add(at, "sound_start", functools.partial(play_sound, sound, channel))
+        timeline.add(at + on_time, "sound_stop", channel.stop)
+        # turn off light
+        timeline.add(at + on_time, "light_off", functools.partial(lights.set, index, BeanColors.off.value))
+        at += on_time + gap_ms / 1000
+    timeline.end = at
+    return timeline
+
+
+def beep_and_flash_input(lights, index, pressed_at=None):
+    """
+    :param float pressed_at: time.monotonic() of the press, for tracing how long it took us to respond
+    """
     assert index > 0 and index <= 4
     light, sound = LIGHTS_AND_SOUND[index - 1]
 
-    light_command(ser, f"ON {index} {light}\n")
-    channel = sound.play()
+    lights.set(index, light)
+    if pressed_at is not None:
+        TRACER.since(PRESS_TO_LIGHT_SPAN, pressed_at)
+    channel = play_sound(sound, bean_channel(index))
+    if pressed_at is not None:
+        TRACER.since(PRESS_TO_SOUND_SPAN, pressed_at)
 
-    # very fun quirk, need to call wait_for_press before wait_for_release behaves correctly.
-    BUTTONS[index - 1].wait_for_press()
-    BUTTONS[index - 1].wait_for_release()
+    # The press already came out of BUTTON_EVENTS, just hang on until they let go.
+    # A stuck button gives up after TIMEOUT_VALUE instead of hanging the cabinet forever.
+    BUTTON_EVENTS.wait_for_release(index, deadline=time.monotonic() + TIMEOUT_VALUE)
     if DEBUG:
         print(f"Button {index} pushed")
 
+    # Cut the sound short if the next press comes in, but leave that press for the caller
+    started = TRACER.begin()
     if SPEEDRUN_TIMER:
-        for _ in range(round((SPEEDRUN_TIMER * 0.9))): # Borrowing kay's technique for non-blocking wait
-            pygame.time.wait(1)
-            butt = poll_buttons()
-            if butt != 0:
-                break
+        BUTTON_EVENTS.peek(deadline=time.monotonic() + SPEEDRUN_TIMER / 1000)
         channel.stop()
     else:
         while channel.get_busy():
-            butt = poll_buttons()
-            if butt != 0:
+            if BUTTON_EVENTS.peek(deadline=time.monotonic() + 0.01):
                 channel.stop()
                 break
+    TRACER.end(SOUND_WAIT_SPAN, started)
 
     # turn off light
-    light_command(ser, f"ON {index} 0 0 0\n")
+    lights.set(index, BeanColors.off.value)
 
 
-def beep_and_flash_bad(ser, game_memory, cheat_mode_str):
+@TRACER.traced("beep_and_flash_bad")
+def beep_and_flash_bad(lights, game_memory, cheat_mode_str, duration=0.0, reaction_times=()):
     # Function for when you lose
-    sadge = AttractMode(ser=ser)
-    sadge.game_over()
     score = len(game_memory) - 1
-    create_or_increment_odometer(cheat_mode_str, score)
+    if SCOREBOARD:
+        SCOREBOARD.show_game_over(score, new_high_score=score > STORE.high_score)
+    sadge = AttractMode(lights=lights)
+    sadge.game_over(cue=get_fail_cue() if cheat_mode_str in VOICED_MODES else None)
+    METRICS.game_finished(score)
+    finish_recording(cheat_mode_str, score)
+    record_game(cheat_mode_str, score, duration, reaction_times)
     if cheat_mode_str:
         print(f"{cheat_mode_str} GAME OVER!")
     else:
@@ -345,134 +510,217 @@ def beep_and_flash_bad(ser, game_memory, cheat_mode_str):
     print(f"YOUR SCORE: {score}")
     print("JOIN PAWPRINT PROTOTYPING AT PAWPRINTPROTOTYPING.ORG\n\n")
 
-def create_or_increment_odometer(cheat_mode_str, score):
-    root_dir = os.path.dirname(__file__)
-    odometer_path = os.path.join(root_dir, "odometer.json")
-    
-    # make it if it's not there, put a pretty timestamp
-    if not os.path.isfile(odometer_path):
-        with open(odometer_path, "w") as odometer_file:
-            odometer = {"odometer_started": datetime.datetime.now().isoformat()}
-            json.dump(odometer, odometer_file)
-
-    with open(odometer_path, "r+") as odometer_file:
-        odometer = json.load(odometer_file)
-        odometer["total_games"] = odometer.get("total_games", 0) + 1
-        if cheat_mode_str:
-            odometer[cheat_mode_str] = odometer.get(cheat_mode_str, 0) + 1
-        high_score = odometer.get("high_score", 0)
-        if score > high_score:
-            print("HIGH SCORE!!!!!!!!!!!!!!!111!!")
-            odometer["high_score"] = score
-        # blow away the original file 
-        odometer_file.truncate(0)
-        odometer_file.seek(0)
-        json.dump(odometer, odometer_file)
-
-
-def poll_buttons() -> int:
+def record_edge(event):
+    # On gpiozero's thread. Edges between games (attract mode) don't belong to anyone
+    recording = RECORDING
+    if recording is not None:
+        recording.edge(event)
+
+
+def finish_recording(cheat_mode_str, score):
+    global RECORDING
+    recording, RECORDING = RECORDING, None
+    if recording is None:
+        return
+    recording.finish(cheat_mode_str, score)
+    if RECORDINGS_DIR:
+        path = recording.save(RECORDINGS_DIR)
+        if DEBUG:
+            print(f"Recorded {len(recording)} button edges to {path}")
+
+
+def record_game(cheat_mode_str, score, duration, reaction_times):
+    # Appends one row to the game store, no more rewriting odometer.json after every game
+    if score > STORE.high_score:
+        print("HIGH SCORE!!!!!!!!!!!!!!!111!!")
+    STORE.record(cheat_mode_str, score, duration, reaction_times)
+
+
+def launch_overlay(hardware=None):
     """
-    Polls and returns 1-index button if a button is pressed.
-    Returns 0 if no button is pressed.
+    Starts sprite_overlay.py with SIGUSR1/SIGUSR2 blocked. Blocked signals stay blocked
+    across exec, so a throttle_overlay() from before the overlay has its handlers in
+    waits for them instead of killing it. The overlay unblocks them itself.
+
+    :param hardware: what to launch it through, HARDWARE if not given
     """
-    for idx, butt in enumerate(BUTTONS):
-        if butt.is_pressed:
-            return idx + 1
-    return 0
+    blocked = signal.pthread_sigmask(signal.SIG_BLOCK, OVERLAY_SIGNALS)
+    try:
+        return (hardware or HARDWARE).launch([sys.executable, SPRITE_OVERLAY, "--theme", SANIC_THEME])
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+
 
+def throttle_overlay(throttled):
+    """Tells the sprite overlay to back off (or not) while flash timing matters. No overlay, no-op."""
+    if SONIC_PROC and SONIC_PROC.poll() is None:
+        SONIC_PROC.send_signal(signal.SIGUSR1 if throttled else signal.SIGUSR2)
 
-def next_value():
-    return random.choice(list(range(1, NUM_BEANS + 1)))
 
+def next_value(rng: random.Random) -> int:
+    """The next bean in the sequence, from the game's own generator so the game can be replayed."""
+    return rng.randint(1, NUM_BEANS)
 
-def block_until_butt_release(butt):
-    BUTTONS[butt - 1].wait_for_press()
-    BUTTONS[butt - 1].wait_for_release()
 
 def reset_to_normal_mode():
     # If you change something for a special cheat mode, make sure to reset it here!
-    global LIGHTS_AND_SOUND
-    global MPLAYER_PROC
     global SPEEDRUN_TIMER
     global SONIC_PROC
-    LIGHTS_AND_SOUND = list(zip(COLORS, get_soundboard()))
-    # kill any video players
-    if MPLAYER_PROC:
-        # Begone thot
-        MPLAYER_PROC.kill()
-        MPLAYER_PROC = None
+    # LIGHTS_AND_SOUND goes back to the normal soundboard once attract mode's over, see main()
+    # Begone thot (mplayer itself stays warm for next time)
+    MEDIA_PLAYER.stop()
     SPEEDRUN_TIMER = None
     if SONIC_PROC:
-        # Be gentler and SIGTERM, since there's a family tree here
+        # The overlay cleans up after itself on SIGTERM, and waiting for it means no zombie
         SONIC_PROC.terminate()
+        try:
+            SONIC_PROC.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            SONIC_PROC.kill()
+            SONIC_PROC.wait()
         SONIC_PROC = None
 
-def main():
+def load_sounds():
+    """Opens the mixer and decodes the usual sounds. Runs in the background while attract mode's up."""
+    SOUNDS.use_mixer(HARDWARE.mixer)
+    # Decode everything small up front so going from attract mode to a game costs nothing.
+    # Ogre mode's clips are the big ones, they get decoded (and cached) the first time someone unlocks it.
+    SOUNDS.preload(modes=("normal",), effects=SOUND_EFFECTS)
+    for mode in VOICED_MODES:
+        get_voiced_soundboard(mode)
+    SOUNDS.report()
+
+
+def main(hardware=None):
+    """
+    :param hardware: a hardware.PiHardware (the default) or hardware.SimulatedHardware
+    """
     global LIGHTS_AND_SOUND
-    global MPLAYER_PROC
     global SPEEDRUN_TIMER
     global SONIC_PROC
-    LIGHTS_AND_SOUND = list(zip(COLORS, get_soundboard()))
-    MPLAYER_PROC = None
+    global HARDWARE
+    global BUTTONS
+    global BUTTON_EVENTS
+    global MEDIA_PLAYER
+    global RECORDING
+    global SCOREBOARD
+    TRACER.install()
+    BOOT.done("imports")
+    HARDWARE = hardware if hardware is not None else PiHardware()
+    METRICS.watch_game_thread()
     SPEEDRUN_TIMER = None
     SONIC_PROC = None
-    TIMEOUT_VALUE = 10
-    CHEAT_TIMEOUT_VALUE = 3
 
     game_memory = []
-
-    with serial.Serial("/dev/ttyUSB0", 115200, timeout=1) as ser:
+    booting = True
+
+    # The link reads everything the firmware says back and paces writes on its acks
+    with HARDWARE.serial(SERIAL_PORT) as ser, SerialLink(ser, debug=DEBUG) as link, Framebuffer(link, debug=DEBUG) as lights:
+        # Nobody reads the firmware's debug chatter, and at 115200 baud it's most of the link
+        lights.send(encode_quiet(True))
+        # Something to look at while the rest boots, so a power cycle isn't a dark cabinet
+        lights.set(0, BOOT_COLOR)
+        BOOT.done("serial")
+        METRICS.watch_serial(link, lights)
+        # Opening the mixer and decoding sounds is most of a cold start, and attract mode is silent.
+        # A cabinet that can't make noise is broken, so if it fails we exit and systemd restarts us.
+        sounds = BOOT.background("sounds", load_sounds, fatal=True)
+        BUTTONS = HARDWARE.buttons(BUTTON_PINS)
+        BUTTON_EVENTS = ButtonEvents(BUTTONS)
+        BUTTON_EVENTS.listeners.append(record_edge)
+        BOOT.done("buttons")
+        # Started now so a cheat unlock doesn't have to wait for mplayer to boot
+        MEDIA_PLAYER = MediaPlayer(HARDWARE.launch)
+        MEDIA_PLAYER.start()
+        atexit.register(MEDIA_PLAYER.close)
+        BOOT.done("media player")
+        if METRICS_ADDRESS:
+            METRICS.serve(METRICS_ADDRESS)
+            BOOT.done("metrics")
+        if SHOW_SCOREBOARD:
+            # Its thread imports pygame and opens the display itself, the boot doesn't wait for it
+            from scoreboard import Scoreboard
+
+            SCOREBOARD = Scoreboard(STORE).start()
+            atexit.register(SCOREBOARD.stop)
         while True:
             # Clear all the beans
-            light_command(ser, "ON 0 0 0 0\n")
+            blank_all_beans(lights)
 
             # Reset anything that might have been affected by a special mode
             reset_to_normal_mode()
-
-            attract = AttractMode(ser=ser)
+            if DEBUG:
+                link.report()
+
+            # Don't let a button mashed during game over skip attract mode
+            BUTTON_EVENTS.clear()
+            attract = AttractMode(lights=lights)
+            METRICS.enter("attract")
+            if SCOREBOARD:
+                SCOREBOARD.show_leaderboard()
+            if booting:
+                booting = False
+                BOOT.done("attract")
+                BOOT.report()
+                sd_notify("READY=1\nSTATUS=Attract mode")
             attract.play()  # Will continue as soon as someone hits a button
             print("Attract mode is over! Starting in 3 seconds...")
+            METRICS.game_started()
+            # Only ever waits if someone beat the sound loader to the buttons after a cold start
+            if not sounds.done:
+                print("Still loading sounds...")
+            sounds.wait()
+            LIGHTS_AND_SOUND = list(zip(COLORS, get_soundboard()))
+            # Everything from the press that woke us up to game over goes in the recording,
+            # and the sequence comes out of this game's own generator
+            RECORDING = GameRecording(new_seed(), started_at=attract.woken_by.timestamp)
+            RECORDING.edge(attract.woken_by)
+            rng = RECORDING.rng()
             
             # == WELCOME TO THE CHEAT ZONE!!!!11!! ==
             #light up all beans for cheat code entry
-            light_all_beans(ser)
+            light_all_beans(lights)
             cheat_memory = []
-            cheat_input_start_time = time.time()
-            first_button_press = True
-            while time.time() <= cheat_input_start_time + CHEAT_TIMEOUT_VALUE:
-                butt = poll_buttons()
-                if butt:
-                    if first_button_press:
-                        # Throw out the first button press that exits attract mode
-                        first_button_press = False
-                        block_until_butt_release(butt)
+            CHEAT_MATCHER.reset()
+            cheat_input_deadline = time.monotonic() + CHEAT_TIMEOUT_VALUE
+            deadline = cheat_input_deadline
+            # The press that exited attract mode was already eaten by attract.play(),
+            # so its release is the only thing left over and gets skipped below.
+            while True:
+                event = BUTTON_EVENTS.get(deadline=deadline)
+                if event is None:
+                    break
+                if event.pressed:
+                    cheat_memory.append(event.button) # Add it to the list
+                    print(f"BUTTON {event.button} PRESSED!")
+                    match_state = CHEAT_MATCHER.press(event.button)
+                    # No need to sit out the rest of the window once we know how it ends
+                    if match_state in (MatchState.complete, MatchState.no_match):
+                        break
+                    if match_state == MatchState.complete_prefix:
+                        deadline = min(cheat_input_deadline, time.monotonic() + CHEAT_TAIL_TIMEOUT_VALUE)
                     else:
-                        cheat_memory.append(butt) # Add it to the list
-                        block_until_butt_release(butt)
-                        print(f"BUTTON {butt} PRESSED!")
+                        deadline = cheat_input_deadline
 
             print(f"CHEAT MEMORY: {cheat_memory}")
-            blank_all_beans(ser)
+            blank_all_beans(lights)
 
-            cheat_mode_str = get_cheat_mode_str(cheat_memory)
+            cheat_mode_str = CHEAT_MATCHER.mode
+            METRICS.cheat_mode(cheat_mode_str)
             
             # If you got a cheat mode at all, let's congratulate you!
             if cheat_mode_str:
-                root_dir = os.path.dirname(__file__)
-                zelda_secret_sound_path = os.path.join(root_dir, "zelda_secret.wav")
-                sound = pygame.mixer.Sound(zelda_secret_sound_path)
-                channel = sound.play()
+                channel = play_sound(SOUNDS.effect("cheat_unlocked"))
                 
                 # Celebratory green flash!
                 for _ in range(3):
-                    light_command(ser, f"ON 0 0 255 0\n")
-                    pygame.time.wait(200)
-                    blank_all_beans(ser)
-                    pygame.time.wait(200)
+                    lights.set(0, BeanColors.green.value)
+                    time.sleep(0.2)
+                    blank_all_beans(lights)
+                    time.sleep(0.2)
 
                 # Let the sound finish, because you're worth it
-                while channel.get_busy():
-                    pygame.time.wait(10)
+                wait_for_sound(channel)
 
 
             if cheat_mode_str == "print_a_line":
@@ -493,7 +741,7 @@ def main():
                 full_blue_path = os.path.join(videos_directory, "blue.webm")
                 BLUE_COLORS = ('0 0 255', '0 0 255', '0 0 255', '0 0 255')
                 LIGHTS_AND_SOUND = list(zip(BLUE_COLORS, get_soundboard()))
-                MPLAYER_PROC = subprocess.Popen(["mplayer", "-geometry", "300x300+300+300", full_blue_path])
+                MEDIA_PLAYER.play(full_blue_path)
 
             if cheat_mode_str == "ogre_mode":
                 print("CHEAT MODE UNLOCKED: OGRE MODE!! LAYERS!")
@@ -502,66 +750,105 @@ def main():
                 full_ogre_path = os.path.join(videos_directory, "ogre.mp4")
                 OGRE_COLORS = ('0 255 0', '0 255 0', '0 255 0', '0 255 0')
                 LIGHTS_AND_SOUND = list(zip(OGRE_COLORS, get_ogre_soundboard()))
-                MPLAYER_PROC = subprocess.Popen(["mplayer", "-geometry", "300x300+300+300", full_ogre_path])
+                MEDIA_PLAYER.play(full_ogre_path)
 
             if cheat_mode_str == "speedrun_mode":
                 print("CHEAT MODE UNLOCKED: SPEED RUN MODE!! GOTTA GO FAST!")
                 SPEEDRUN_TIMER = 500
-                root_dir = os.path.dirname(__file__)
-                scripts_directory = os.path.join(root_dir, "scripts")
-                full_sanic_path = os.path.join(scripts_directory, "sanic.sh")
-                SONIC_PROC = subprocess.Popen(full_sanic_path)
+                SONIC_PROC = launch_overlay()
 
             # == NOW LEAVING THE CHEAT ZONE!!!! KEEP IT R34L!! ==
 
+            game_start_time = time.monotonic()
+            reaction_times = []
             running = True
             while running:
-                game_memory.append(next_value())
+                game_memory.append(next_value(rng))
+                RECORDING.value(game_memory[-1])
+                if SCOREBOARD:
+                    SCOREBOARD.show_level(len(game_memory), cheat_mode_str)
 
                 # Say the game memory for player to memorize
                 print("SAY")
-                for bean in game_memory:
-                    beep_and_flash(ser, bean)
-                    pygame.time.wait(100)
-
-                input_start_time = time.time()
+                # The sanic swarm slows to a crawl while the flashes are on the clock
+                throttle_overlay(True)
+                SCHEDULER.play(say_timeline(lights, game_memory))
+                throttle_overlay(False)
+                if DEBUG:
+                    SCHEDULER.report()
+
+                # Mashing during SAY doesn't count as an answer
+                BUTTON_EVENTS.clear()
+                prompt_time = time.monotonic()
+                input_deadline = prompt_time + TIMEOUT_VALUE
                 current_idx = 0
                 print("ASK")
-                continue_game = False
-                while time.time() <= input_start_time + TIMEOUT_VALUE:
+                while True:
                     # Ask player to repeat it back
-                    butt = poll_buttons()
-                    if butt:
-                        # correct answer!
-                        if DEBUG:
-                            print(
-                                f"current_idx = {current_idx}, butt = {butt}, game_memory = {game_memory}"
-                            )
-                        # import pdb; pdb.set_trace()
-                        if game_memory[current_idx] == butt:  # haha butt
-                            beep_and_flash_input(ser, butt)
-                            current_idx += 1
-                            # good job! next sequence
-                            if current_idx >= len(game_memory):
-                                continue_game = True
-                                pygame.time.wait(500)
-                                break
-
-                            input_start_time = time.time()
-                        # you lose!
-                        else:
-                            beep_and_flash_bad(ser, game_memory, cheat_mode_str)
-                            game_memory = []
-                            running = False
+                    event = BUTTON_EVENTS.wait_for_press(deadline=input_deadline)
+                    if event is None:
+                        # you lose! (timeout)
+                        beep_and_flash_bad(
+                            lights, game_memory, cheat_mode_str, time.monotonic() - game_start_time, reaction_times
+                        )
+                        game_memory = []
+                        running = False
+                        break
+
+                    TRACER.since(PRESS_TO_DEQUEUE_SPAN, event.timestamp)
+                    butt = event.button
+                    if DEBUG:
+                        print(
+                            f"current_idx = {current_idx}, butt = {butt}, game_memory = {game_memory}"
+                        )
+                    # correct answer!
+                    if game_memory[current_idx] == butt:  # haha butt
+                        reaction_times.append(event.timestamp - prompt_time)
+                        METRICS.presses.inc()
+                        beep_and_flash_input(lights, butt, pressed_at=event.timestamp)
+                        current_idx += 1
+                        # good job! next sequence
+                        if current_idx >= len(game_memory):
+                            time.sleep(0.5)
                             break
 
-                if running and not continue_game:
-                    # you lose! (timeout)
-                    beep_and_flash_bad(ser, game_memory, cheat_mode_str)
-                    game_memory = []
-                    running = False
-                    break
+                        prompt_time = time.monotonic()
+                        input_deadline = prompt_time + TIMEOUT_VALUE
+                    # you lose!
+                    else:
+                        beep_and_flash_bad(
+                            lights, game_memory, cheat_mode_str, time.monotonic() - game_start_time, reaction_times
+                        )
+                        game_memory = []
+                        running = False
+                        break
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Legally Distinct Simon")
+    parser.add_argument("--low-latency-audio", action="store_true", help="open the mixer with LOW_LATENCY_AUDIO_CONFIG")
+    parser.add_argument("--audio-buffer", type=int, help="mixer buffer in samples, see scripts/audio_latency.py")
+    parser.add_argument(
+        "--metrics", metavar="ADDRESS", default=METRICS_ADDRESS, help="HOST:PORT or unix:PATH to serve metrics on, 'off' for none"
+    )
+    parser.add_argument("--scoreboard", action="store_true", help="show the level and leaderboard on the display")
+    parser.add_argument("--record", metavar="DIR", help="save every game to DIR for scripts/replay.py")
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="no Pi needed: fake buttons, pawbeans and audio. Type button numbers and hit enter to play",
+    )
+    args = parser.parse_args()
+    audio = LOW_LATENCY_AUDIO_CONFIG if args.low_latency_audio else SOUNDS.audio
+    if args.audio_buffer:
+        audio = audio._replace(buffer=args.audio_buffer)
+    SOUNDS.use_audio(audio)
+    RECORDINGS_DIR = args.record
+    SHOW_SCOREBOARD = SHOW_SCOREBOARD or args.scoreboard
+    METRICS_ADDRESS = None if args.metrics == "off" else args.metrics
+    if args.simulate:
+        hardware = SimulatedHardware(verbose=True)
+        hardware.tap_from_stdin()
+        main(hardware)
+    else:
+        main()
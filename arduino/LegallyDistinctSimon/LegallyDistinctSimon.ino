@@ -6,6 +6,8 @@
 #define NUM_LEDS 1200
 // LED brightness, 0 (min) to 255 (max)
 #define BRIGHTNESS 255
+// Longest serial command we'll accept, a FRAME is 34 characters
+#define SERIAL_CMD_LEN 64
 
 /* Declare the NeoPixel strip object:
 *     * Argument 1 = Number of LEDs in the LED strip
@@ -35,8 +37,41 @@ const pawbean pawbean4 = {35+42+42, 35+42+42+34};
 
 // Zero-index be damned!!
 pawbean pawbean_arr[] = {pawbean0, pawbean1, pawbean2, pawbean3, pawbean4};
+#define NUM_PAWBEANS 4
 
-String serial_cmd;
+// Same colors as COLORS in LegallyDistinctSimon.py, used by the twinkle and cycle animations
+const uint32_t pawbean_colors[] = {0x000000, 0xFF0000, 0x00FF00, 0x0000FF, 0xFFFF00};
+
+char serial_cmd[SERIAL_CMD_LEN];
+
+/*
+* Attract mode animations run here instead of being streamed from the Pi.
+* loop() draws at most one frame per pass, so a waiting serial byte is
+* noticed (and stops the animation) within one frame.
+*/
+enum animation_kind {ANIM_NONE, ANIM_RAINBOW, ANIM_CHASE, ANIM_WIPE, ANIM_TWINKLE, ANIM_CYCLE};
+
+struct animation_state {
+  animation_kind kind;
+  unsigned long started;     // millis() when it started
+  unsigned long duration;    // how long to run for in ms
+  unsigned long wait;        // ms between frames
+  unsigned long next_frame;  // millis() of the next frame
+  uint32_t color;
+  unsigned int group_size;
+  unsigned long step;        // frame counter, each animation decides what it means
+  uint8_t lit;               // bitmask of lit pawbeans, for twinkle and cycle
+};
+
+animation_state anim = {ANIM_NONE};
+
+// When quiet, we don't echo debug lines back over serial. At 115200 baud they were
+// about ten times the size of the commands themselves.
+bool quiet = false;
+
+// When acks are on, every command gets exactly one OK or ERR line back once it's been
+// handled, quiet or not, so the Pi can tell what made it and how long it took.
+bool acks = false;
 
 void setup() {
 	strip.begin();  // initialize strip (required!)
@@ -46,10 +81,17 @@ void setup() {
 
 void loop() {
   if(Serial.available() > 0) {
-    serial_cmd = Serial.readStringUntil('\n');
+    // Anything at all from the Pi means it wants the lights back, right now
+    anim.kind = ANIM_NONE;
+    size_t len = Serial.readBytesUntil('\n', serial_cmd, SERIAL_CMD_LEN - 1);
+    serial_cmd[len] = '\0';
     processSerial(serial_cmd);
   }
 
+  if(anim.kind != ANIM_NONE) {
+    stepAnimation();
+  }
+
   // These are the default simon colors, keeping them around as reference.
   // colorSetPaw(strip.Color(0, 255, 0), pawbean1); // green
   // colorSetPaw(strip.Color(255, 0, 0), pawbean2); // red
@@ -59,58 +101,294 @@ void loop() {
 
 /*
 * Takes an input string read from serial and calls the functions
-* needed to respond appropriately
+* needed to respond appropriately. Parses in place, no String allocations.
 * 
-*     1. Serial command as a string
+*     1. Serial command as a null terminated string
 */
-void processSerial(String serial_cmd) {
-  int prev_space = 0;
-  int next_space = serial_cmd.indexOf(" ");
-  String command = serial_cmd.substring(0, next_space);
-  Serial.println("command is " + command);
-
-  if(command != "ON") {
-    Serial.println("Unsupported command");
+void processSerial(char *serial_cmd) {
+  char *rest;
+  char *command = strtok_r(serial_cmd, " \r", &rest);
+  if(command == NULL) {
     return;
   }
+  if(!quiet) {
+    Serial.print("command is ");
+    Serial.println(command);
+  }
 
-  prev_space = next_space + 1;
-  next_space = serial_cmd.indexOf(" ", prev_space);
-  int pawbean_index = serial_cmd.substring(prev_space, next_space).toInt();
-  Serial.println("pawbean_index is " + String(pawbean_index));
+  bool ok = true;
+  if(strcmp(command, "ON") == 0) {
+    ok = processOn(rest);
+  } else if(strcmp(command, "FRAME") == 0) {
+    ok = processFrame(rest);
+  } else if(strcmp(command, "QUIET") == 0) {
+    quiet = strtol(rest, NULL, 10) != 0;
+  } else if(strcmp(command, "ACKS") == 0) {
+    acks = strtol(rest, NULL, 10) != 0;
+  } else if(strcmp(command, "ANIM") == 0) {
+    ok = processAnim(rest);
+  } else if(strcmp(command, "STOP") == 0) {
+    // The animation already stopped when this arrived, just clean up after it
+    blank(0);
+  } else {
+    ok = false;
+    if(!quiet) {
+      Serial.println("Unsupported command");
+    }
+  }
 
-  prev_space = next_space + 1;
-  next_space = serial_cmd.indexOf(" ", prev_space);
-  int red_value = serial_cmd.substring(prev_space, next_space).toInt();
-  Serial.println("red_value is " + String(red_value));
+  if(acks) {
+    Serial.println(ok ? "OK" : "ERR");
+  }
+}
 
-  prev_space = next_space + 1;
-  next_space = serial_cmd.indexOf(" ", prev_space);
-  int green_value = serial_cmd.substring(prev_space, next_space).toInt();
-  Serial.println("green_value is " + String(green_value));
+/*
+* ON <pawbean_index> <red> <green> <blue>
+* Sets one pawbean, or the whole strip for pawbean 0. Returns false, without touching
+* the strip, unless there are exactly 4 whole numbers, a good index and colors of 0-255.
+* 
+*     1. The rest of the command after "ON "
+*/
+bool processOn(char *args) {
+  long fields[4];
+  for (unsigned int i = 0; i < 4; i++) {
+    char *end;
+    fields[i] = strtol(args, &end, 10);
+    // No digits at all, or something other than a space straight after them
+    if(end == args || (*end != ' ' && *end != '\r' && *end != '\0')) {
+      if(!quiet) {
+        Serial.printf("Bad field %u\n", i + 1);
+      }
+      return false;
+    }
+    args = end;
+  }
+  while(*args == ' ' || *args == '\r') {
+    args++;
+  }
+  if(*args != '\0') {
+    if(!quiet) {
+      Serial.println("Too many fields");
+    }
+    return false;
+  }
+  long pawbean_index = fields[0];
+  long red_value = fields[1];
+  long green_value = fields[2];
+  long blue_value = fields[3];
 
-  prev_space = next_space + 1;
-  next_space = serial_cmd.indexOf(" ", prev_space);
-  int blue_value = serial_cmd.substring(prev_space, next_space).toInt();
-  Serial.println("blue_value is " + String(blue_value));
+  if(!quiet) {
+    Serial.printf("pawbean_index is %ld\n", pawbean_index);
+    Serial.printf("red_value is %ld\n", red_value);
+    Serial.printf("green_value is %ld\n", green_value);
+    Serial.printf("blue_value is %ld\n", blue_value);
+  }
+
+  if(pawbean_index < 0 || pawbean_index > NUM_PAWBEANS) {
+    if(!quiet) {
+      Serial.println("Bad pawbean index");
+    }
+    return false;
+  }
+  if(red_value < 0 || red_value > 255 || green_value < 0 || green_value > 255 || blue_value < 0 || blue_value > 255) {
+    if(!quiet) {
+      Serial.println("Bad color value");
+    }
+    return false;
+  }
 
   colorSetPaw(strip.Color(red_value, green_value, blue_value), pawbean_arr[pawbean_index]);
-  Serial.println("Setting pawbean " + String(pawbean_index) + " to " + String(red_value) + "," + String(green_value) + "," + String(blue_value));
+  if(!quiet) {
+    Serial.printf("Setting pawbean %ld to %ld,%ld,%ld\n", pawbean_index, red_value, green_value, blue_value);
+  }
+  return true;
 }
 
 /*
-* Fills a strip with a specific color, starting at 0 and continuing
-* until the entire strip is filled. Takes two arguments:
+* FRAME <rrggbb> <rrggbb> <rrggbb> <rrggbb>
+* Sets pawbeans 1 through 4 at once with a single strip.show(). Returns false,
+* without touching the strip, unless there are exactly 4 colors of 6 hex digits each.
+* 
+*     1. The rest of the command after "FRAME "
+*/
+bool processFrame(char *args) {
+  uint32_t colors[NUM_PAWBEANS + 1];
+  for (unsigned int i = 1; i <= NUM_PAWBEANS; i++) {
+    while(*args == ' ') {
+      args++;
+    }
+    // Six hex digits and then the end of the field, strtoul alone would take "-1" or "0x12"
+    unsigned int digits = 0;
+    while(digits < 6 && isxdigit(args[digits])) {
+      digits++;
+    }
+    if(digits != 6 || (args[6] != ' ' && args[6] != '\r' && args[6] != '\0')) {
+      if(!quiet) {
+        Serial.printf("Bad color for pawbean %u\n", i);
+      }
+      return false;
+    }
+    // strip.Color() packs as 0xRRGGBB, same as the hex on the wire
+    colors[i] = strtoul(args, &args, 16);
+  }
+  while(*args == ' ' || *args == '\r') {
+    args++;
+  }
+  if(*args != '\0') {
+    if(!quiet) {
+      Serial.println("Too many colors");
+    }
+    return false;
+  }
+
+  for (unsigned int i = 1; i <= NUM_PAWBEANS; i++) {
+    colorFill(colors[i], pawbean_arr[i].start, pawbean_arr[i].end);
+  }
+  strip.show();
+  if(!quiet) {
+    Serial.println("Setting frame");
+  }
+  return true;
+}
+
+/*
+* ANIM <name> <duration_ms> <params...>
+* Starts a firmware-side animation that runs for duration_ms and then blanks,
+* or until any other serial byte shows up. Returns false for an unknown animation.
+*
+*     RAINBOW <duration_ms> <wait_ms>
+*     CHASE <duration_ms> <rrggbb> <wait_ms> <group_size>
+*     WIPE <duration_ms> <rrggbb> <wait_ms>
+*     TWINKLE <duration_ms> <on_ms>
+*     CYCLE <duration_ms> <step_ms>
+* 
+*     1. The rest of the command after "ANIM "
+*/
+bool processAnim(char *args) {
+  char *name = strtok_r(args, " \r", &args);
+  if(name == NULL) {
+    return false;
+  }
+  animation_state next = {ANIM_NONE};
+  next.duration = strtoul(args, &args, 10);
+  if(strcmp(name, "RAINBOW") == 0) {
+    next.kind = ANIM_RAINBOW;
+    next.wait = strtoul(args, &args, 10);
+  } else if(strcmp(name, "CHASE") == 0) {
+    next.kind = ANIM_CHASE;
+    next.color = strtoul(args, &args, 16);
+    next.wait = strtoul(args, &args, 10);
+    next.group_size = max(1UL, strtoul(args, &args, 10));
+  } else if(strcmp(name, "WIPE") == 0) {
+    next.kind = ANIM_WIPE;
+    next.color = strtoul(args, &args, 16);
+    next.wait = strtoul(args, &args, 10);
+  } else if(strcmp(name, "TWINKLE") == 0) {
+    next.kind = ANIM_TWINKLE;
+    next.wait = strtoul(args, &args, 10);
+  } else if(strcmp(name, "CYCLE") == 0) {
+    next.kind = ANIM_CYCLE;
+    next.wait = strtoul(args, &args, 10);
+  } else {
+    if(!quiet) {
+      Serial.println("Unsupported animation");
+    }
+    return false;
+  }
+
+  if(!quiet) {
+    Serial.print("Starting animation ");
+    Serial.println(name);
+  }
+  blank(0);
+  next.started = millis();
+  next.next_frame = next.started;
+  anim = next;
+  return true;
+}
+
+/*
+* Draws the next frame of the running animation if it's time to,
+* and blanks the strip once the animation has run its course.
+*/
+void stepAnimation() {
+  unsigned long now = millis();
+  if(now - anim.started >= anim.duration) {
+    anim.kind = ANIM_NONE;
+    blank(0);
+    return;
+  }
+  if((long)(now - anim.next_frame) < 0) {
+    return;
+  }
+  anim.next_frame = now + anim.wait;
+
+  switch(anim.kind) {
+    case ANIM_RAINBOW:
+      // iterate through all 8-bit hues, using 16-bit values for granularity
+      rainbowFrame((anim.step * 256) % 65536);
+      break;
+    case ANIM_CHASE:
+      theaterChaseFrame(anim.color, anim.step % anim.group_size, anim.group_size);
+      break;
+    case ANIM_WIPE:
+      colorWipeFrame(anim.color, anim.step % (pawbean0.end + 1));
+      break;
+    case ANIM_TWINKLE:
+      twinkleFrame();
+      break;
+    case ANIM_CYCLE:
+      cycleFrame();
+      break;
+    default:
+      break;
+  }
+  anim.step++;
+}
+
+/*
+* Lights one random pawbean in its own color for a frame, then the next one.
+*/
+void twinkleFrame() {
+  unsigned int bean = random(1, NUM_PAWBEANS + 1);
+  strip.clear();
+  colorSetPaw(pawbean_colors[bean], pawbean_arr[bean]);
+}
+
+/*
+* Turns a random unlit pawbean on each frame until they're all on,
+* then a random lit one off each frame until they're all off.
+*/
+void cycleFrame() {
+  const uint8_t all_lit = (1 << NUM_PAWBEANS) - 1;
+  bool filling = (anim.step / NUM_PAWBEANS) % 2 == 0;
+  unsigned int bean;
+  do {
+    bean = random(1, NUM_PAWBEANS + 1);
+  } while(filling == ((anim.lit >> (bean - 1)) & 1) && anim.lit != (filling ? all_lit : 0));
+
+  if(filling) {
+    anim.lit |= 1 << (bean - 1);
+    colorSetPaw(pawbean_colors[bean], pawbean_arr[bean]);
+  } else {
+    anim.lit &= ~(1 << (bean - 1));
+    colorSetPaw(0, pawbean_arr[bean]);
+  }
+}
+
+/*
+* Fills the pawbeans with a specific color, one LED per frame, starting at 0
+* and continuing until they're all filled. Starts over from black after that.
 * 
 *     1. the color to use in the fill
-*     2. the amount of time to wait after writing each LED
+*     2. how many LEDs have been filled so far
 */
-void colorWipe(uint32_t color, unsigned long wait) {
-	for (unsigned int i = 0; i < strip.numPixels(); i++) {
-		strip.setPixelColor(i, color);
-		strip.show();
-		delay(wait);
+void colorWipeFrame(uint32_t color, unsigned int filled) {
+	if (filled == 0) {
+		strip.clear();
 	}
+	strip.setPixelColor(filled, color);
+	strip.show();
 }
 
 /*
@@ -130,55 +408,54 @@ void colorSetPaw(uint32_t color, pawbean pawbean) {
 *     3. the index to end on
 */
 void colorSet(uint32_t color, int start, int end) {
+  colorFill(color, start, end);
+  strip.show();
+}
+
+/*
+* Same as colorSet, but leaves calling strip.show() to the caller
+* 
+*     1. the color to use in the fill
+*     2. the index to start at
+*     3. the index to end on
+*/
+void colorFill(uint32_t color, int start, int end) {
   // Get full strip length strip.numPixels()
 
 	for (unsigned int i = start; i <= end; i++) {
 		strip.setPixelColor(i, color);
 	}
-  strip.show();
 }
 
 /*
-* Runs a marquee style "chase" sequence. Takes three arguments:
+* Draws one frame of a marquee style "chase" sequence over the pawbeans.
 *
 *     1. the color to use in the chase
-*     2. the amount of time to wait between frames
+*     2. which LED in each group is lit this frame
 *     3. the number of LEDs in each 'chase' group
-*     3. the number of chases sequences to perform
-*/
-void theaterChase(uint32_t color, unsigned long wait, unsigned int groupSize, unsigned int numChases) {
-	for (unsigned int chase = 0; chase < numChases; chase++) {
-		for (unsigned int pos = 0; pos < groupSize; pos++) {
-			strip.clear();  // turn off all LEDs
-			for (unsigned int i = pos; i < strip.numPixels(); i += groupSize) {
-				strip.setPixelColor(i, color);  // turn on the current group
-			}
-			strip.show();
-			delay(wait);
-		}
+*/
+void theaterChaseFrame(uint32_t color, unsigned int pos, unsigned int groupSize) {
+	strip.clear();  // turn off all LEDs
+	for (unsigned int i = pos; i <= pawbean0.end; i += groupSize) {
+		strip.setPixelColor(i, color);  // turn on the current group
 	}
+	strip.show();
 }
 
 
 /*
-* Simple rainbow animation, iterating through all 8-bit hues. LED color changes
-* based on position in the strip. Takes two arguments:
+* One frame of a simple rainbow animation over the pawbeans. LED color changes
+* based on position in the strip.
 * 
-*     1. the amount of time to wait between frames
-*     2. the number of rainbows to loop through
-*/
-void rainbow(unsigned long wait, unsigned int numLoops) {
-	for (unsigned int count = 0; count < numLoops; count++) {
-		// iterate through all 8-bit hues, using 16-bit values for granularity
-		for (unsigned long firstPixelHue = 0; firstPixelHue < 65536; firstPixelHue += 256) {
-			for (unsigned int i = 0; i < strip.numPixels(); i++) {
-				unsigned long pixelHue = firstPixelHue + (i * 65536UL / strip.numPixels()); // vary LED hue based on position
-				strip.setPixelColor(i, strip.gamma32(strip.ColorHSV(pixelHue)));  // assign color, using gamma curve for a more natural look
-			}
-			strip.show();
-			delay(wait);
-		}
+*     1. the hue of the first pixel, 0-65535
+*/
+void rainbowFrame(unsigned long firstPixelHue) {
+	unsigned int numPixels = pawbean0.end + 1;
+	for (unsigned int i = 0; i < numPixels; i++) {
+		unsigned long pixelHue = firstPixelHue + (i * 65536UL / numPixels); // vary LED hue based on position
+		strip.setPixelColor(i, strip.gamma32(strip.ColorHSV(pixelHue)));  // assign color, using gamma curve for a more natural look
 	}
+	strip.show();
 }
 
 /*
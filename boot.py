@@ -0,0 +1,146 @@
+"""
+Cold start bookkeeping: how long each stage from power-on to attract mode took, things
+that can finish in the background while attract mode is already up, and telling
+systemd (Type=notify) that the cabinet is ready.
+
+Everything is timed on time.perf_counter(), which the soak's VirtualClock leaves
+alone, and counted from when the process started rather than from when this got
+imported, so the interpreter and the imports are part of the bill.
+"""
+import contextlib
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import typing
+
+
+def process_started() -> float:
+    """When this process started, on the time.perf_counter() clock. Linux only, anywhere else it's now."""
+    try:
+        with open("/proc/self/stat") as stat_file:
+            stat = stat_file.read()
+        # Everything after the command name's closing paren is space separated, starttime is field 22
+        start_ticks = int(stat[stat.rindex(")") + 2:].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, AttributeError):
+        age = 0.0
+    return time.perf_counter() - max(0.0, age)
+
+
+def sd_notify(state: str) -> bool:
+    """
+    Sends a state like "READY=1" to systemd's notify socket, see sd_notify(3). Without
+    NOTIFY_SOCKET (not started by systemd, or not Type=notify) it does nothing.
+    """
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        address = "\0" + address[1:]  # abstract namespace
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+    except OSError as e:
+        print(f"Boot: couldn't tell systemd {state!r}: {e}")
+        return False
+    return True
+
+
+class Background:
+    """
+    A function running on its own thread. wait() hands back what it returned, or
+    raises what it raised, on the thread that needs it.
+
+    :param fatal: if it raises, log it and exit the whole process right away instead.
+        For things the cabinet can't do without: nobody might call wait() until the
+        first game, long after systemd was told READY=1, and a crash then gets the
+        unit restarted (Restart=on-failure) instead of a silent cabinet.
+    """
+
+    def __init__(self, name: str, function: typing.Callable[[], typing.Any], fatal: bool = False):
+        self._function = function
+        self._fatal = fatal
+        self._result = None
+        self._error: typing.Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self) -> None:
+        try:
+            self._result = self._function()
+        except BaseException as e:
+            self._error = e
+            if self._fatal:
+                print(f"Boot: {self._thread.name} failed, exiting so we get restarted")
+                traceback.print_exc()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                # sys.exit() would only end this thread, and the main thread is off playing attract mode
+                os._exit(1)
+
+    def start(self) -> "Background":
+        self._thread.start()
+        return self
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def wait(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class BootTimer:
+    """
+    Stages on the main thread are back to back: done("serial") ends the stage that
+    began when the previous one was done (or when the process started). Anything
+    running alongside them goes through stage() or background() instead.
+
+    :param float budget: seconds from the process starting to attract mode that we're happy with
+    """
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.started = process_started()
+        self._last = self.started
+        self.stages: typing.List[typing.Tuple[str, float, float]] = []  # name, began, took (seconds since start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def done(self, name: str) -> None:
+        now = time.perf_counter()
+        self.stages.append((name, self._last - self.started, now - self._last))
+        self._last = now
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, began - self.started, time.perf_counter() - began))
+
+    def background(self, name: str, function: typing.Callable[[], typing.Any], fatal: bool = False) -> Background:
+        """Starts a stage on its own thread, so the main thread can keep booting. See Background for fatal."""
+
+        def timed():
+            with self.stage(name):
+                result = function()
+            print(f"Boot: {name} done in the background, {self.elapsed() * 1000:.0f}ms after start")
+            return result
+
+        return Background(f"boot-{name}", timed, fatal=fatal).start()
+
+    def report(self) -> None:
+        for name, began, took in sorted(self.stages, key=lambda stage: stage[1]):
+            print(f"Boot: {name:<16} +{began * 1000:6.0f}ms took {took * 1000:6.0f}ms")
+        total = self._last - self.started
+        verdict = "within" if total <= self.budget else "OVER"
+        print(f"Boot: ready {total * 1000:.0f}ms after start, {verdict} the {self.budget * 1000:.0f}ms budget")
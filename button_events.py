@@ -0,0 +1,120 @@
+import collections
+import threading
+import time
+import typing
+
+
+class ButtonEvent(typing.NamedTuple):
+    button: int  # 1-indexed, same as the beans
+    pressed: bool  # True on the press edge, False on the release edge
+    timestamp: float  # time.monotonic() when gpiozero told us about it
+
+
+class ButtonEvents:
+    """
+    Turns gpiozero's when_pressed/when_released callbacks into a timestamped,
+    thread-safe queue of edges so nobody has to spin on is_pressed anymore.
+
+    Callbacks fire on gpiozero's own thread, the game reads from its thread and
+    sleeps on a condition variable in between, so an idle cabinet is an idle CPU.
+    All deadlines are absolute time.monotonic() values, None means wait forever.
+    """
+
+    def __init__(self, buttons: typing.Sequence, clock: typing.Callable[[], float] = time.monotonic):
+        self._buttons = buttons
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._events: typing.Deque[ButtonEvent] = collections.deque()
+        self._held: typing.List[bool] = [bool(butt.is_pressed) for butt in buttons]
+        # Called with every edge on gpiozero's thread, outside the lock, e.g. to record the game
+        self.listeners: typing.List[typing.Callable[[ButtonEvent], typing.Any]] = []
+        for idx, butt in enumerate(buttons):
+            butt.when_pressed = self._edge_handler(idx + 1, True)
+            butt.when_released = self._edge_handler(idx + 1, False)
+
+    def _edge_handler(self, button: int, pressed: bool) -> typing.Callable[[], None]:
+        def handler():
+            self._on_edge(button, pressed)
+        return handler
+
+    def _on_edge(self, button: int, pressed: bool) -> None:
+        timestamp = self._clock()
+        with self._cond:
+            # Edge detection: gpiozero can hand us a repeat of the state we
+            # already know about (bounce, or a callback racing is_pressed at
+            # startup), so only queue actual transitions.
+            if self._held[button - 1] == pressed:
+                return
+            self._held[button - 1] = pressed
+            event = ButtonEvent(button, pressed, timestamp)
+            self._deliver(event)
+        for listener in self.listeners:
+            listener(event)
+
+    def _deliver(self, event: ButtonEvent) -> None:
+        """Hands a new edge to whoever's reading. Runs on gpiozero's thread with the lock held."""
+        self._events.append(event)
+        self._cond.notify_all()
+
+    def _timeout(self, deadline: typing.Optional[float]) -> typing.Optional[float]:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - self._clock())
+
+    def pressed_buttons(self) -> typing.Tuple[int, ...]:
+        """
+        Returns every 1-indexed button that is currently held down, not just
+        the lowest one like the old poll_buttons() did.
+        """
+        with self._cond:
+            return tuple(idx + 1 for idx, held in enumerate(self._held) if held)
+
+    def clear(self) -> None:
+        """Throws away any queued edges, e.g. presses made while we weren't asking."""
+        with self._cond:
+            self._events.clear()
+
+    def get(self, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        """Pops the next edge, or returns None if the deadline passes first."""
+        with self._cond:
+            while not self._events:
+                timeout = self._timeout(deadline)
+                if timeout == 0.0:
+                    return None
+                self._cond.wait(timeout)
+            return self._events.popleft()
+
+    def peek(self, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        """Like get(), but leaves the edge in the queue for whoever reads next."""
+        with self._cond:
+            while not self._events:
+                timeout = self._timeout(deadline)
+                if timeout == 0.0:
+                    return None
+                self._cond.wait(timeout)
+            return self._events[0]
+
+    def wait_for_press(self, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        """Pops edges until a press shows up. Release edges on the way are dropped."""
+        while True:
+            event = self.get(deadline)
+            if event is None or event.pressed:
+                return event
+
+    def wait_for_release(self, button: int, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        """
+        Waits for the given button to come back up. Returns the release edge, or
+        None on timeout. Returns immediately if the button isn't held anymore.
+        """
+        with self._cond:
+            while True:
+                for event in self._events:
+                    if event.button == button and not event.pressed:
+                        self._events.remove(event)
+                        return event
+                if not self._held[button - 1]:
+                    return ButtonEvent(button, False, self._clock())
+                timeout = self._timeout(deadline)
+                if timeout == 0.0:
+                    return None
+                self._cond.wait(timeout)
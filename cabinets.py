@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Several cabinets off one host, each with its own buttons, pawbeans and mixer channels.
+
+Every cabinet is a simon_async.AsyncGame on the same event loop. They share the
+process, the decoded sounds, the sound card and the game store, and nothing else:
+a cabinet's cheat mode, sequence and timeouts are its own, and its beans play on
+its own group of reserved mixer channels so one cabinet can't cut another off.
+
+The supervisor restarts a cabinet whose game blows up (say its USB serial got
+yanked) after a growing backoff, without touching the others.
+
+    python3 cabinets.py --cabinet left:GPIO23,GPIO22,GPIO17,GPIO27:/dev/ttyUSB0 \\
+                        --cabinet right:GPIO5,GPIO6,GPIO13,GPIO19:/dev/ttyUSB1
+
+With no --cabinet it's the usual one, LegallyDistinctSimon.CABINET. --simulate runs
+them all on the simulated hardware, see scripts/bench_cabinets.py for how many one
+host can keep up with.
+"""
+import argparse
+import asyncio
+import traceback
+import typing
+
+import LegallyDistinctSimon as simon
+from hardware import Cabinet, PiHardware, SimulatedHardware
+from simon_async import AsyncGame, prepare_sounds
+from tracing import TRACER
+
+RESTART_BACKOFF = 1.0  # seconds before restarting a crashed cabinet, doubling every crash in a row
+MAX_RESTART_BACKOFF = 30.0
+
+
+def parse_cabinet(spec: str, channel_group: int) -> Cabinet:
+    """NAME:PIN,PIN,PIN,PIN:PORT, as taken by --cabinet."""
+    name, pins, port = spec.split(":", 2)
+    pins = tuple(pins.split(","))
+    if len(pins) != simon.NUM_BEANS:
+        raise ValueError(f"Cabinet {name} needs {simon.NUM_BEANS} button pins, got {len(pins)}")
+    return Cabinet(name, pins, port, channel_group)
+
+
+class Supervisor:
+    """
+    :param hardware: the host's hardware.PiHardware or hardware.SimulatedHardware
+    :param cabinets: one hardware.Cabinet per cabinet, channel groups 0 to N-1
+    """
+
+    def __init__(self, hardware, cabinets: typing.Sequence[Cabinet]):
+        self._hardware = hardware
+        self.cabinets = list(cabinets)
+        groups = sorted(cabinet.channel_group for cabinet in self.cabinets)
+        if groups != list(range(len(self.cabinets))):
+            raise ValueError(f"Channel groups should be 0 to {len(self.cabinets) - 1}, got {groups}")
+        self.games = [AsyncGame(hardware, cabinet) for cabinet in self.cabinets]
+        self.restarts = [0] * len(self.games)
+
+    async def _supervise(self, index: int) -> None:
+        game = self.games[index]
+        backoff = RESTART_BACKOFF
+        while True:
+            try:
+                await game.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.restarts[index] += 1
+                game.log(f"Crashed, restarting in {backoff:.0f}s:\n{traceback.format_exc()}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+
+    async def run(self) -> None:
+        """Runs every cabinet until cancelled. The sounds get set up here, once for all of them."""
+        prepare_sounds(self._hardware, cabinets=len(self.cabinets))
+        await asyncio.gather(*(self._supervise(index) for index in range(len(self.games))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cabinet", action="append", default=[], help="NAME:PIN,PIN,PIN,PIN:PORT, once per cabinet")
+    parser.add_argument("--low-latency-audio", action="store_true", help="open the mixer with LOW_LATENCY_AUDIO_CONFIG")
+    parser.add_argument("--simulate", action="store_true", help="fake buttons, pawbeans and audio for every cabinet")
+    args = parser.parse_args()
+    cabinets = [parse_cabinet(spec, group) for group, spec in enumerate(args.cabinet)] or [simon.CABINET]
+    if args.low_latency_audio:
+        simon.SOUNDS.use_audio(simon.LOW_LATENCY_AUDIO_CONFIG)
+    hardware = SimulatedHardware() if args.simulate else PiHardware()
+    TRACER.install()
+    try:
+        asyncio.run(Supervisor(hardware, cabinets).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
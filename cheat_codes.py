@@ -0,0 +1,67 @@
+import typing
+from enum import Enum
+
+
+class MatchState(Enum):
+    partial = "partial"  # could still turn into a code, keep listening
+    complete = "complete"  # a code, and nothing longer starts with it: done
+    complete_prefix = "complete_prefix"  # a code, but a longer one starts with it too
+    no_match = "no_match"  # nothing can match anymore: done
+
+
+class _Node:
+    __slots__ = ("children", "mode")
+
+    def __init__(self):
+        self.children: typing.Dict[int, "_Node"] = {}
+        self.mode: typing.Optional[str] = None
+
+
+class CheatCodeMatcher:
+    """
+    Prefix trie over the cheat codes, fed one button press at a time, so the cheat
+    window can close as soon as the outcome is known instead of always waiting it out.
+
+    :param dict codes: mode name -> list of 1-indexed buttons, i.e. CHEAT_MODES
+    """
+
+    def __init__(self, codes: typing.Dict[str, typing.Sequence[int]]):
+        self._root = _Node()
+        for mode, code in codes.items():
+            node = self._root
+            for button in code:
+                node = node.children.setdefault(button, _Node())
+            if node.mode is not None:
+                raise ValueError(f"{mode} and {node.mode} have the same code {list(code)}")
+            node.mode = mode
+        self._node: typing.Optional[_Node] = self._root
+
+    def reset(self) -> None:
+        self._node = self._root
+
+    @property
+    def mode(self) -> typing.Optional[str]:
+        """The cheat mode entered so far, or None if what's been pressed isn't exactly a code."""
+        return self._node.mode if self._node is not None else None
+
+    @property
+    def state(self) -> MatchState:
+        if self._node is None:
+            return MatchState.no_match
+        if self._node.mode is None:
+            return MatchState.partial
+        return MatchState.complete_prefix if self._node.children else MatchState.complete
+
+    def press(self, button: int) -> MatchState:
+        if self._node is not None:
+            self._node = self._node.children.get(button)
+        return self.state
+
+    def match(self, buttons: typing.Sequence[int]) -> typing.Optional[str]:
+        """The mode for a whole list of presses at once, without touching the running state."""
+        node = self._root
+        for button in buttons:
+            node = node.children.get(button)
+            if node is None:
+                return None
+        return node.mode
@@ -0,0 +1,171 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import typing
+
+
+class GameRecord(typing.NamedTuple):
+    played_at: str  # ISO timestamp of when the game ended
+    cheat_mode: typing.Optional[str]
+    score: int
+    duration: float  # seconds from the first SAY to game over
+    reaction_times: typing.Tuple[float, ...]  # seconds from prompt to press, for every correct press
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    played_at TEXT NOT NULL,
+    cheat_mode TEXT,
+    score INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    reaction_times TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_score ON games (score DESC, id);
+
+-- Running totals, kept up to date by the trigger below so reading them never scans games
+CREATE TABLE IF NOT EXISTS totals (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS games_totals AFTER INSERT ON games BEGIN
+    INSERT INTO totals (key, value) VALUES ('total_games', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1;
+    INSERT INTO totals (key, value) VALUES ('mode:' || coalesce(NEW.cheat_mode, 'normal'), 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1;
+    INSERT INTO totals (key, value) VALUES ('high_score', NEW.score)
+        ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value);
+END;
+"""
+
+
+class GameStore:
+    """
+    Every game ever played, one row each, in SQLite.
+
+    Writes are a single append in their own transaction with the WAL journal and
+    synchronous=FULL, so yanking the power mid-write loses at most the game being
+    written rather than the whole history. The WAL gets checkpointed back into the
+    main file every checkpoint_every games so it doesn't grow forever.
+
+    High score and per-mode counts live in a totals table that a trigger keeps up to
+    date, and the leaderboard is an index walk, so none of them get slower as the
+    game count grows.
+
+    The connection is opened on first use. An old odometer.json next to the
+    database gets folded into the totals the first time.
+
+    :param str path: the SQLite database file
+    :param int checkpoint_every: games between WAL checkpoints
+    """
+
+    def __init__(self, path: str, checkpoint_every: int = 50):
+        self._path = path
+        self._checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        self._db: typing.Optional[sqlite3.Connection] = None
+        self._games_since_checkpoint = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            # Shared with whoever wants to read scores from another thread, hence the lock
+            db = sqlite3.connect(self._path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.executescript(_SCHEMA)
+            self._db = db
+            self._migrate_odometer()
+        return self._db
+
+    def _migrate_odometer(self) -> None:
+        odometer_path = os.path.join(os.path.dirname(self._path), "odometer.json")
+        db = self._db
+        if db.execute("SELECT 1 FROM meta WHERE key = 'odometer_started'").fetchone():
+            return
+        started = datetime.datetime.now().isoformat()
+        with db:
+            db.execute("BEGIN")
+            if os.path.isfile(odometer_path):
+                with open(odometer_path) as odometer_file:
+                    odometer = json.load(odometer_file)
+                started = odometer.pop("odometer_started", started)
+                print(f"Game store: importing totals from {odometer_path}")
+                for key, value in odometer.items():
+                    if key not in ("total_games", "high_score"):
+                        key = f"mode:{key}"
+                    db.execute("INSERT OR REPLACE INTO totals (key, value) VALUES (?, ?)", (key, value))
+            db.execute("INSERT INTO meta (key, value) VALUES ('odometer_started', ?)", (started,))
+
+    def _total(self, key: str) -> int:
+        row = self._connect().execute("SELECT value FROM totals WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def record(
+        self,
+        cheat_mode: typing.Optional[str],
+        score: int,
+        duration: float,
+        reaction_times: typing.Sequence[float],
+    ) -> GameRecord:
+        game = GameRecord(
+            played_at=datetime.datetime.now().isoformat(),
+            cheat_mode=cheat_mode,
+            score=score,
+            duration=duration,
+            reaction_times=tuple(round(seconds, 4) for seconds in reaction_times),
+        )
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute("BEGIN")
+                db.execute(
+                    "INSERT INTO games (played_at, cheat_mode, score, duration, reaction_times) VALUES (?, ?, ?, ?, ?)",
+                    (game.played_at, game.cheat_mode, game.score, game.duration, json.dumps(game.reaction_times)),
+                )
+            self._games_since_checkpoint += 1
+            if self._games_since_checkpoint >= self._checkpoint_every:
+                db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._games_since_checkpoint = 0
+        return game
+
+    @property
+    def total_games(self) -> int:
+        with self._lock:
+            return self._total("total_games")
+
+    @property
+    def high_score(self) -> int:
+        with self._lock:
+            return self._total("high_score")
+
+    def mode_counts(self) -> typing.Dict[str, int]:
+        """Games played per cheat mode, "normal" for no cheat code."""
+        with self._lock:
+            rows = self._connect().execute("SELECT key, value FROM totals WHERE key LIKE 'mode:%'").fetchall()
+        return {key[len("mode:"):]: value for key, value in rows}
+
+    def leaderboard(self, limit: int = 10) -> typing.List[GameRecord]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT played_at, cheat_mode, score, duration, reaction_times FROM games "
+                "ORDER BY score DESC, id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            GameRecord(played_at, cheat_mode, score, duration, tuple(json.loads(reaction_times)))
+            for played_at, cheat_mode, score, duration, reaction_times in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._db.close()
+                self._db = None
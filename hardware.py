@@ -0,0 +1,459 @@
+"""
+Everything the game touches outside of Python: buttons, the pawbean serial port,
+the audio mixer and the odd child process (video player, sprite overlay).
+
+PiHardware is the real cabinet. SimulatedHardware is the same game on any Linux box:
+gpiozero's mock pins for the buttons, an in-memory pawbean board that parses the
+serial protocol into a framebuffer, and a mixer that knows how long every sound is
+but never opens a sound card.
+"""
+import collections
+import struct
+import subprocess
+import sys
+import threading
+import time
+import typing
+
+from pawbeans import NUM_BEANS, decode_command
+
+
+class PygameMixer:
+    """pygame.mixer, for the real thing. pygame gets imported on first use."""
+
+    def init(self, config) -> None:
+        """:param config: a sound_registry.AudioConfig"""
+        import pygame
+
+        # allowedchanges=0: if the card wants something else, SDL converts, rather than
+        # us quietly ending up with a different rate or buffer than we asked for
+        pygame.mixer.init(config.frequency, config.size, config.channels, config.buffer, allowedchanges=0)  # raises exception on fail
+
+    def get_init(self) -> typing.Tuple[int, int, int]:
+        import pygame
+
+        return pygame.mixer.get_init()
+
+    def Sound(self, path: str):
+        import pygame
+
+        return pygame.mixer.Sound(path)
+
+    def Channel(self, index: int):
+        import pygame
+
+        return pygame.mixer.Channel(index)
+
+    def sound_array(self, sound):
+        """A sound's samples as a NumPy array, (samples,) for mono or (samples, channels)."""
+        import pygame.sndarray
+
+        return pygame.sndarray.array(sound)
+
+    def make_sound(self, samples):
+        import pygame.sndarray
+
+        return pygame.sndarray.make_sound(samples)
+
+    def set_num_channels(self, count: int) -> None:
+        import pygame
+
+        pygame.mixer.set_num_channels(count)
+
+    def set_reserved(self, count: int) -> None:
+        import pygame
+
+        pygame.mixer.set_reserved(count)
+
+
+class WavInfo(typing.NamedTuple):
+    frequency: int
+    channels: int
+    bits: int
+    seconds: float
+
+
+def wav_info(path: str) -> WavInfo:
+    """What's in a WAV file, from its header. Copes with WAVE_FORMAT_EXTENSIBLE, unlike wave."""
+    with open(path, "rb") as wav_file:
+        riff, _, wave = struct.unpack("<4sI4s", wav_file.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path} isn't a WAV file")
+        fmt = None
+        while True:
+            header = wav_file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                # format tag, channels, sample rate, byte rate, block align, bits per sample
+                fmt = struct.unpack("<HHIIHH", wav_file.read(16))
+                wav_file.seek(chunk_size - 16 + (chunk_size & 1), 1)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} has data before fmt")
+                _, channels, frequency, byte_rate, _, bits = fmt
+                return WavInfo(frequency, channels, bits, chunk_size / byte_rate)
+            else:
+                wav_file.seek(chunk_size + (chunk_size & 1), 1)
+
+
+class NullChannel:
+    """A pygame.mixer.Channel that's busy for exactly as long as whatever it's playing."""
+
+    def __init__(self, mixer: "NullMixer"):
+        self._mixer = mixer
+        self._sound: typing.Optional["NullSound"] = None
+        self._ends_at = 0.0
+
+    def play(self, sound: "NullSound") -> None:
+        # Same as pygame, whatever was on the channel gets cut off
+        self.stop()
+        self._mixer._log("play", sound.path)
+        self._sound = sound
+        self._ends_at = time.monotonic() + sound.get_length()
+
+    def get_busy(self) -> bool:
+        return time.monotonic() < self._ends_at
+
+    def get_sound(self) -> typing.Optional["NullSound"]:
+        return self._sound if self.get_busy() else None
+
+    def stop(self) -> None:
+        if self.get_busy():
+            self._mixer._log("stop", self._sound.path)
+        self._ends_at = 0.0
+
+
+class NullSound:
+    """Stands in for pygame.mixer.Sound: plays for exactly as long as the real one would, silently."""
+
+    def __init__(self, mixer: "NullMixer", path: str, length: typing.Optional[float] = None):
+        self._mixer = mixer
+        self.path = path
+        self._length = wav_info(path).seconds if length is None else length
+        self._channels: typing.List[NullChannel] = []
+
+    def get_length(self) -> float:
+        return self._length
+
+    def play(self) -> NullChannel:
+        channel = NullChannel(self._mixer)
+        channel.play(self)
+        self._channels = [c for c in self._channels if c.get_busy()] + [channel]
+        return channel
+
+    def stop(self) -> None:
+        for channel in self._channels + list(self._mixer._reserved.values()):
+            if channel.get_sound() is self:
+                channel.stop()
+        self._channels = []
+
+
+class NullMixer:
+    """
+    A mixer with no sound card behind it. Keeps the last `history` play/stop calls
+    as (time.monotonic(), "play" or "stop", path) in .history, so scripted runs can
+    check what would have come out of the speaker.
+    """
+
+    def __init__(self, history: int = 1000):
+        self._config = None
+        self._reserved: typing.Dict[int, NullChannel] = {}
+        self.history: typing.Deque[typing.Tuple[float, str, str]] = collections.deque(maxlen=history)
+
+    def init(self, config) -> None:
+        self._config = config
+
+    def get_init(self) -> typing.Tuple[int, int, int]:
+        return self._config.frequency, self._config.size, self._config.channels
+
+    def Sound(self, path: str) -> NullSound:
+        return NullSound(self, path)
+
+    def sound_array(self, sound: NullSound):
+        """Silence as long as the sound, in the shape pygame.sndarray would give us."""
+        import numpy
+
+        shape = (round(sound.get_length() * self._config.frequency),)
+        if self._config.channels > 1:
+            shape += (self._config.channels,)
+        return numpy.zeros(shape, dtype=numpy.int16)
+
+    def make_sound(self, samples) -> NullSound:
+        return NullSound(self, "<generated>", length=len(samples) / self._config.frequency)
+
+    def Channel(self, index: int) -> NullChannel:
+        # Like pygame, every Channel(i) is the same channel underneath
+        if index not in self._reserved:
+            self._reserved[index] = NullChannel(self)
+        return self._reserved[index]
+
+    def set_num_channels(self, count: int) -> None:
+        pass
+
+    def set_reserved(self, count: int) -> None:
+        pass
+
+    def _log(self, what: str, path: str) -> None:
+        self.history.append((time.monotonic(), what, path))
+
+
+class SimulatedPawbeans:
+    """
+    An in-memory pawbean board. Takes the same bytes the ESP32 would, parses them with
+    pawbeans.decode_command and keeps the resulting colors in .beans, one (r, g, b)
+    per bean. Quacks enough like serial.Serial for the Framebuffer and SerialLink,
+    including answering OK or ERR to everything after an ACKS 1.
+
+    :param bool verbose: print the beans every time they change
+    """
+
+    def __init__(self, verbose: bool = False):
+        self._verbose = verbose
+        self._pending = b""
+        self._lock = threading.Lock()
+        self._replied = threading.Condition(self._lock)
+        self._cancelled = False
+        self.timeout = 1.0  # how long readline() waits, like serial.Serial's
+        self.acks = False
+        self.beans: typing.List[typing.Tuple[int, int, int]] = [(0, 0, 0)] * NUM_BEANS
+        self.animation: typing.Optional[str] = None
+        # Called with (command, beans) after every command, from whichever thread wrote it
+        self.listeners: typing.List[typing.Callable] = []
+        self.replies = b""  # what the board would have said back, for read()
+
+    def __enter__(self) -> "SimulatedPawbeans":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def write(self, data: bytes) -> int:
+        with self._lock:
+            self._pending += data
+            while b"\n" in self._pending:
+                line, self._pending = self._pending.split(b"\n", 1)
+                self._process(line.decode("latin1"))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.replies)
+
+    def read(self, size: int = 1) -> bytes:
+        with self._lock:
+            data, self.replies = self.replies[:size], self.replies[size:]
+        return data
+
+    def readline(self) -> bytes:
+        """A whole reply line, or whatever's there after .timeout, like serial.Serial."""
+        with self._replied:
+            self._replied.wait_for(lambda: b"\n" in self.replies or self._cancelled, self.timeout)
+            self._cancelled = False
+            if b"\n" in self.replies:
+                line, self.replies = self.replies.split(b"\n", 1)
+                return line + b"\n"
+            data, self.replies = self.replies, b""
+            return data
+
+    def cancel_read(self) -> None:
+        with self._replied:
+            self._cancelled = True
+            self._replied.notify_all()
+
+    def _reply(self, line: str) -> None:
+        self.replies += line.encode("latin1") + b"\r\n"
+        self._replied.notify_all()
+
+    def _process(self, line: str) -> None:
+        # Any byte stops a firmware animation, just like the real thing
+        self.animation = None
+        try:
+            command = decode_command(line)
+        except ValueError as e:
+            print(f"Simulated pawbeans: {e}")
+            if self.acks:
+                self._reply("ERR")
+            return
+        if command.name == "ACKS":
+            self.acks = bool(command.args[0])
+        if self.acks:
+            self._reply("OK")
+        if command.name.startswith("ANIM"):
+            self.animation = command.name.split()[1]
+        for bean, rgb in command.updates:
+            if bean == 0:
+                self.beans = [rgb] * NUM_BEANS
+            else:
+                self.beans[bean - 1] = rgb
+        if self._verbose and (command.updates or self.animation):
+            lit = " ".join("[%3d %3d %3d]" % rgb for rgb in self.beans)
+            print(f"PAWBEANS: {lit}" + (f" animating {self.animation}" if self.animation else ""))
+        for listener in self.listeners:
+            listener(command, tuple(self.beans))
+
+
+class SimulatedPipe:
+    """A child's stdin that keeps the last few lines written to it, in .lines."""
+
+    def __init__(self, history: int = 100):
+        self.lines: typing.Deque[str] = collections.deque(maxlen=history)
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        if self.closed:
+            raise ValueError("write to closed pipe")
+        self.lines.extend(data.decode("latin1").splitlines())
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class SimulatedProcess:
+    """Stands in for a subprocess.Popen of something we don't want running headless."""
+
+    def __init__(self, args, stdin=None):
+        self.args = args
+        self.pid = None
+        self.returncode: typing.Optional[int] = None
+        self.stdin = SimulatedPipe() if stdin == subprocess.PIPE else None
+
+    def poll(self) -> typing.Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: typing.Optional[float] = None) -> int:
+        if self.returncode is None:
+            self.returncode = 0
+        return self.returncode
+
+    def send_signal(self, signum: int) -> None:
+        pass
+
+    def terminate(self) -> None:
+        self.returncode = -15
+
+    def kill(self) -> None:
+        self.returncode = -9
+
+
+class Cabinet(typing.NamedTuple):
+    """
+    Where one cabinet's bits are plugged in, for a host driving more than one.
+
+    :param name: for the logs, empty for a host with just the one
+    :param button_pins: GPIO pins of the buttons, in bean order
+    :param serial_port: where its pawbeans are
+    :param channel_group: which NUM_BEANS reserved mixer channels its beans play on
+    """
+
+    name: str
+    button_pins: typing.Tuple[str, ...]
+    serial_port: str
+    channel_group: int = 0
+
+
+class PiHardware:
+    """The real cabinet: GPIO buttons, the ESP32 on a USB serial port, pygame audio."""
+
+    def __init__(self):
+        self.mixer = PygameMixer()
+
+    def buttons(self, pins: typing.Sequence[str]) -> list:
+        import gpiozero
+
+        return [gpiozero.Button(pin, bounce_time=0.01) for pin in pins]
+
+    def serial(self, port: str):
+        import serial
+
+        return serial.Serial(port, 115200, timeout=1)
+
+    def launch(self, args, **popen_kwargs) -> subprocess.Popen:
+        """:param popen_kwargs: passed on to Popen, e.g. stdin=subprocess.PIPE"""
+        return subprocess.Popen(args, **popen_kwargs)
+
+
+class SimulatedHardware:
+    """
+    The whole cabinet in memory. Buttons are gpiozero Buttons on mock pins, so they
+    fire the same callbacks; push them with press()/release()/tap().
+
+    :param bool verbose: print the pawbeans every time they change
+    :param bool launch_processes: actually run child processes instead of faking them
+    """
+
+    def __init__(self, verbose: bool = False, launch_processes: bool = False):
+        self.mixer = NullMixer()
+        self.pawbeans = SimulatedPawbeans(verbose=verbose)
+        self._verbose = verbose
+        self._launch_processes = launch_processes
+        # One board per serial port and one set of buttons per buttons() call, for more
+        # than one cabinet. The first of each is .pawbeans and what press() pushes.
+        self.boards: typing.Dict[str, SimulatedPawbeans] = {}
+        self.button_sets: typing.List[list] = []
+        self.launched: typing.List[typing.Any] = []  # args of everything launch() was asked to run
+
+    def buttons(self, pins: typing.Sequence[str]) -> list:
+        import gpiozero
+        from gpiozero.pins.mock import MockFactory
+
+        if not isinstance(gpiozero.Device.pin_factory, MockFactory):
+            gpiozero.Device.pin_factory = MockFactory()
+        buttons = [gpiozero.Button(pin, bounce_time=None) for pin in pins]
+        self.button_sets.append(buttons)
+        return buttons
+
+    def serial(self, port: str) -> SimulatedPawbeans:
+        if port not in self.boards:
+            self.boards[port] = SimulatedPawbeans(verbose=self._verbose) if self.boards else self.pawbeans
+        return self.boards[port]
+
+    def launch(self, args, **popen_kwargs):
+        # Only the args get kept, holding on to a Popen would stop it ever being reaped
+        self.launched.append(args)
+        if self._launch_processes:
+            return subprocess.Popen(args, **popen_kwargs)
+        return SimulatedProcess(args, stdin=popen_kwargs.get("stdin"))
+
+    def press(self, button: int, cabinet: int = 0) -> None:
+        """:param cabinet: which buttons() call's buttons, in order"""
+        self.button_sets[cabinet][button - 1].pin.drive_low()
+
+    def release(self, button: int, cabinet: int = 0) -> None:
+        self.button_sets[cabinet][button - 1].pin.drive_high()
+
+    def tap(self, button: int, hold: float = 0.05, cabinet: int = 0) -> None:
+        self.press(button, cabinet)
+        time.sleep(hold)
+        self.release(button, cabinet)
+
+    def tap_from_stdin(self) -> threading.Thread:
+        """
+        Lets you play from a terminal: every line typed taps the buttons it names,
+        so "1" taps button 1 and "4321" taps four in a row. Anything typed before the
+        game has asked for its buttons gets ignored.
+        """
+        def read_lines():
+            for line in sys.stdin:
+                if not self.button_sets:
+                    print("Simulated buttons: not wired up yet, ignoring that")
+                    continue
+                for char in line.strip():
+                    if char.isdigit() and 1 <= int(char) <= len(self.button_sets[0]):
+                        self.tap(int(char))
+                        time.sleep(0.05)
+
+        thread = threading.Thread(target=read_lines, name="stdin-buttons", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,90 @@
+"""
+One mplayer that stays running for the whole day, for blue mode's and ogre mode's videos.
+
+Starting mplayer cold on a Pi (exec, load every codec library, open the output)
+takes long enough to stutter the first SAY sequence after a cheat unlock. Instead
+it's started once, idle and in slave mode, and every clip after that is just a
+line on its stdin: `loadfile` to start one, `stop` to end it. Without -fixed-vo
+the video window closes when a clip stops, so stopping is hiding, and the process
+stays warm for next time.
+
+If mplayer dies anyway it gets reaped and started again on the next play(). If it
+can't be started at all (not installed, say), that gets logged and play() and
+stop() do nothing, so the cabinet still boots without its videos.
+"""
+import subprocess
+import typing
+
+MPLAYER_ARGS = ("mplayer", "-slave", "-idle", "-quiet", "-geometry", "300x300+300+300")
+
+
+class MediaPlayer:
+    """
+    :param launch: starts a process, hardware.PiHardware.launch or SimulatedHardware.launch
+    :param args: the mplayer command line, must keep -slave and -idle
+    """
+
+    def __init__(self, launch: typing.Callable, args: typing.Sequence[str] = MPLAYER_ARGS):
+        self._launch = launch
+        self._args = list(args)
+        self._process = None
+        self.playing: typing.Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """Gets mplayer up and idle, if it isn't already. Call it long before anyone needs a video."""
+        if self.running:
+            return
+        if self._process is not None:
+            # Died on us, reap it before starting another
+            self._process.wait()
+            print(f"Media player: mplayer exited with {self._process.returncode}, restarting")
+        try:
+            self._process = self._launch(self._args, stdin=subprocess.PIPE)
+        except OSError as e:
+            # No mplayer (or no way to run it) is no reason not to boot, the videos just don't show
+            print(f"Media player: couldn't start {self._args[0]}: {e}")
+            self._process = None
+
+    def _command(self, command: str) -> bool:
+        if not self.running:
+            return False
+        try:
+            self._process.stdin.write(f"{command}\n".encode())
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            return False
+        return True
+
+    def play(self, path: str) -> None:
+        """Starts a clip, in place of whatever's playing."""
+        if not self._command(f'loadfile "{path}"'):
+            self.start()
+            self._command(f'loadfile "{path}"')
+        self.playing = path
+
+    def stop(self) -> None:
+        """Stops (and hides) the clip, leaving mplayer running."""
+        if self.playing is not None:
+            self._command("stop")
+            self.playing = None
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Quits mplayer for good and waits for it, so it doesn't hang around as a zombie."""
+        if self._process is None:
+            return
+        self._command("quit")
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+        try:
+            self._process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+        self.playing = None
@@ -0,0 +1,278 @@
+"""
+Live numbers for a cabinet, in Prometheus' text format, from an HTTP endpoint on
+localhost or a Unix socket:
+
+    curl -s localhost:9464/metrics
+    curl -s --unix-socket /run/simon/metrics.sock http://simon/metrics
+
+Nothing the game does takes a lock for this. Every counter has exactly one thread
+that writes it (the game's, for everything in GameMetrics), and a plain += on an
+int attribute or array slot from one thread is safe under the GIL. The server's
+thread only ever reads, so a scrape can be a game behind but never blocks the game.
+Whatever has its own counters already, like SerialLink, is read at scrape time
+instead of being counted twice.
+"""
+import array
+import bisect
+import os
+import threading
+import time
+import typing
+
+METRICS_PATH = "/metrics"
+SCORE_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+STATES = ("attract", "cheat", "game")
+
+
+def _labels(labels: typing.Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A counter, optionally split by one label. Single writer: only one thread may inc() it.
+
+    :param str label: the label's name, e.g. "mode", or None for a plain counter
+    :param values: the label values to report from the start, even at 0
+    """
+
+    def __init__(self, name: str, help: str, label: typing.Optional[str] = None, values: typing.Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self._label = label
+        self._values: typing.Dict[typing.Optional[str], float] = {value: 0 for value in values} if label else {None: 0}
+
+    def inc(self, amount: float = 1, value: typing.Optional[str] = None) -> None:
+        self._values[value] = self._values.get(value, 0) + amount
+
+    def lines(self) -> typing.List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        # list() copies in one go under the GIL, so a new label value turning up mid-scrape is fine
+        for value, count in list(self._values.items()):
+            lines.append(f"{self.name}{_labels({self._label: value} if self._label else {})} {_number(count)}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram over fixed upper bounds. Single writer, like Counter."""
+
+    def __init__(self, name: str, help: str, buckets: typing.Sequence[float]):
+        self.name = name
+        self.help = help
+        self._bounds = list(buckets)
+        self._counts = array.array("Q", bytes(8 * (len(self._bounds) + 1)))  # the last one is +Inf
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._sum += value
+
+    def lines(self) -> typing.List[str]:
+        counts = list(self._counts)
+        total = self._sum
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self._bounds + ["+Inf"], counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_number(total)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class Registry:
+    """Everything to report, and the server that reports it."""
+
+    def __init__(self):
+        self._metrics: typing.List = []
+        # Called at scrape time for (name, type, help, [(labels, value)]), for numbers kept elsewhere
+        self._collectors: typing.List[typing.Callable[[], typing.Iterable[typing.Tuple]]] = []
+        self._server = None
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, collector: typing.Callable[[], typing.Iterable[typing.Tuple]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.lines())
+        for collector in list(self._collectors):
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, address: str) -> bool:
+        """
+        Serves render() on a daemon thread. `address` is HOST:PORT, or unix:PATH for a
+        Unix socket. Returns False (and the game carries on) if it can't listen there.
+        """
+        # Not needed for the first frame, so not imported until now
+        import http.server
+        import socketserver
+
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != METRICS_PATH:
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def address_string(self):
+                return str(self.client_address or "unix")
+
+            def log_message(self, format, *args):
+                pass  # a scrape every 15s doesn't need to be in the game's output
+
+        try:
+            if address.startswith("unix:"):
+                path = address[len("unix:"):]
+                if os.path.exists(path):
+                    os.unlink(path)  # left over from last time
+
+                class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+                    daemon_threads = True
+
+                server = UnixServer(path, Handler)
+            else:
+                host, port = address.rsplit(":", 1)
+                server = http.server.ThreadingHTTPServer((host, int(port)), Handler)
+        except (OSError, ValueError) as e:
+            print(f"Metrics: can't listen on {address} ({e}), carrying on without")
+            return False
+        self._server = server
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        print(f"Metrics: serving on {address}{METRICS_PATH}")
+        return True
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class GameMetrics:
+    """
+    What one cabinet's game reports. Every method here gets called from the game's
+    thread only, that's what keeps it lock-free.
+
+    :param modes: every cheat mode's name, so they all show up before anyone's played them
+    """
+
+    def __init__(self, modes: typing.Iterable[str]):
+        self.registry = Registry()
+        add = self.registry.add
+        self.games_started = add(Counter("simon_games_started_total", "Games started, i.e. attract mode ended by a press"))
+        self.games_finished = add(Counter("simon_games_finished_total", "Games played through to game over"))
+        self.scores = add(Histogram("simon_score", "Score at game over", SCORE_BUCKETS))
+        self.cheat_modes = add(
+            Counter("simon_cheat_mode_games_total", "Games by cheat mode", "mode", ["normal", *modes])
+        )
+        self.presses = add(Counter("simon_presses_total", "Correct presses while repeating a sequence"))
+        self.state_seconds = add(
+            Counter("simon_state_seconds_total", "Seconds spent in attract mode, the cheat zone and games", "state", STATES)
+        )
+        # (state, time.monotonic() it started) swapped in as one tuple, so a scrape never sees half of it
+        self._state: typing.Optional[typing.Tuple[str, float]] = None
+        self._game_thread: typing.Optional[int] = None
+        self.registry.collect(self._collect_time)
+
+    def serve(self, address: str) -> bool:
+        return self.registry.serve(address)
+
+    def enter(self, state: str) -> None:
+        """The game moved on to one of STATES. The time since the last one goes on that one's counter."""
+        now = time.monotonic()
+        if self._state is not None:
+            previous, since = self._state
+            self.state_seconds.inc(now - since, previous)
+        self._state = (state, now)
+
+    def game_started(self) -> None:
+        self.games_started.inc()
+        self.enter("cheat")
+
+    def cheat_mode(self, mode: typing.Optional[str]) -> None:
+        self.cheat_modes.inc(value=mode or "normal")
+        self.enter("game")
+
+    def game_finished(self, score: int) -> None:
+        self.games_finished.inc()
+        self.scores.observe(score)
+
+    def watch_game_thread(self) -> None:
+        """Report the CPU time of the thread calling this, which should be the game's."""
+        self._game_thread = threading.get_ident()
+
+    def watch_serial(self, link, lights=None) -> None:
+        """
+        Report a serial_link.SerialLink's counters, and a pawbeans.Framebuffer's failed
+        writes, read straight off them at scrape time.
+        """
+
+        def collect():
+            stats = link.stats()
+            yield (
+                "simon_serial_commands_total",
+                "counter",
+                "Commands written to the pawbeans, by what became of them",
+                [({"result": result}, stats[result]) for result in ("sent", "acked", "errors", "lost")],
+            )
+            if lights is not None:
+                yield (
+                    "simon_serial_write_errors_total",
+                    "counter",
+                    "Writes to the pawbeans' serial port that failed outright",
+                    [({}, lights.write_errors)],
+                )
+
+        self.registry.collect(collect)
+
+    def _collect_time(self):
+        # The state we're in right now counts too, up to this scrape
+        current = self._state
+        if current is not None:
+            state, since = current
+            yield (
+                "simon_state",
+                "gauge",
+                "1 for the state the game is in",
+                [({"state": name}, int(name == state)) for name in STATES],
+            )
+            yield (
+                "simon_state_current_seconds",
+                "gauge",
+                "Seconds spent in the current state so far",
+                [({"state": state}, time.monotonic() - since)],
+            )
+        if self._game_thread is not None:
+            try:
+                cpu = time.clock_gettime(time.pthread_getcpuclockid(self._game_thread))
+            except (AttributeError, OSError):
+                cpu = None  # not Linux, or the thread's gone
+            if cpu is not None:
+                yield ("simon_game_loop_cpu_seconds_total", "counter", "CPU time used by the game loop's thread", [({}, cpu)])
+        yield ("process_cpu_seconds_total", "counter", "CPU time used by the whole process", [({}, time.process_time())])
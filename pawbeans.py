@@ -0,0 +1,302 @@
+"""
+The serial protocol spoken by the pawbean ESP32 (see arduino/LegallyDistinctSimon).
+
+Colors are passed around the same way the rest of the game does it, as "r g b" strings.
+Every command is one line of text:
+
+    ON <bean> <r> <g> <b>              set one bean, bean 0 is the whole strip
+    FRAME <rrggbb> <rrggbb> <rrggbb> <rrggbb>   set all beans with one write and one strip.show()
+    QUIET <0|1>                        turn the firmware's debug chatter off (1) or back on (0)
+    ACKS <0|1>                         answer every command with one OK or ERR line (1), or don't (0)
+    ANIM <name> <duration_ms> <params...>   run an animation on the ESP32 itself, see ANIMATIONS
+    STOP                               stop any animation and blank the strip
+
+Any byte at all stops a running animation, so the next ON or FRAME takes over straight away.
+"""
+import threading
+import time
+import typing
+
+from tracing import TRACER
+
+NUM_BEANS = 4
+OFF = "0 0 0"
+
+# Firmware animation name -> what comes after the duration, "color" params are sent as rrggbb
+ANIMATIONS = {
+    "RAINBOW": ("wait_ms",),
+    "CHASE": ("color", "wait_ms", "group_size"),
+    "WIPE": ("color", "wait_ms"),
+    "TWINKLE": ("on_ms",),
+    "CYCLE": ("step_ms",),
+}
+
+
+class Command(typing.NamedTuple):
+    name: str
+    # (bean, (r, g, b)) for every bean the command touches, bean 0 meaning the whole strip
+    updates: typing.Tuple[typing.Tuple[int, typing.Tuple[int, int, int]], ...] = ()
+    args: typing.Tuple[int, ...] = ()
+
+
+def _rgb(color: str) -> typing.Tuple[int, int, int]:
+    red, green, blue = (int(value) for value in color.split())
+    for value in (red, green, blue):
+        if not 0 <= value <= 255:
+            raise ValueError(f"Color value out of range in {color!r}")
+    return red, green, blue
+
+
+def encode_on(bean: int, color: str) -> str:
+    if not 0 <= bean <= NUM_BEANS:
+        raise ValueError(f"Incorrect bean index {bean}")
+    return f"ON {bean} {' '.join(str(value) for value in _rgb(color))}\n"
+
+
+def encode_frame(colors: typing.Sequence[str]) -> str:
+    if len(colors) != NUM_BEANS:
+        raise ValueError(f"A frame needs exactly {NUM_BEANS} colors, got {len(colors)}")
+    return "FRAME " + " ".join("%02X%02X%02X" % _rgb(color) for color in colors) + "\n"
+
+
+def encode_quiet(quiet: bool) -> str:
+    return f"QUIET {int(quiet)}\n"
+
+
+def encode_acks(acks: bool) -> str:
+    return f"ACKS {int(acks)}\n"
+
+
+def encode_anim(name: str, duration_ms: int, *params: typing.Union[int, str]) -> str:
+    if name not in ANIMATIONS:
+        raise ValueError(f"Unsupported animation {name!r}")
+    if len(params) != len(ANIMATIONS[name]):
+        raise ValueError(f"{name} takes {', '.join(ANIMATIONS[name])}, got {params!r}")
+    fields = [str(duration_ms)]
+    for kind, value in zip(ANIMATIONS[name], params):
+        fields.append("%02X%02X%02X" % _rgb(value) if kind == "color" else str(int(value)))
+    return f"ANIM {name} {' '.join(fields)}\n"
+
+
+def encode_stop() -> str:
+    return "STOP\n"
+
+
+def decode_command(line: str) -> Command:
+    """
+    Parses one command line the way the firmware does. Used by the fake devices in
+    scripts/ so the Python side can check itself without an ESP32 plugged in.
+    """
+    fields = line.split()
+    if not fields:
+        raise ValueError("Empty command")
+    name, args = fields[0], fields[1:]
+    if name == "ON":
+        if len(args) != 4:
+            raise ValueError(f"ON takes 4 arguments, got {line!r}")
+        bean = int(args[0])
+        if not 0 <= bean <= NUM_BEANS:
+            raise ValueError(f"Incorrect bean index {bean}")
+        return Command(name, updates=((bean, _rgb(" ".join(args[1:]))),))
+    if name == "FRAME":
+        if len(args) != NUM_BEANS:
+            raise ValueError(f"FRAME takes {NUM_BEANS} colors, got {line!r}")
+        updates = []
+        for bean, value in enumerate(args, start=1):
+            # The firmware wants exactly six hex digits, no sign or 0x
+            if len(value) != 6 or not all(digit in "0123456789abcdefABCDEF" for digit in value):
+                raise ValueError(f"Bad FRAME color {value!r}")
+            value = int(value, 16)
+            updates.append((bean, ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)))
+        return Command(name, updates=tuple(updates))
+    if name in ("QUIET", "ACKS"):
+        return Command(name, args=(int(args[0]),))
+    if name == "ANIM":
+        if not args or args[0] not in ANIMATIONS or len(args) != len(ANIMATIONS[args[0]]) + 2:
+            raise ValueError(f"Bad animation {line!r}")
+        kinds = ("duration_ms",) + ANIMATIONS[args[0]]
+        values = tuple(int(value, 16 if kind == "color" else 10) for kind, value in zip(kinds, args[1:]))
+        return Command(f"ANIM {args[0]}", args=values)
+    if name == "STOP":
+        return Command(name, updates=((0, (0, 0, 0)),))
+    raise ValueError(f"Unsupported command {name!r}")
+
+
+_SERIAL_WRITE = TRACER.span("serial_write")
+_SERIAL_FLUSH = TRACER.span("serial_flush")
+# From the first unwritten set() to the flush that put it on the wire
+_LIGHT_LATENCY = TRACER.span("light_set_to_flush")
+
+
+class Framebuffer:
+    """
+    The RGB state of every bean, written to the pawbeans by a dedicated writer thread.
+
+    The game just sets colors and moves on. Once per tick the writer works out which
+    beans actually changed since the last write and sends the shortest command that
+    covers them (one ON, ON 0 for the whole strip, or a FRAME), then flushes. So a
+    stalled serial port stalls the writer thread, never the game.
+
+    Beans are 1-indexed like the protocol, and bean 0 means all of them.
+
+    :param ser: an open serial.Serial (or anything with write() and flush())
+    :param float tick: how long the writer waits after the first change to pick up the rest
+    :param bool debug: print every command as it goes out
+    """
+
+    def __init__(self, ser, tick: float = 0.002, debug: bool = False):
+        self._ser = ser
+        self._tick = tick
+        self._debug = debug
+        self._cond = threading.Condition()
+        # Held while talking to the serial port, so raw commands can't interleave with frames
+        self._write_lock = threading.Lock()
+        self._wanted: typing.List[str] = [OFF] * NUM_BEANS
+        # What the pawbeans are showing right now, None if we don't know
+        self._sent: typing.List[typing.Optional[str]] = [None] * NUM_BEANS
+        self._changes = 0  # bumped on every set, so sync() knows what it's waiting for
+        self._written = 0
+        self._invalidations = 0
+        self._pending_since = 0  # TRACER.begin() of the oldest change nobody's picked up yet, 0 for none
+        # Writes the serial port refused. Only ever bumped with _write_lock held, so it has
+        # one writer at a time and whoever reads it (metrics) doesn't need a lock
+        self.write_errors = 0
+        self._running = False
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self) -> "Framebuffer":
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="pawbean-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Anything set right before stopping still deserves to go out
+        with self._write_lock:
+            self._write_changes()
+
+    def __enter__(self) -> "Framebuffer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def colors(self) -> typing.Tuple[str, ...]:
+        with self._cond:
+            return tuple(self._wanted)
+
+    def set(self, bean: int, color: str) -> None:
+        if not 0 <= bean <= NUM_BEANS:
+            raise ValueError(f"Incorrect bean index {bean}")
+        with self._cond:
+            if bean == 0:
+                self._wanted = [color] * NUM_BEANS
+            else:
+                self._wanted[bean - 1] = color
+            if not self._pending_since:
+                self._pending_since = TRACER.begin()
+            self._changes += 1
+            self._cond.notify_all()
+
+    def fill(self, colors: typing.Sequence[str]) -> None:
+        if len(colors) != NUM_BEANS:
+            raise ValueError(f"A frame needs exactly {NUM_BEANS} colors, got {len(colors)}")
+        with self._cond:
+            self._wanted = list(colors)
+            if not self._pending_since:
+                self._pending_since = TRACER.begin()
+            self._changes += 1
+            self._cond.notify_all()
+
+    def invalidate(self) -> None:
+        """
+        Forget what the pawbeans are showing, e.g. because a firmware animation is drawing.
+        Doesn't write anything by itself (that would stop the animation), the next change
+        just goes out as a full update.
+        """
+        with self._cond:
+            self._sent = [None] * NUM_BEANS
+            self._invalidations += 1
+
+    def sync(self, timeout: typing.Optional[float] = None) -> bool:
+        """Blocks until everything set so far has been written. Returns False on timeout."""
+        with self._cond:
+            target = self._changes
+            return self._cond.wait_for(lambda: self._written >= target or not self._running, timeout)
+
+    def send(self, command: str) -> None:
+        """
+        Writes a raw command straight away, after any pending bean changes, from the
+        caller's thread. For the rare things that aren't colors, like QUIET.
+        """
+        with self._write_lock:
+            self._write_changes()
+            self._write(command)
+            self._flush()
+
+    @classmethod
+    def _commands_for(cls, wanted: typing.Sequence[str], sent: typing.Sequence[typing.Optional[str]]) -> typing.List[str]:
+        changed = [bean for bean in range(NUM_BEANS) if wanted[bean] != sent[bean]]
+        if not changed:
+            return []
+        if len(changed) == 1:
+            return [encode_on(changed[0] + 1, wanted[changed[0]])]
+        if len(set(wanted)) == 1:
+            return [encode_on(0, wanted[0])]
+        return [encode_frame(wanted)]
+
+    def _write(self, command: str) -> None:
+        if self._debug:
+            print(time.time(), "LIGHT:", command)
+        started = TRACER.begin()
+        self._ser.write(command.encode("latin1"))
+        TRACER.end(_SERIAL_WRITE, started)
+
+    def _flush(self) -> None:
+        started = TRACER.begin()
+        self._ser.flush()
+        TRACER.end(_SERIAL_FLUSH, started)
+
+    def _write_changes(self) -> None:
+        with self._cond:
+            wanted = list(self._wanted)
+            target = self._changes
+            invalidations = self._invalidations
+            pending_since = self._pending_since
+            self._pending_since = 0
+            commands = self._commands_for(wanted, self._sent)
+        try:
+            for command in commands:
+                self._write(command)
+            if commands:
+                self._flush()
+                if pending_since:
+                    TRACER.end(_LIGHT_LATENCY, pending_since)
+        except OSError as e:  # serial.SerialException is an OSError too
+            print(f"Pawbean write failed: {e}")
+            self.write_errors += 1
+            wanted = [None] * NUM_BEANS  # no idea what made it, resend everything next time
+        with self._cond:
+            # An invalidate() while we were writing wins, the firmware may have drawn over us
+            if invalidations == self._invalidations:
+                self._sent = wanted
+            self._written = max(self._written, target)
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._changes > self._written or not self._running)
+                if not self._running:
+                    return
+            # Give the rest of this tick's changes a chance to land in the same write
+            time.sleep(self._tick)
+            with self._write_lock:
+                self._write_changes()
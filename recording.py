@@ -0,0 +1,164 @@
+"""
+One game, small enough to keep every one of them: the seed its sequence came from,
+the sequence itself, and every button edge with when it happened.
+
+Everything random about a game's outcome comes out of one random.Random(seed), so
+the seed plus the edges is the whole game. The sequence values get stored anyway,
+that's what a replay checks itself against.
+
+Storage is flat arrays rather than lists of tuples, which is what makes it cheap
+enough to leave on all day:
+
+  values   array('B'), one byte per bean in the sequence
+  buttons  array('b'), +button for a press and -button for a release
+  times    array('I'), milliseconds since the press that started the game
+
+That's 25 bytes of header, one byte per bean and five per button edge: under 200
+bytes for a 5 round game, about 2.1KB for 20 rounds. On disk each file still takes
+a whole filesystem block though (4KiB on the Pi's ext4), so budget 4KiB a game for
+all but the longest ones, 30 games is about 120KiB. See scripts/replay.py for
+playing one back through main().
+"""
+import array
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import typing
+
+from button_events import ButtonEvent
+
+MAGIC = b"SMNR"
+VERSION = 1
+EXTENSION = ".simonrec"
+# magic, version, seed, score, cheat mode length, values, edges
+_HEADER = struct.Struct("<4sBQhHII")
+
+
+def new_seed() -> int:
+    """A fresh seed for a game, from the OS rather than from whatever time it is."""
+    return int.from_bytes(os.urandom(8), "little")
+
+
+def _little_endian(data: array.array) -> bytes:
+    if sys.byteorder != "little":
+        data = array.array(data.typecode, data)
+        data.byteswap()
+    return data.tobytes()
+
+
+def _from_little_endian(typecode: str, raw: bytes) -> array.array:
+    data = array.array(typecode)
+    data.frombytes(raw)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data
+
+
+class GameRecording:
+    """
+    Fill it in while the game runs: value() for every bean added to the sequence,
+    edge() for every button edge (from any thread), finish() at game over.
+
+    :param int seed: what the game's random.Random was seeded with
+    :param float started_at: time.monotonic() of the press that started the game, edge times count from it
+    """
+
+    def __init__(self, seed: int, started_at: float = 0.0):
+        self.seed = seed
+        self.started_at = started_at
+        self.cheat_mode: typing.Optional[str] = None
+        self.score = -1  # until finish()
+        self.values = array.array("B")
+        self.buttons = array.array("b")
+        self.times = array.array("I")
+        self._edge_lock = threading.Lock()  # edge() is on gpiozero's thread, finish() on the game's
+
+    def rng(self) -> random.Random:
+        """The random.Random the game draws its sequence from."""
+        return random.Random(self.seed)
+
+    def value(self, bean: int) -> None:
+        self.values.append(bean)
+
+    def edge(self, event: ButtonEvent) -> None:
+        # An edge from just before the game started (the start press racing us) counts as at the start
+        with self._edge_lock:
+            self.times.append(max(0, round((event.timestamp - self.started_at) * 1000)))
+            self.buttons.append(event.button if event.pressed else -event.button)
+
+    def finish(self, cheat_mode: typing.Optional[str], score: int) -> None:
+        """
+        Game over. A game that ends on a press (a wrong one) is over before that button
+        comes back up, so anything still held gets a release at the last edge's time,
+        and a replay doesn't leave it held down into the next game.
+        """
+        self.cheat_mode = cheat_mode
+        self.score = score
+        with self._edge_lock:
+            held = []
+            for button in self.buttons:
+                if button > 0 and button not in held:
+                    held.append(button)
+                elif button < 0 and -button in held:
+                    held.remove(-button)
+            last = self.times[-1] if self.times else 0
+            for button in held:
+                self.buttons.append(-button)
+                self.times.append(last)
+
+    def edges(self) -> typing.Iterator[typing.Tuple[int, bool, float]]:
+        """(button, pressed, seconds since the start) for every edge, in order."""
+        for button, ms in zip(self.buttons, self.times):
+            yield abs(button), button > 0, ms / 1000
+
+    def __len__(self) -> int:
+        # edge() runs on gpiozero's thread, so the two arrays can be one apart for a moment
+        return min(len(self.buttons), len(self.times))
+
+    def to_bytes(self) -> bytes:
+        count = len(self)
+        mode = (self.cheat_mode or "").encode()
+        return b"".join(
+            (
+                _HEADER.pack(MAGIC, VERSION, self.seed, self.score, len(mode), len(self.values), count),
+                mode,
+                self.values.tobytes(),
+                self.buttons[:count].tobytes(),
+                _little_endian(self.times[:count]),
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "GameRecording":
+        magic, version, seed, score, mode_length, values, count = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} game recording")
+        recording = cls(seed)
+        offset = _HEADER.size
+        recording.cheat_mode = data[offset:offset + mode_length].decode() or None
+        recording.score = score
+        offset += mode_length
+        recording.values.frombytes(data[offset:offset + values])
+        offset += values
+        recording.buttons.frombytes(data[offset:offset + count])
+        offset += count
+        recording.times = _from_little_endian("I", data[offset:offset + count * recording.times.itemsize])
+        if len(recording.values) != values or len(recording) != count:
+            raise ValueError("Game recording is cut short")
+        return recording
+
+    def save(self, directory: str) -> str:
+        """Writes it to a new file in `directory` named after the time and seed, and returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.seed:016x}{EXTENSION}")
+        with open(path, "wb") as recording_file:
+            recording_file.write(self.to_bytes())
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "GameRecording":
+        with open(path, "rb") as recording_file:
+            return cls.from_bytes(recording_file.read())
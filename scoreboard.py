@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+The score on the cabinet's screen, in fonts/game_over.ttf like text_test.py, without
+getting in the way of the flashes.
+
+Three screens: the leaderboard during attract mode, the level and high score during
+a game, and game over with the final score for a few seconds after. The game just
+says which one it wants (show_leaderboard(), show_level(), show_game_over()), which
+is an attribute swap, and a render thread of its own does the rest:
+
+  * every character is rendered once per size and cached as a surface, text is
+    blitted together out of those, so a level counter going up never calls the
+    font renderer again
+  * the screen is a fixed set of text fields, and only fields whose text changed
+    get cleared, redrawn and passed to display.update(), never a full flip
+  * nothing changes, nothing gets drawn: the thread sleeps until the game asks for
+    something, and even then never draws more than `fps` frames a second
+
+Try it out with `python3 scoreboard.py --windowed`, which shows the leaderboard
+from games.sqlite3 and then fakes a game on it.
+"""
+import argparse
+import os
+import threading
+import time
+import typing
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_PATH = os.path.join(ROOT_DIR, "fonts", "game_over.ttf")
+
+FOREGROUND = (250, 240, 230)
+HIGHLIGHT = (255, 255, 0)
+BACKGROUND = (40, 40, 90)
+LEADERBOARD_SIZE = 8
+GAME_OVER_HOLD = 5.0  # seconds the game over screen stays up before the leaderboard takes over
+
+
+class GlyphCache:
+    """Every character rendered once per (size, color). Game over has no kerning to lose, it's a pixel font."""
+
+    def __init__(self, font_path: str = FONT_PATH):
+        import pygame.font
+
+        pygame.font.init()
+        self._font_path = font_path
+        self._fonts: typing.Dict[int, "pygame.font.Font"] = {}
+        self._glyphs: typing.Dict[typing.Tuple[int, typing.Tuple[int, int, int], str], "pygame.Surface"] = {}
+        self.rendered = 0  # glyphs that went through the font renderer, for checking the cache works
+
+    def glyph(self, char: str, size: int, color: typing.Tuple[int, int, int]) -> "pygame.Surface":
+        key = (size, color, char)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            import pygame.font
+
+            font = self._fonts.get(size)
+            if font is None:
+                font = self._fonts[size] = pygame.font.Font(self._font_path, size)
+            # No antialiasing (like text_test.py), so glyphs are plain colorkeyed blits
+            glyph = self._glyphs[key] = font.render(char, False, color)
+            self.rendered += 1
+        return glyph
+
+    def size(self, text: str, size: int) -> typing.Tuple[int, int]:
+        glyphs = [self.glyph(char, size, FOREGROUND) for char in text]
+        return sum(glyph.get_width() for glyph in glyphs), max((glyph.get_height() for glyph in glyphs), default=0)
+
+    def draw(self, surface: "pygame.Surface", text: str, position: typing.Tuple[int, int], size: int, color) -> None:
+        x, y = position
+        for char in text:
+            glyph = self.glyph(char, size, color)
+            surface.blit(glyph, (x, y))
+            x += glyph.get_width()
+
+
+class TextField:
+    """
+    One line of text at a fixed spot. Remembers what it last drew and where, so it can
+    say exactly which rectangle needs clearing and redrawing when the text changes.
+
+    :param anchor: "left", "center" or "right", what x is relative to
+    """
+
+    def __init__(self, x: int, y: int, size: int, anchor: str = "left"):
+        self.x = x
+        self.y = y
+        self.size = size
+        self.anchor = anchor
+        self.drawn: typing.Tuple[str, typing.Tuple[int, int, int]] = ("", FOREGROUND)
+        self.rect = None  # pygame.Rect of what's on screen now, None for nothing
+
+    def update(self, surface, background, glyphs: GlyphCache, text: str, color) -> list:
+        """Redraws if the text or color changed, and returns the dirty rectangles (none if nothing changed)."""
+        import pygame
+
+        if (text, color) == self.drawn:
+            return []
+        dirty = []
+        if self.rect is not None:
+            surface.blit(background, self.rect, self.rect)
+            dirty.append(self.rect)
+            self.rect = None
+        if text:
+            width, height = glyphs.size(text, self.size)
+            x = {"left": self.x, "center": self.x - width // 2, "right": self.x - width}[self.anchor]
+            glyphs.draw(surface, text, (x, self.y), self.size, color)
+            self.rect = pygame.Rect(x, self.y, width, height)
+            dirty.append(self.rect)
+        self.drawn = (text, color)
+        return dirty
+
+
+class Scoreboard:
+    """
+    :param store: the game_store.GameStore the high score and leaderboard come from
+    :param size: window size, (0, 0) for the whole screen
+    :param int fps: most frames drawn per second, however fast the game changes its mind
+    :param float game_over_hold: seconds game over stays up before the leaderboard takes over
+    """
+
+    def __init__(
+        self,
+        store,
+        size: typing.Tuple[int, int] = (0, 0),
+        fps: int = 10,
+        game_over_hold: float = GAME_OVER_HOLD,
+    ):
+        self._store = store
+        self._size = size
+        self._fps = fps
+        self._game_over_hold = game_over_hold
+        # What the game wants up, as one tuple so the render thread never sees half an update
+        self._wanted: typing.Tuple = ("leaderboard",)
+        self._changed = threading.Event()
+        self._running = False
+        self._thread: typing.Optional[threading.Thread] = None
+        self.frames_drawn = 0
+        self.rects_drawn = 0
+
+    # The game's side: no locks, no drawing, just say what should be up
+
+    def show_leaderboard(self) -> None:
+        self._want(("leaderboard",))
+
+    def show_level(self, level: int, cheat_mode: typing.Optional[str] = None) -> None:
+        self._want(("level", level, cheat_mode))
+
+    def show_game_over(self, score: int, new_high_score: bool = False) -> None:
+        self._want(("game_over", score, new_high_score))
+
+    def _want(self, wanted: typing.Tuple) -> None:
+        self._wanted = wanted
+        self._changed.set()
+
+    # The render thread's side
+
+    def start(self) -> "Scoreboard":
+        self._running = True
+        self._changed.set()  # whatever's wanted already, the leaderboard to begin with
+        self._thread = threading.Thread(target=self._run, name="scoreboard", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self._changed.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _layout(self, width: int, height: int) -> typing.Dict[str, TextField]:
+        line = height // (LEADERBOARD_SIZE + 4)
+        fields = {
+            "title": TextField(width // 2, 0, line * 2, "center"),
+            "big": TextField(width // 2, height // 5, height // 2, "center"),
+            "high_score": TextField(width // 2, height - line * 2, line * 2, "center"),
+        }
+        for rank in range(LEADERBOARD_SIZE):
+            y = line * (rank + 2)
+            fields[f"rank{rank}"] = TextField(width // 4, y, line * 2, "right")
+            fields[f"score{rank}"] = TextField(width // 2, y, line * 2, "right")
+            fields[f"mode{rank}"] = TextField(width // 2 + line, y, line * 2, "left")
+        return fields
+
+    def _screen(self, wanted: typing.Tuple, high_score: int) -> typing.Dict[str, typing.Tuple[str, typing.Tuple]]:
+        """What every field should say for a screen, by field name. Fields left out go blank."""
+        screen = {}
+        kind = wanted[0]
+        if kind == "leaderboard":
+            screen["title"] = ("HIGH SCORES", FOREGROUND)
+            for rank, game in enumerate(self._store.leaderboard(LEADERBOARD_SIZE)):
+                color = HIGHLIGHT if rank == 0 else FOREGROUND
+                screen[f"rank{rank}"] = (f"{rank + 1}.", color)
+                screen[f"score{rank}"] = (str(game.score), color)
+                screen[f"mode{rank}"] = ((game.cheat_mode or "").replace("_", " ").upper(), color)
+        elif kind == "level":
+            _, level, cheat_mode = wanted
+            screen["title"] = ((cheat_mode or "level").replace("_", " ").upper(), FOREGROUND)
+            screen["big"] = (str(level), FOREGROUND)
+            screen["high_score"] = (f"HIGH SCORE {high_score}", FOREGROUND)
+        elif kind == "game_over":
+            _, score, new_high = wanted
+            screen["title"] = ("GAME OVER", FOREGROUND)
+            screen["big"] = (str(score), HIGHLIGHT if new_high else FOREGROUND)
+            screen["high_score"] = ("NEW HIGH SCORE!" if new_high else f"HIGH SCORE {high_score}", FOREGROUND)
+        return screen
+
+    def _run(self) -> None:
+        os.environ.setdefault("DISPLAY", ":0")
+        # Otherwise SDL (and pygame's crash parachute) take over SIGTERM and SIGINT, and the game
+        # can't be stopped. Has to be set before pygame is imported.
+        os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+        import pygame
+
+        pygame.display.init()
+        try:
+            if self._size == (0, 0):
+                surface = pygame.display.set_mode((0, 0), pygame.NOFRAME)
+            else:
+                surface = pygame.display.set_mode(self._size)
+            pygame.display.set_caption("Legally Distinct Simon")
+            pygame.mouse.set_visible(False)
+            background = pygame.Surface(surface.get_size())
+            background.fill(BACKGROUND)
+            background = background.convert()
+            surface.blit(background, (0, 0))
+            pygame.display.flip()
+            glyphs = GlyphCache()
+            fields = self._layout(*surface.get_size())
+            drawn = None
+            hold_until = 0.0
+            next_frame = 0.0
+            while self._running:
+                # Woken by the game, or once a second to keep the window responsive
+                self._changed.wait(timeout=1.0)
+                self._changed.clear()
+                pygame.event.pump()
+                wanted = self._wanted
+                now = time.monotonic()
+                if wanted == drawn:
+                    continue
+                if wanted[0] == "leaderboard" and now < hold_until:
+                    # Leave the score up for a bit, attract mode starts right after game over
+                    self._changed.wait(timeout=hold_until - now)
+                    self._changed.set()
+                    continue
+                if now < next_frame:
+                    time.sleep(next_frame - now)
+                    wanted = self._wanted
+                if wanted[0] == "game_over":
+                    hold_until = time.monotonic() + self._game_over_hold
+                screen = self._screen(wanted, self._store.high_score)
+                dirty = []
+                for name, field in fields.items():
+                    text, color = screen.get(name, ("", FOREGROUND))
+                    dirty.extend(field.update(surface, background, glyphs, text, color))
+                if dirty:
+                    pygame.display.update(dirty)
+                    self.frames_drawn += 1
+                    self.rects_drawn += len(dirty)
+                drawn = wanted
+                next_frame = time.monotonic() + 1 / self._fps
+        finally:
+            pygame.display.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=os.path.join(ROOT_DIR, "games.sqlite3"), help="the game store to show")
+    parser.add_argument("--windowed", action="store_true", help="an 800x480 window instead of the whole screen")
+    parser.add_argument("--fps", type=int, default=10)
+    args = parser.parse_args()
+
+    from game_store import GameStore
+
+    store = GameStore(args.store)
+    scoreboard = Scoreboard(store, (800, 480) if args.windowed else (0, 0), args.fps, game_over_hold=2.0).start()
+    try:
+        time.sleep(3)
+        for level in range(1, 11):
+            scoreboard.show_level(level)
+            time.sleep(0.5)
+        scoreboard.show_game_over(9, new_high_score=9 > store.high_score)
+        scoreboard.show_leaderboard()
+        time.sleep(4)
+    finally:
+        print(f"Scoreboard: {scoreboard.frames_drawn} frames, {scoreboard.rects_drawn} rectangles")
+        scoreboard.stop()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
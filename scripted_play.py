@@ -0,0 +1,188 @@
+"""
+Pieces for playing the game from a script instead of from a cabinet: a virtual clock
+that the game's sleeps and deadlines run on, and a drop-in ButtonEvents whose presses
+come from a script at virtual timestamps.
+
+Together with hardware.SimulatedHardware that's enough to run main() for hours of
+game time in seconds of real time, see scripts/soak.py.
+"""
+import heapq
+import threading
+import time
+import typing
+
+from button_events import ButtonEvent
+
+
+class VirtualClock:
+    """
+    time.monotonic()/time.time()/time.sleep() (and pygame.time.wait()) that only move
+    when the game sleeps or waits for a button.
+
+    Only the thread that called install() moves the clock. Any other thread that
+    sleeps (the framebuffer writer, say) just yields, so it keeps up with the game
+    without holding it back.
+
+    :param float start: what time.monotonic() says at first
+    """
+
+    def __init__(self, start: float = 1000.0):
+        self._now = start
+        self._wall_offset = time.time() - start
+        self._owner: typing.Optional[int] = None
+        self._real: typing.Dict[str, typing.Callable] = {}
+        # Called before the clock moves forward, e.g. to let the framebuffer writer catch up
+        self.before_advance: typing.List[typing.Callable[[], typing.Any]] = []
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def time(self) -> float:
+        return self._now + self._wall_offset
+
+    def advance_to(self, when: float) -> None:
+        if when <= self._now:
+            return
+        for hook in self.before_advance:
+            hook()
+        self._now = when
+
+    def sleep(self, seconds: float) -> None:
+        if threading.get_ident() != self._owner:
+            self._real["sleep"](0)
+            return
+        self.advance_to(self._now + seconds)
+
+    def install(self) -> None:
+        """Swaps the clock into the time module and pygame.time, for the calling thread to drive."""
+        import pygame
+
+        self._owner = threading.get_ident()
+        self._real = {
+            "monotonic": time.monotonic,
+            "time": time.time,
+            "sleep": time.sleep,
+            "wait": pygame.time.wait,
+        }
+        time.monotonic = self.monotonic
+        time.time = self.time
+        time.sleep = self.sleep
+        pygame.time.wait = lambda milliseconds: self.sleep(milliseconds / 1000)
+
+    def uninstall(self) -> None:
+        import pygame
+
+        if not self._real:
+            return
+        time.monotonic = self._real["monotonic"]
+        time.time = self._real["time"]
+        time.sleep = self._real["sleep"]
+        pygame.time.wait = self._real["wait"]
+        self._real = {}
+
+
+class ScriptedButtonEvents:
+    """
+    Same interface as button_events.ButtonEvents, but the edges come from tap() and
+    push() at virtual times on a VirtualClock instead of from GPIO. Waiting for an
+    edge moves the clock to it, or to the deadline if nothing's due before then.
+
+    Before every wait, `player` (if there is one) gets called with this object and
+    what the game is waiting for ("get", "peek", "press" or "release"), so it can
+    schedule whatever it wants to do next.
+
+    :param clock: the VirtualClock everything is timed on
+    :param player: callable(events, waiting_for) run before every wait
+    """
+
+    def __init__(
+        self,
+        clock: VirtualClock,
+        player: typing.Optional[typing.Callable[["ScriptedButtonEvents", str], typing.Any]] = None,
+    ):
+        self._clock = clock
+        self._player = player
+        self._queue: typing.List[typing.Tuple[float, int, ButtonEvent]] = []
+        self._pushed = 0
+        self._held: typing.Set[int] = set()
+        # Called with every edge as it happens, same as ButtonEvents.listeners
+        self.listeners: typing.List[typing.Callable[[ButtonEvent], typing.Any]] = []
+
+    def push(self, button: int, pressed: bool, at: float) -> None:
+        heapq.heappush(self._queue, (at, self._pushed, ButtonEvent(button, pressed, at)))
+        self._pushed += 1
+
+    def tap(self, button: int, at: float, hold: float = 0.08) -> None:
+        self.push(button, True, at)
+        self.push(button, False, at + hold)
+
+    def cancel(self) -> None:
+        """Forgets every edge that hasn't happened yet."""
+        self._queue.clear()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def _pop(self) -> ButtonEvent:
+        _, _, event = heapq.heappop(self._queue)
+        if event.pressed:
+            self._held.add(event.button)
+        else:
+            self._held.discard(event.button)
+        for listener in self.listeners:
+            listener(event)
+        return event
+
+    def _due(self, deadline: typing.Optional[float], waiting_for: str) -> bool:
+        """Moves the clock to the next edge if there's one before the deadline, or to the deadline."""
+        if self._player is not None:
+            self._player(self, waiting_for)
+        if self._queue and (deadline is None or self._queue[0][0] <= deadline):
+            self._clock.advance_to(self._queue[0][0])
+            return True
+        if deadline is None:
+            raise RuntimeError("Waiting forever for a button nobody is going to press")
+        self._clock.advance_to(deadline)
+        return False
+
+    def pressed_buttons(self) -> typing.Tuple[int, ...]:
+        return tuple(sorted(self._held))
+
+    def clear(self) -> None:
+        # Only what already happened gets thrown away, the script's future presses stay
+        while self._queue and self._queue[0][0] <= self._clock.monotonic():
+            self._pop()
+
+    def get(self, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        return self._pop() if self._due(deadline, "get") else None
+
+    def peek(self, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        return self._queue[0][2] if self._due(deadline, "peek") else None
+
+    def wait_for_press(self, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        while self._due(deadline, "press"):
+            event = self._pop()
+            if event.pressed:
+                return event
+        return None
+
+    def wait_for_release(self, button: int, deadline: typing.Optional[float] = None) -> typing.Optional[ButtonEvent]:
+        if self._player is not None:
+            self._player(self, "release")
+        # Other buttons' edges stay queued for whoever reads next, like the real thing
+        for index, (at, _, event) in enumerate(self._queue):
+            if event.button == button and not event.pressed and (deadline is None or at <= deadline):
+                del self._queue[index]
+                heapq.heapify(self._queue)
+                self._clock.advance_to(at)
+                self._held.discard(button)
+                for listener in self.listeners:
+                    listener(event)
+                return event
+        if button not in self._held:
+            return ButtonEvent(button, False, self._clock.monotonic())
+        if deadline is None:
+            raise RuntimeError("Waiting forever for a button nobody is going to let go of")
+        self._clock.advance_to(deadline)
+        return None
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Finds the smallest mixer buffer the sound card keeps up with, for --audio-buffer /
+LOW_LATENCY_AUDIO_CONFIG.
+
+For every buffer size this opens the output device the same way the mixer would
+(same rate, 16-bit mono, `buffer` samples per callback) and feeds it silence from
+our own callback for a few seconds, timestamping every callback:
+
+  * period: how much audio one buffer holds, the latency floor for that size
+  * interval median / p99: how far apart the callbacks actually came
+  * late: callbacks that came more than two periods after the last one. SDL keeps
+    about two periods queued, so every one of those is an underrun you'd hear as a click
+
+Our callback is Python and needs the GIL, SDL_mixer's is C and doesn't, so a buffer
+that comes out clean here is clean for the game too.
+
+With --loopback the output also gets a short beep every quarter second, and a
+capture device listens for it: a mic next to the speaker, or a cable from the
+headphone jack into a USB sound card's input (or `modprobe snd-aloop`). The time
+from handing the beep to SDL to hearing it back is the round trip through both
+buffers and the hardware, i.e. roughly what a player sees between flash and tone
+plus the capture side's own buffer.
+
+Usage: python3 scripts/audio_latency.py [--frequency 22050] [--buffers 64,128,256,512,1024]
+                                        [--seconds 3] [--device NAME] [--loopback [CAPTURE NAME]]
+"""
+import argparse
+import array
+import statistics
+import struct
+import time
+import typing
+
+from pygame._sdl2 import sdl2
+from pygame._sdl2.audio import AUDIO_S16, AudioDevice, get_audio_device_names
+
+BEEP_EVERY = 0.25  # seconds between loopback beeps
+BEEP_HZ = 1000
+BEEP_SECONDS = 0.005
+
+
+class BufferTrial:
+    """One buffer size: an output callback that timestamps itself, and an optional loopback listener."""
+
+    def __init__(self, frequency: int, buffer: int, seconds: float, loopback: bool, threshold: float):
+        self.frequency = frequency
+        self.buffer = buffer
+        self.period = buffer / frequency
+        # Preallocated, so the callback does as little as possible
+        self.callbacks = array.array("d", bytes(8 * (int(seconds / self.period) + 64)))
+        self.called = 0
+        self._loopback = loopback
+        self._threshold = int(threshold * 32767)
+        beep_samples = int(BEEP_SECONDS * frequency)
+        half_wave = max(1, frequency // (2 * BEEP_HZ))
+        beep = [16000 if (i // half_wave) % 2 == 0 else -16000 for i in range(min(beep_samples, buffer))]
+        self._beep = struct.pack(f"<{len(beep)}h", *beep)
+        self._next_beep = 0.0
+        self.beeps_sent: typing.List[float] = []
+        self.round_trips: typing.List[typing.Tuple[float, float]] = []  # (beep sent, seconds until heard)
+
+    def on_output(self, device, memory) -> None:
+        now = time.perf_counter()
+        if self.called < len(self.callbacks):
+            self.callbacks[self.called] = now
+        self.called += 1
+        memory[:] = bytes(len(memory))
+        if self._loopback and now >= self._next_beep:
+            memory[: len(self._beep)] = self._beep
+            self.beeps_sent.append(now)
+            self._next_beep = now + BEEP_EVERY
+
+    def on_capture(self, device, memory) -> None:
+        now = time.perf_counter()
+        samples = memoryview(memory).cast("h")
+        for index, sample in enumerate(samples):
+            if abs(sample) >= self._threshold:
+                heard = now - (len(samples) - index) / self.frequency
+                # Match it to the last beep before it, one detection per beep
+                sent = [t for t in self.beeps_sent if t <= heard]
+                if sent and heard - sent[-1] < BEEP_EVERY and (not self.round_trips or sent[-1] != self.round_trips[-1][0]):
+                    self.round_trips.append((sent[-1], heard - sent[-1]))
+                return
+
+    def intervals(self) -> typing.List[float]:
+        stamps = self.callbacks[: min(self.called, len(self.callbacks))]
+        return [b - a for a, b in zip(stamps, stamps[1:])]
+
+
+def run_trial(args, buffer: int) -> BufferTrial:
+    trial = BufferTrial(args.frequency, buffer, args.seconds, args.loopback is not None, args.threshold)
+    output = AudioDevice(
+        devicename=args.device,
+        iscapture=False,
+        frequency=args.frequency,
+        audioformat=AUDIO_S16,
+        numchannels=1,
+        chunksize=buffer,
+        allowed_changes=0,
+        callback=trial.on_output,
+    )
+    capture = None
+    if args.loopback is not None:
+        capture = AudioDevice(
+            devicename=args.loopback,
+            iscapture=True,
+            frequency=args.frequency,
+            audioformat=AUDIO_S16,
+            numchannels=1,
+            chunksize=buffer,
+            allowed_changes=0,
+            callback=trial.on_capture,
+        )
+        capture.pause(0)
+    output.pause(0)
+    time.sleep(args.seconds)
+    output.pause(1)
+    output.close()
+    if capture is not None:
+        capture.pause(1)
+        capture.close()
+    return trial
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frequency", type=int, default=22050)
+    parser.add_argument("--buffers", default="64,128,256,512,1024", help="comma separated buffer sizes in samples")
+    parser.add_argument("--seconds", type=float, default=3.0, help="how long to run each buffer size")
+    parser.add_argument("--device", help="output device name, default is the first one SDL lists")
+    parser.add_argument(
+        "--loopback",
+        nargs="?",
+        const="",
+        help="measure round trip through a capture device (default: the first one SDL lists)",
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="loopback detection level, fraction of full scale")
+    args = parser.parse_args()
+
+    # Just the audio subsystem, pygame.init() would open the mixer on the device we want
+    sdl2.init_subsystem(sdl2.INIT_AUDIO)
+    outputs = get_audio_device_names(False)
+    print(f"Output devices: {outputs}")
+    if args.device is None:
+        args.device = outputs[0]
+    if args.loopback == "":
+        captures = get_audio_device_names(True)
+        print(f"Capture devices: {captures}")
+        args.loopback = captures[0]
+
+    late_buffers = []
+    tried = []
+    for buffer in [int(b) for b in args.buffers.split(",")]:
+        trial = run_trial(args, buffer)
+        intervals = sorted(trial.intervals())
+        if not intervals:
+            print(f"{buffer:5d} samples: no callbacks at all")
+            continue
+        late = sum(1 for interval in intervals if interval > 2 * trial.period)
+        line = (
+            f"{buffer:5d} samples: period {trial.period * 1000:6.2f}ms "
+            f"interval median {statistics.median(intervals) * 1000:6.2f}ms "
+            f"p99 {intervals[min(len(intervals) - 1, int(len(intervals) * 0.99))] * 1000:6.2f}ms "
+            f"late {late}/{len(intervals)}"
+        )
+        if args.loopback is not None:
+            trips = [trip for _, trip in trial.round_trips]
+            if trips:
+                line += f" round trip median {statistics.median(trips) * 1000:6.2f}ms ({len(trips)}/{len(trial.beeps_sent)} heard)"
+            else:
+                line += f" round trip: heard none of {len(trial.beeps_sent)} beeps"
+        print(line)
+        tried.append(buffer)
+        if late:
+            late_buffers.append(buffer)
+
+    # One clean run at a size that's sandwiched between bad ones is luck, not headroom
+    clean = [buffer for buffer in tried if all(bad < buffer for bad in late_buffers)]
+    if clean:
+        print(f"Smallest buffer with no late callbacks at or above it: {min(clean)}, try --low-latency-audio --audio-buffer {min(clean)}")
+    else:
+        print("Every buffer size had late callbacks, try bigger ones")
+
+
+if __name__ == "__main__":
+    main()
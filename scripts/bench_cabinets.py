@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+How many cabinets can one host drive? Runs cabinets.Supervisor with 1, 2, 4, ...
+simulated cabinets and a player thread per cabinet, and measures input-to-light
+latency: from a button's press callback firing (on the player's thread, like
+gpiozero's) to that bean's ON going out the cabinet's serial port.
+
+Every cabinet is played for real: out of attract mode, through the cheat zone,
+SAY sequences repeated back with a human-ish gap between presses, and a deliberate
+miss once the sequence is long enough. Presses only go in while the bean is dark,
+so every one of them is a fresh light to wait for.
+
+Each cabinet count gets played for at least --seconds, and then on until there are
+--min-presses timed presses over all cabinets (or --max-seconds is up), so there's
+enough of them for a p99 to mean something. For every count we print how many
+presses were timed, latency p50/p99/max over all cabinets, how much CPU the game
+used (in cores, the players' threads left out), and call it degraded once p99 goes
+over --budget-ms or twice the first judged count's p99, whichever is more. With
+fewer than 100 presses there's no p99 to speak of, so none gets printed or judged.
+
+The cheat zone's 3s wait is cut to --cheat-timeout and every sound to --sound-ms,
+and players go for sequences of up to --max-score, so there's more answering and
+less idling per game. None of it changes what a press costs. The game's own pauses
+(half a second between rounds, SAY replaying the whole sequence) still set the pace
+at about 3 timed presses a second per cabinet, so one cabinet takes the longest.
+
+Usage: python3 scripts/bench_cabinets.py [--cabinets 1,2,4,8,16,32] [--seconds 15] [--min-presses 300]
+                                         [--budget-ms 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import LegallyDistinctSimon as simon
+from cabinets import Supervisor
+from game_store import GameStore
+from hardware import Cabinet, NullMixer, NullSound, SimulatedHardware
+from simon_async import GameState
+
+BLACK = (0, 0, 0)
+# Below this many presses, p99 is just the slowest one or two
+MIN_PRESSES_FOR_P99 = 100
+
+
+class BenchButton:
+    """Just enough gpiozero.Button for ButtonEvents, pressed from whichever thread calls press()."""
+
+    def __init__(self):
+        self.is_pressed = False
+        self.when_pressed = None
+        self.when_released = None
+
+    def press(self) -> None:
+        self.is_pressed = True
+        if self.when_pressed:
+            self.when_pressed()
+
+    def release(self) -> None:
+        self.is_pressed = False
+        if self.when_released:
+            self.when_released()
+
+
+class BenchMixer(NullMixer):
+    """A NullMixer where every sound lasts `length` seconds, however long its WAV is."""
+
+    def __init__(self, length: float):
+        super().__init__()
+        self._length = length
+
+    def Sound(self, path: str) -> NullSound:
+        return NullSound(self, path, length=self._length)
+
+
+class BenchHardware(SimulatedHardware):
+    """SimulatedHardware without gpiozero's mock pins, which run out after a handful of cabinets."""
+
+    def __init__(self, sound_length: float):
+        super().__init__()
+        self.mixer = BenchMixer(sound_length)
+
+    def buttons(self, pins):
+        buttons = [BenchButton() for _ in pins]
+        self.button_sets.append(buttons)
+        return buttons
+
+
+class CabinetPlayer(threading.Thread):
+    def __init__(self, game, board, buttons, rng: random.Random, max_score: int, stop: threading.Event):
+        super().__init__(name=f"player-{game.cabinet.name}", daemon=True)
+        self._game = game
+        self._board = board
+        self._buttons = buttons
+        self._rng = rng
+        self._max_score = max_score
+        self._done = stop
+        self._waiting = 0  # bean we pressed and are waiting to see lit, 0 for none
+        self._pressed_at = 0.0
+        self._lit = threading.Event()
+        self.latencies = []
+        board.listeners.append(self.on_lights)
+
+    def on_lights(self, command, beans) -> None:
+        # The pawbean writer's thread, right as the command hits the port
+        if self._waiting and beans[self._waiting - 1] != BLACK:
+            self.latencies.append(time.perf_counter() - self._pressed_at)
+            self._waiting = 0
+            self._lit.set()
+
+    def _until(self, condition, timeout: float = 15.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if self._done.is_set() or time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def _tap(self, bean: int, timed: bool) -> None:
+        if timed:
+            self._lit.clear()
+            self._waiting = bean
+            self._pressed_at = time.perf_counter()
+        self._buttons[bean - 1].press()
+        if timed:
+            self._lit.wait(1.0)
+            self._waiting = 0
+        time.sleep(0.02)
+        self._buttons[bean - 1].release()
+
+    def run(self) -> None:
+        target = self._rng.randint(1, self._max_score)
+        while not self._done.is_set():
+            state = self._game.state
+            if state == GameState.ATTRACT and self._game.buttons is not None:
+                time.sleep(self._rng.uniform(0.02, 0.1))
+                self._tap(self._rng.randint(1, 4), timed=False)
+                self._until(lambda: self._game.state != GameState.ATTRACT)
+                target = self._rng.randint(1, self._max_score)
+            elif state == GameState.ASK:
+                memory = list(self._game.game_memory)
+                for bean in memory:
+                    if self._game.state != GameState.ASK or not self._until(lambda: self._board.beans[bean - 1] == BLACK):
+                        break
+                    time.sleep(self._rng.uniform(0.01, 0.05))
+                    if len(memory) > target:
+                        self._tap(self._rng.choice([b for b in range(1, 5) if b != bean]), timed=False)
+                        break
+                    self._tap(bean, timed=True)
+                self._until(lambda: self._game.state != GameState.ASK)
+            else:
+                time.sleep(0.01)
+
+
+async def cancel_leftovers() -> None:
+    """Cancels every other task on the running loop and waits for them to finish cancelling."""
+    leftovers = asyncio.all_tasks() - {asyncio.current_task()}
+    for leftover in leftovers:
+        leftover.cancel()
+    await asyncio.gather(*leftovers, return_exceptions=True)
+
+
+def thread_cpu(thread: threading.Thread) -> float:
+    """CPU seconds a (running) thread has used."""
+    return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+
+
+def run(count: int, seconds: float, max_seconds: float, min_presses: int, max_score: int, seed: int, sound_length: float):
+    hardware = BenchHardware(sound_length)
+    cabinets = [
+        Cabinet(f"bench{index}", tuple(f"B{index}-{bean}" for bean in range(1, 5)), f"/dev/bench{index}", index)
+        for index in range(count)
+    ]
+    supervisor = Supervisor(hardware, cabinets)
+    stop = threading.Event()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(supervisor.run())
+
+    def run_loop():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        # Whatever the games left cancelling gets to finish, like asyncio.run() does, instead
+        # of a "Task was destroyed but it is pending!" each when the loop closes
+        loop.run_until_complete(cancel_leftovers())
+
+    host = threading.Thread(target=run_loop, name="cabinets", daemon=True)
+    host.start()
+    # The buttons only exist once each game has started, and they ask for them in order
+    while not all(game.buttons is not None for game in supervisor.games):
+        time.sleep(0.01)
+    players = [
+        CabinetPlayer(
+            game,
+            hardware.serial(game.cabinet.serial_port),
+            hardware.button_sets[index],
+            random.Random(seed + index),
+            max_score,
+            stop,
+        )
+        for index, game in enumerate(supervisor.games)
+    ]
+    for player in players:
+        player.start()
+
+    def game_cpu() -> float:
+        # Everything but the players, who spin on 1ms sleeps watching the game
+        return time.process_time() - sum(thread_cpu(player) for player in players)
+
+    started_cpu, started = game_cpu(), time.perf_counter()
+    while True:
+        time.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        presses = sum(len(player.latencies) for player in players)
+        if elapsed >= max_seconds or (elapsed >= seconds and presses >= min_presses):
+            break
+    cores = (game_cpu() - started_cpu) / (time.perf_counter() - started)
+    stop.set()
+    for player in players:
+        player.join()
+    loop.call_soon_threadsafe(task.cancel)
+    host.join()
+    loop.close()
+    latencies = sorted(latency for player in players for latency in player.latencies)
+    return latencies, cores, elapsed, sum(supervisor.restarts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cabinets", default="1,2,4,8,16,32", help="comma separated cabinet counts to try")
+    parser.add_argument("--seconds", type=float, default=15.0, help="least time to play each count for")
+    parser.add_argument("--min-presses", type=int, default=300, help="timed presses to collect for each count")
+    parser.add_argument("--max-seconds", type=float, default=300.0, help="give up on --min-presses after this long")
+    parser.add_argument("--budget-ms", type=float, default=10.0, help="p99 press-to-light that still counts as fine")
+    parser.add_argument("--max-score", type=int, default=20, help="longest sequence a player gets right")
+    parser.add_argument("--cheat-timeout", type=float, default=0.5)
+    parser.add_argument("--sound-ms", type=float, default=50.0, help="how long every sound plays for")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    simon.CHEAT_TIMEOUT_VALUE = args.cheat_timeout
+    store_dir = tempfile.TemporaryDirectory(prefix="simon-bench-")
+    simon.STORE = GameStore(os.path.join(store_dir.name, "games.sqlite3"))
+    baseline = None
+    most_fine = 0
+    still_fine = True
+    judged = False  # whether any count had enough presses for a p99 at all
+    for count in [int(c) for c in args.cabinets.split(",")]:
+        # The games are chatty, only the results go to stdout
+        real_stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            latencies, cores, elapsed, restarts = run(
+                count, args.seconds, args.max_seconds, args.min_presses, args.max_score, args.seed, args.sound_ms / 1000
+            )
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+        if not latencies:
+            print(f"{count:3d} cabinets: no presses got through")
+            continue
+        degraded = False
+        if len(latencies) >= MIN_PRESSES_FOR_P99:
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            if baseline is None:
+                baseline = p99
+            degraded = p99 > max(args.budget_ms, 2 * baseline)
+            judged = True
+            if degraded:
+                still_fine = False
+            elif still_fine:
+                most_fine = count
+            p99_text = f"{p99:6.2f}ms"
+        else:
+            p99_text = "   n/a  "  # not enough presses, and no verdict either
+        print(
+            f"{count:3d} cabinets: n={len(latencies):<5d} in {elapsed:5.1f}s press-to-light "
+            f"p50 {statistics.median(latencies) * 1000:6.2f}ms p99 {p99_text} max {latencies[-1] * 1000:6.2f}ms "
+            f"game cpu {cores:4.2f} cores"
+            + (f" {restarts} restarts" if restarts else "")
+            + (" DEGRADED" if degraded else "")
+        )
+    simon.STORE.close()
+    store_dir.cleanup()
+    if not judged:
+        print(f"Not enough presses for a verdict, no count got to {MIN_PRESSES_FOR_P99}")
+    elif most_fine:
+        print(f"One host keeps p99 press-to-light within budget up to {most_fine} cabinets (of those tried)")
+    else:
+        print("Over budget at the first count with enough presses to tell")
+
+
+if __name__ == "__main__":
+    main()
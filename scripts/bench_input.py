@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Button input benchmark: the old poll_buttons() busy-wait vs the ButtonEvents queue.
+
+Runs both against gpiozero's mock pin factory, so it works on any Linux box as well
+as on the Pi itself. For each mode a waiter thread sits waiting for presses while the
+main thread drives the mock pins, and we report:
+
+  * CPU: how much of one core the waiter thread burned (thread CPU time / wall time)
+  * latency: time from driving the pin low to the waiter noticing the press
+
+Usage: python3 scripts/bench_input.py [--presses 200] [--gap-ms 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpiozero import Button, Device
+from gpiozero.pins.mock import MockFactory
+
+from button_events import ButtonEvents
+
+PINS = (23, 22, 17, 27)
+
+
+def poll_buttons(buttons) -> int:
+    # Verbatim copy of the poll_buttons() LegallyDistinctSimon used to have, minus the module-level BUTTONS
+    for idx, butt in enumerate(buttons):
+        if butt.is_pressed:
+            return idx + 1
+    return 0
+
+
+def poll_waiter(buttons, presses, detected, noticed, cpu):
+    start_cpu = time.thread_time()
+    for _ in range(presses):
+        while not poll_buttons(buttons):
+            pass
+        detected.append(time.monotonic())
+        noticed.set()
+        while poll_buttons(buttons):
+            pass
+    cpu.append(time.thread_time() - start_cpu)
+
+
+def event_waiter(events, presses, detected, noticed, cpu):
+    start_cpu = time.thread_time()
+    for _ in range(presses):
+        events.wait_for_press()
+        detected.append(time.monotonic())
+        noticed.set()
+    cpu.append(time.thread_time() - start_cpu)
+
+
+def run(name, waiter, waiter_args, buttons, presses, gap_s):
+    pressed_at, detected, cpu = [], [], []
+    noticed = threading.Event()
+    thread = threading.Thread(target=waiter, args=(*waiter_args, presses, detected, noticed, cpu))
+    start_wall = time.monotonic()
+    thread.start()
+    for i in range(presses):
+        time.sleep(gap_s)  # the player thinking about it
+        pin = buttons[i % len(buttons)].pin
+        noticed.clear()
+        pressed_at.append(time.monotonic())
+        pin.drive_low()
+        noticed.wait(timeout=1)
+        time.sleep(0.005)
+        pin.drive_high()
+    thread.join()
+    wall = time.monotonic() - start_wall
+
+    latencies_ms = sorted((d - p) * 1000 for p, d in zip(pressed_at, detected))
+    p99 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]
+    print(
+        f"{name:>8}: cpu {100 * cpu[0] / wall:5.1f}% of a core | latency ms "
+        f"median {statistics.median(latencies_ms):.3f} p99 {p99:.3f} max {latencies_ms[-1]:.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presses", type=int, default=200)
+    parser.add_argument("--gap-ms", type=int, default=50, help="idle time between presses")
+    args = parser.parse_args()
+
+    Device.pin_factory = MockFactory()
+    # No bounce_time here, the mock pins don't bounce and we want the raw detection path
+    buttons = [Button(pin) for pin in PINS]
+
+    print(f"{args.presses} presses, {args.gap_ms}ms apart")
+    run("before", poll_waiter, (buttons,), buttons, args.presses, args.gap_ms / 1000)
+    run("after", event_waiter, (ButtonEvents(buttons),), buttons, args.presses, args.gap_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Pawbean serial benchmark: command-to-light latency for the old chatty one-bean-per-line
+protocol vs FRAME commands with the firmware in quiet mode.
+
+The game talks to a fake pawbean board on the other end of a pty. The fake board
+reuses pawbeans.decode_command and behaves like the sketch where it matters:
+
+  * incoming bytes trickle in at the configured baud rate
+  * every command that changes LEDs pays for a strip.show() of all NUM_LEDS pixels
+  * in chatty mode every command prints the same debug lines the sketch does, and
+    Serial.println blocks once the ESP32's TX FIFO is full
+  * nobody on the host reads those lines (like the game before SerialLink), so once
+    the pty fills up they get dropped, same as a host-side overrun
+  * after ACKS 1 every command gets an OK once it's done, like the sketch
+
+Latency is measured from the game calling the light function to the fake board
+finishing the strip.show() for the last bean. The last run goes through a
+SerialLink, which paces on acks instead of flushing (tcdrain) after every write,
+and reports the round trips it saw.
+
+Usage: python3 scripts/bench_serial.py [--trials 50] [--baud 115200] [--leds 1200]
+"""
+import argparse
+import os
+import select
+import statistics
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Don't need a sound card to push bytes down a pty
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import serial
+
+import LegallyDistinctSimon as simon
+from pawbeans import OFF, decode_command, encode_frame, encode_on, encode_quiet
+from serial_link import SerialLink
+
+WS2812_SECONDS_PER_LED = 30e-6  # 24 bits at 800kHz
+
+
+class FakePawbeans(threading.Thread):
+    def __init__(self, master_fd: int, baud: int, leds: int, tx_fifo: int = 128):
+        super().__init__(daemon=True)
+        self._fd = master_fd
+        self._byte_time = 10 / baud  # 8N1
+        self._show_time = leds * WS2812_SECONDS_PER_LED
+        self._tx_fifo = tx_fifo
+        self._tx_busy_until = 0.0
+        self._rx_clock = 0.0
+        self.quiet = False
+        self.acks = False
+        self.applied = threading.Condition()
+        self.apply_times = []
+
+    def _println(self, text: str):
+        line = (text + "\r\n").encode()
+        now = time.monotonic()
+        self._tx_busy_until = max(self._tx_busy_until, now) + len(line) * self._byte_time
+        # Serial.println only blocks once there's more queued than the FIFO holds
+        backlog = self._tx_busy_until - now - self._tx_fifo * self._byte_time
+        if backlog > 0:
+            time.sleep(backlog)
+        try:
+            os.write(self._fd, line)
+        except BlockingIOError:
+            pass
+
+    def _process(self, line: str):
+        self._handle(decode_command(line))
+        if self.acks:
+            self._println("OK")
+
+    def _handle(self, command):
+        if not self.quiet:
+            self._println(f"command is {command.name}")
+        if command.name == "QUIET":
+            self.quiet = bool(command.args[0])
+            return
+        if command.name == "ACKS":
+            self.acks = bool(command.args[0])
+            return
+        if command.name == "ON" and not self.quiet:
+            bean, (red, green, blue) = command.updates[0]
+            for label, value in (("pawbean_index", bean), ("red_value", red), ("green_value", green), ("blue_value", blue)):
+                self._println(f"{label} is {value}")
+        time.sleep(self._show_time)  # strip.show()
+        with self.applied:
+            self.apply_times.append(time.monotonic())
+            self.applied.notify_all()
+        if not self.quiet:
+            self._println("Setting frame" if command.name == "FRAME" else "Setting pawbean")
+
+    def run(self):
+        pending = b""
+        while True:
+            select.select([self._fd], [], [])
+            data = os.read(self._fd, 1024)
+            self._rx_clock = max(self._rx_clock, time.monotonic())
+            pending += data
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                # The pty hands us the bytes instantly, the UART wouldn't have
+                self._rx_clock += (len(line) + 1) * self._byte_time
+                delay = self._rx_clock - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._process(line.decode("latin1"))
+
+
+def light_command(ser, command):
+    # Straight to the port (what the game did before the framebuffer), its writer thread would only add its tick
+    ser.write(command.encode("latin1"))
+    ser.flush()
+
+
+def old_light_all_beans(ser):
+    # light_all_beans() from before FRAME existed
+    for i, color in enumerate(simon.COLORS):
+        light_command(ser, encode_on(i + 1, color))
+
+
+def light_all_beans(ser):
+    light_command(ser, encode_frame(simon.COLORS))
+
+
+def measure(device, ser, name, light, expected_applies, trials):
+    latencies_ms = []
+    for _ in range(trials):
+        with device.applied:
+            device.apply_times.clear()
+        start = time.monotonic()
+        light(ser)
+        with device.applied:
+            device.applied.wait_for(lambda: len(device.apply_times) >= expected_applies, timeout=5)
+            latencies_ms.append((device.apply_times[-1] - start) * 1000)
+        light_command(ser, encode_on(0, OFF))
+        time.sleep(0.2)  # let the board catch up and the TX FIFO drain between trials
+    latencies_ms.sort()
+    p99 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]
+    print(f"{name:>24}: median {statistics.median(latencies_ms):7.2f}ms  p99 {p99:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--leds", type=int, default=1200, help="NUM_LEDS in the sketch, every strip.show() sends all of them")
+    args = parser.parse_args()
+
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    # Non-blocking so the debug lines get dropped rather than wedging the board once the pty is full
+    os.set_blocking(master_fd, False)
+    device = FakePawbeans(master_fd, baud=args.baud, leds=args.leds)
+    device.start()
+
+    with serial.Serial(os.ttyname(slave_fd), args.baud, timeout=1) as ser:
+        measure(device, ser, "one bean, chatty", lambda s: light_command(s, encode_on(1, simon.COLORS[0])), 1, args.trials)
+        measure(device, ser, "all beans 4x ON, chatty", old_light_all_beans, 4, args.trials)
+        light_command(ser, encode_quiet(True))
+        time.sleep(0.2)
+        measure(device, ser, "one bean, quiet", lambda s: light_command(s, encode_on(1, simon.COLORS[0])), 1, args.trials)
+        measure(device, ser, "all beans FRAME, quiet", light_all_beans, 1, args.trials)
+        with SerialLink(ser) as link:
+            link.wait_for_handshake()
+            measure(device, link, "one bean, quiet, acked", lambda s: light_command(s, encode_on(1, simon.COLORS[0])), 1, args.trials)
+            measure(device, link, "all beans FRAME, acked", light_all_beans, 1, args.trials)
+            link.report()
+
+
+if __name__ == "__main__":
+    main()
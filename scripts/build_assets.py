@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Builds the game's assets in one go, in parallel, and only whatever changed since last time.
+
+  theme OUT_DIR GIF...  an xpenguins theme out of animated GIFs (config, about, icon.png and
+                        one XPM sprite sheet per GIF), what gifToPeng.sh used to do with ImageMagick
+  sounds                every WAV in the repo, already at the mixer's rate and format, for
+                        SoundRegistry to decode instead of the originals
+
+GIFs are decoded with Pillow right here rather than a convert per frame, and sounds
+with pygame's mixer, so they come out exactly as the game would have had them. The
+inputs get spread over a pool of --jobs processes, one per CPU by default.
+
+Every output directory has a .build_assets.json manifest with the sha256 of each input
+(and of the settings it was built with). Whatever still hashes the same and still has
+its outputs gets skipped, so a rebuild after changing one GIF or one WAV does just that
+one. --force rebuilds everything anyway.
+
+Needs Pillow and NumPy for themes, and pygame for sounds.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import typing
+import wave
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# Workers decode sounds with pygame's mixer, which doesn't need to hear them
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+MANIFEST = ".build_assets.json"  # sound_registry.CACHE_MANIFEST, which reads the sounds one
+# Bump when what gets built changes, so everything built the old way gets rebuilt
+BUILD_VERSION = 1
+
+CONFIG_HEADER = """delay 150
+define default
+        width 16  # Going to be overridden.
+        height 16 # Going to be overridden.
+        frames 4  # Going to be overridden.
+        speed 4   # Default speed
+        directions 1 # Default number of directions
+"""
+
+ABOUT_CONTENTS = """artist Someone on the internet probably.
+maintainer No one.
+copyright 1994-1996 weasels
+license Be gay, do crimes
+comment Generated by a slightly less janky Python script.
+icon icon.png
+date {date}
+"""
+
+CONFIG_TOON = """toon {name}
+        number 1
+        define walker pixmap {pixmap} frames {frames} width {width} height {height}
+        define faller pixmap {pixmap} frames {frames} width {width} height {height} terminal_velocity 8 acceleration 1
+        define tumbler pixmap {pixmap} frames {frames} width {width} height {height} speed 1 acceleration 1 terminal_velocity 8
+        define floater pixmap {pixmap} frames {frames} width {width} height {height} speed 3
+"""
+
+# Characters an XPM pixel can be spelled with, everything printable but " and \
+XPM_CHARS = " .#$%&*+,-/:;<=>?@[]^_`{|}~!'()0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+TRANSPARENT = 0xFFFFFFFF  # what a see-through pixel packs to, no RGB color does
+
+
+def file_digest(path: str, *settings) -> str:
+    """sha256 of a file's contents plus whatever it gets built with."""
+    digest = hashlib.sha256(repr((BUILD_VERSION, settings)).encode())
+    with open(path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def replace_file(path: str, data: bytes) -> None:
+    """Writes a file all at once, so the game never loads half of one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as output:
+        output.write(data)
+    os.replace(path + ".tmp", path)
+
+
+class Manifest:
+    """What was built from what, by input digest, kept as JSON in the output directory."""
+
+    def __init__(self, directory: str, force: bool = False):
+        self._path = os.path.join(directory, MANIFEST)
+        self._entries: typing.Dict[str, typing.Dict] = {}
+        if not force:
+            try:
+                with open(self._path) as manifest_file:
+                    self._entries = json.load(manifest_file)
+            except (OSError, ValueError):
+                pass  # never built, or mangled, either way everything's out of date
+
+    def fresh(self, key: str, digest: str) -> typing.Optional[typing.Dict]:
+        """The entry for `key` if it was built from `digest` and its outputs are all still there."""
+        entry = self._entries.get(key)
+        if entry is None or entry["digest"] != digest:
+            return None
+        if not all(os.path.exists(output) for output in entry["outputs"]):
+            return None
+        return entry
+
+    def record(self, key: str, digest: str, outputs: typing.List[str], **info) -> None:
+        self._entries[key] = {"digest": digest, "outputs": outputs, **info}
+
+    def save(self) -> None:
+        replace_file(self._path, json.dumps(self._entries, indent=1, sort_keys=True).encode())
+
+
+def run_jobs(function: typing.Callable, jobs: typing.List[typing.Tuple], processes: typing.Optional[int]) -> typing.List:
+    """function(*job) for every job, over a process pool. Results come back in the jobs' order."""
+    if not jobs:
+        return []
+    if processes == 1 or len(jobs) == 1:
+        return [function(*job) for job in jobs]  # not worth starting a pool for
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(function, *zip(*jobs)))
+
+
+# Themes
+
+
+def gif_frames(path: str):
+    """Every frame of a GIF as a full RGBA image, with whatever the earlier frames left showing."""
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as gif:
+        # Pillow composites each frame over the last (disposal and all), like convert -coalesce
+        return [frame.convert("RGBA") for frame in ImageSequence.Iterator(gif)]
+
+
+def xpm(image, name: str) -> bytes:
+    """An RGBA image as XPM3 text, the only sprite sheet format every xpenguins can read."""
+    import numpy
+
+    pixels = numpy.asarray(image)
+    height, width = pixels.shape[:2]
+    packed = (
+        pixels[..., 0].astype(numpy.uint32) << 16 | pixels[..., 1].astype(numpy.uint32) << 8 | pixels[..., 2]
+    )
+    # GIFs only have on or off for transparency
+    packed[pixels[..., 3] < 128] = TRANSPARENT
+    colors, indices = numpy.unique(packed.ravel(), return_inverse=True)
+    per_pixel = 1
+    while len(XPM_CHARS) ** per_pixel < len(colors):
+        per_pixel += 1
+    codes = []
+    for index in range(len(colors)):
+        code = ""
+        for _ in range(per_pixel):
+            index, digit = divmod(index, len(XPM_CHARS))
+            code += XPM_CHARS[digit]
+        codes.append(code.encode())
+    # One lookup for the whole image rather than one per pixel
+    spelled = numpy.array(codes, dtype=f"S{per_pixel}")[indices].tobytes()
+    row_bytes = width * per_pixel
+    lines = [f"{width} {height} {len(colors)} {per_pixel}".encode()]
+    for code, color in zip(codes, colors.tolist()):
+        lines.append(code + (b" c None" if color == TRANSPARENT else f" c #{color:06X}".encode()))
+    lines.extend(spelled[row * row_bytes:(row + 1) * row_bytes] for row in range(height))
+    body = b",\n".join(b'"' + line + b'"' for line in lines)
+    return b"/* XPM */\nstatic char *" + name.encode() + b"[] = {\n" + body + b"\n};\n"
+
+
+def build_toon(gif_path: str, out_dir: str, name: str) -> typing.Dict[str, int]:
+    """One GIF's frames side by side in NAME.xpm, plus its first frame as NAME's icon. Runs in a worker."""
+    from PIL import Image
+
+    frames = gif_frames(gif_path)
+    width, height = frames[0].size
+    sheet = Image.new("RGBA", (width * len(frames), height))
+    for index, frame in enumerate(frames):
+        sheet.paste(frame, (index * width, 0))
+    replace_file(os.path.join(out_dir, f"{name}.xpm"), xpm(sheet, re.sub(r"\W", "_", name)))
+    frames[0].save(os.path.join(out_dir, f".{name}.icon.png"))
+    return {"frames": len(frames), "width": width, "height": height}
+
+
+def build_theme(out_dir: str, gifs: typing.List[str], processes: typing.Optional[int], force: bool) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = Manifest(out_dir, force)
+    toons = []
+    jobs = []
+    for gif_path in gifs:
+        name = re.sub(r"\.gif$", "", os.path.basename(gif_path), flags=re.IGNORECASE)
+        digest = file_digest(gif_path)
+        entry = manifest.fresh(name, digest)
+        toons.append((name, gif_path, digest, entry))
+        if entry is None:
+            jobs.append((gif_path, out_dir, name))
+    print(f"Theme: {len(jobs)} of {len(gifs)} GIFs to build")
+    built = {name: toon for (_, _, name), toon in zip(jobs, run_jobs(build_toon, jobs, processes))}
+    config = [CONFIG_HEADER]
+    for name, gif_path, digest, entry in toons:
+        if name in built:
+            entry = built[name]
+            outputs = [os.path.join(out_dir, f"{name}.xpm"), os.path.join(out_dir, f".{name}.icon.png")]
+            manifest.record(name, digest, outputs, **entry)
+            print(f"Theme: {gif_path}, {entry['frames']} frames of {entry['width']}x{entry['height']}")
+        config.append(CONFIG_TOON.format(name=name, pixmap=f"{name}.xpm", **entry))
+    manifest.save()
+    with open(os.path.join(out_dir, "config"), "w") as config_file:
+        config_file.write("".join(config))
+    today = datetime.date.today()
+    with open(os.path.join(out_dir, "about"), "w") as about_file:
+        about_file.write(ABOUT_CONTENTS.format(date=f"{today.day} {today:%B %Y}"))
+    if toons:
+        # xpenguins wants one icon a theme, so like gifToPeng.sh, the last GIF wins
+        with open(os.path.join(out_dir, f".{toons[-1][0]}.icon.png"), "rb") as icon:
+            replace_file(os.path.join(out_dir, "icon.png"), icon.read())
+
+
+# Sounds
+
+_worker_audio = None  # what this worker's mixer is open with
+
+
+def build_sound(audio: typing.Tuple[int, int, int, int], wav_path: str, cached_path: str) -> None:
+    """
+    Decodes a WAV with a mixer opened like the game's, which converts it, and writes
+    what came out back as a WAV. Runs in a worker.
+    """
+    global _worker_audio
+    import pygame
+
+    frequency, size, channels, buffer = audio
+    if _worker_audio != audio:
+        pygame.mixer.quit()
+        pygame.mixer.init(frequency, size, channels, buffer, allowedchanges=0)
+        if pygame.mixer.get_init() != (frequency, size, channels):
+            raise RuntimeError(f"Wanted a {audio} mixer, SDL opened {pygame.mixer.get_init()}")
+        _worker_audio = audio
+    raw = pygame.mixer.Sound(wav_path).get_raw()
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+    with wave.open(cached_path + ".tmp", "wb") as cached:
+        cached.setnchannels(channels)
+        cached.setsampwidth(abs(size) // 8)
+        cached.setframerate(frequency)
+        cached.writeframes(raw)
+    os.replace(cached_path + ".tmp", cached_path)
+
+
+def find_wavs(root_dir: str, skip: typing.Iterable[str]) -> typing.List[str]:
+    """Every WAV under root_dir, relative to it, leaving out dot directories and `skip`."""
+    skip = {os.path.abspath(path) for path in skip}
+    wavs = []
+    for directory, subdirectories, files in os.walk(root_dir):
+        subdirectories[:] = sorted(
+            d for d in subdirectories if not d.startswith(".") and os.path.join(directory, d) not in skip
+        )
+        wavs.extend(os.path.relpath(os.path.join(directory, f), root_dir) for f in sorted(files) if f.lower().endswith(".wav"))
+    return wavs
+
+
+def build_sounds(configs, processes: typing.Optional[int], force: bool) -> None:
+    import LegallyDistinctSimon as simon
+    from sound_registry import cache_path, source_stamp
+
+    for audio in configs:
+        # WAV can't hold signed 8-bit or unsigned 16-bit, the two other formats a mixer can be
+        if audio.size not in (8, -16):
+            raise ValueError(f"Can't cache WAVs for a {abs(audio.size)}-bit mixer")
+    manifest = Manifest(simon.SOUND_CACHE_DIR, force)
+    wavs = find_wavs(ROOT_DIR, skip=[os.path.dirname(simon.SOUND_CACHE_DIR)])
+    jobs = []
+    for audio in configs:
+        mixer = (audio.frequency, audio.size, audio.channels, audio.buffer)
+        for asset in wavs:
+            wav_path = os.path.join(ROOT_DIR, asset)
+            cached_path = cache_path(simon.SOUND_CACHE_DIR, audio, asset)
+            # The buffer size doesn't change what gets decoded
+            digest = file_digest(wav_path, mixer[:3])
+            if manifest.fresh(cached_path, digest) is None:
+                jobs.append((mixer, wav_path, cached_path))
+            # Recorded even when there's nothing to build, SoundRegistry only trusts a copy
+            # whose WAV still has the size and mtime in here, and a touched WAV hashes the same
+            manifest.record(cached_path, digest, [cached_path], source=asset, **source_stamp(wav_path))
+    print(f"Sounds: {len(jobs)} of {len(wavs) * len(configs)} WAVs to convert")
+    # Grouped by mixer, so each worker mostly keeps the mixer it opened
+    jobs.sort(key=lambda job: job[0])
+    run_jobs(build_sound, jobs, processes)
+    manifest.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--force", action="store_true", help="rebuild everything, changed or not")
+    commands = parser.add_subparsers(dest="command", required=True)
+    theme = commands.add_parser("theme", help="an xpenguins theme out of animated GIFs")
+    theme.add_argument("out_dir", help="where the theme goes, its name is the theme's name. Files in it get overwritten")
+    theme.add_argument("gifs", nargs="+", help="any animated GIFs, emoji sized ones look best")
+    sounds = commands.add_parser("sounds", help="every WAV at the mixer's rate, for SoundRegistry")
+    sounds.add_argument(
+        "--only", choices=("default", "low-latency"), help="just AUDIO_CONFIG or LOW_LATENCY_AUDIO_CONFIG, rather than both"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "theme":
+        build_theme(args.out_dir, args.gifs, args.jobs, args.force)
+    elif args.command == "sounds":
+        import LegallyDistinctSimon as simon
+
+        configs = {"default": simon.AUDIO_CONFIG, "low-latency": simon.LOW_LATENCY_AUDIO_CONFIG}
+        build_sounds([configs[args.only]] if args.only else list(dict.fromkeys(configs.values())), args.jobs, args.force)
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
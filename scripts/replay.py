@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Plays recorded games (LegallyDistinctSimon.py --record DIR) back through the real
+main() on simulated hardware, with every game's own seed and every button edge at
+the time it happened.
+
+By default it runs on a scripted_play.VirtualClock, so a game takes milliseconds.
+That's the regression check: each replay has to come out with the same sequence,
+cheat mode and score as the recording, or it's reported as diverged and the exit
+status is 1. It also prints the real ms per replayed game, which is what the game
+loop itself costs with no waiting in it.
+
+With --real-time the edges go in through SimulatedHardware's mock GPIO pins on the
+wall clock instead, with tracing on, so it's a repeatable timing benchmark: the
+same games pressed at the same moments every run, and TRACER's press-to-light,
+press-to-sound and friends at the end. That takes as long as the games did.
+
+Usage: python3 scripts/replay.py [--real-time] [--repeat N] RECORDING_OR_DIR...
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import LegallyDistinctSimon as simon
+from game_store import GameStore
+from hardware import SimulatedHardware
+from recording import EXTENSION, GameRecording
+from scripted_play import ScriptedButtonEvents, VirtualClock
+from timeline import Scheduler
+from tracing import TRACER
+
+# Attract mode has to be up and waiting before the first press lands
+LEAD_IN = 0.5
+
+
+class ReplayFinished(Exception):
+    pass
+
+
+def find_recordings(paths):
+    recordings = []
+    for path in paths:
+        if os.path.isdir(path):
+            recordings.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(EXTENSION)
+            )
+        else:
+            recordings.append(path)
+    return recordings
+
+
+class Replayer:
+    """
+    Hands main() one recording at a time: its seed through simon.new_seed(), its edges
+    through whichever way the buttons are being pressed, and checks what came out.
+    """
+
+    def __init__(self, recordings):
+        self._recordings = list(recordings)
+        self._next = 0
+        self.current = None
+        self.playing = False
+        self.attracting = threading.Event()  # set whenever attract mode starts waiting for a press
+        self.replayed = []  # (path, original, what the replay recorded)
+        finish_recording = simon.finish_recording
+
+        def replay_finish_recording(cheat_mode_str, score):
+            replay = simon.RECORDING
+            finish_recording(cheat_mode_str, score)
+            self.replayed.append((self.current[0], self.current[1], replay))
+            self.playing = False
+
+        class ReplayAttractMode(simon.AttractMode):
+            def play(mode) -> None:
+                self.attracting.set()
+                super().play()
+
+        simon.finish_recording = replay_finish_recording
+        simon.new_seed = lambda: self.current[1].seed
+        simon.AttractMode = ReplayAttractMode
+
+    def start_next(self) -> bool:
+        if self._next >= len(self._recordings):
+            return False
+        self.current = self._recordings[self._next]
+        self._next += 1
+        self.playing = True
+        return True
+
+    def play_scripted(self, clock: VirtualClock):
+        """The ScriptedButtonEvents player: every time attract mode wants a press, the next game's edges."""
+
+        def player(events: ScriptedButtonEvents, waiting_for: str) -> None:
+            if self.playing or waiting_for != "press":
+                return
+            # Anything a diverged game didn't get to would land in the next one
+            events.cancel()
+            if not self.start_next():
+                raise ReplayFinished()
+            start = clock.monotonic() + LEAD_IN
+            for button, pressed, at in self.current[1].edges():
+                events.push(button, pressed, start + at)
+
+        return player
+
+    def play_real_time(self, hardware: SimulatedHardware) -> threading.Thread:
+        """Presses the mock GPIO pins from a thread, one game after another, at the recorded times."""
+
+        def press_all():
+            # A game that diverged still ends on its own (a timeout at worst) and comes back here
+            while self.attracting.wait() and self.start_next():
+                self.attracting.clear()
+                start = time.monotonic() + LEAD_IN
+                held = set()
+                for button, pressed, at in self.current[1].edges():
+                    time.sleep(max(0.0, start + at - time.monotonic()))
+                    (hardware.press if pressed else hardware.release)(button)
+                    (held.add if pressed else held.discard)(button)
+                # A game that ends on a press was over before the release came, so older
+                # recordings don't have it. A pin left low wouldn't make an edge next game.
+                for button in held:
+                    hardware.release(button)
+
+        thread = threading.Thread(target=press_all, name="replay", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help=f"{EXTENSION} files, or directories of them")
+    parser.add_argument("--real-time", action="store_true", help="press mock GPIO pins on the wall clock, with tracing on")
+    parser.add_argument("--repeat", type=int, default=1, help="play everything this many times over")
+    args = parser.parse_args()
+
+    paths = find_recordings(args.recordings) * args.repeat
+    if not paths:
+        parser.error("no recordings found")
+    replayer = Replayer((path, GameRecording.load(path)) for path in paths)
+    hardware = SimulatedHardware()
+    store_dir = tempfile.TemporaryDirectory(prefix="simon-replay-")
+    simon.STORE = GameStore(os.path.join(store_dir.name, "games.sqlite3"))
+    simon.RECORDINGS_DIR = None
+    simon.METRICS_ADDRESS = None  # not fighting a real cabinet on the same box for the port
+
+    clock = None
+    if args.real_time:
+        TRACER.enabled = True
+        record_game = simon.record_game
+
+        def real_time_record_game(*game):
+            record_game(*game)
+            if not replayer.playing and replayer._next >= len(paths):
+                raise ReplayFinished()
+
+        simon.record_game = real_time_record_game
+    else:
+        clock = VirtualClock()
+        simon.ButtonEvents = lambda buttons: ScriptedButtonEvents(clock, replayer.play_scripted(clock))
+        simon.SCHEDULER = Scheduler(spin=0.0, clock=clock.monotonic, sleep=clock.sleep)
+
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    if clock:
+        clock.install()
+    else:
+        replayer.play_real_time(hardware)
+    started = time.perf_counter()
+    try:
+        simon.main(hardware)
+    except ReplayFinished:
+        pass
+    finally:
+        elapsed = time.perf_counter() - started
+        if clock:
+            clock.uninstall()
+        sys.stdout.close()
+        sys.stdout = real_stdout
+        simon.reset_to_normal_mode()
+        simon.MEDIA_PLAYER.close()
+        simon.STORE.close()
+        store_dir.cleanup()
+
+    diverged = 0
+    for path, original, replay in replayer.replayed:
+        got = (list(replay.values), replay.cheat_mode, replay.score)
+        wanted = (list(original.values), original.cheat_mode, original.score)
+        if got != wanted:
+            diverged += 1
+            print(f"{path}: DIVERGED, recorded {wanted[1]} score {wanted[2]}, replayed {got[1]} score {got[2]}")
+            if got[0] != wanted[0]:
+                print(f"  sequence {wanted[0]} became {got[0]}")
+    games = len(replayer.replayed)
+    print(f"{games} games replayed, {diverged} diverged, {elapsed / max(games, 1) * 1000:.1f}ms real time per game")
+    # With --real-time, TRACER's dump follows on the way out
+    sys.exit(1 if diverged or games < len(paths) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Soak test: runs the real main() through thousands of full games on a virtual clock,
+to catch whatever makes the cabinet slowly worse over a long event day.
+
+Everything runs on hardware.SimulatedHardware. time.monotonic/time.time/time.sleep
+and pygame.time.wait are swapped for a scripted_play.VirtualClock, and the buttons
+for a scripted player that does what a person at the cabinet would: watches the
+pawbeans, leaves attract mode, punches in a cheat code (every CHEAT_MODES entry in
+turn, plus no code at all), repeats back each SAY sequence, and eventually loses by
+pressing the wrong bean or walking away.
+
+Video players and the sprite overlay get launched as real `sleep` processes, so
+anything that doesn't get reaped shows up. Every --sample-every games we print:
+
+  * games played and game hours simulated so far
+  * real ms per game over the last batch, to spot the loop itself slowing down
+  * RSS, open file descriptors, live and zombie child processes
+
+and at the end how much each of those grew over the run. Games where the score or
+cheat mode the game recorded doesn't match what the player was going for count as
+desyncs, since that means the game and the script disagree about what happened.
+
+Usage: python3 scripts/soak.py [--games 2000] [--sample-every 100] [--max-score 12] [--seed 1]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import LegallyDistinctSimon as simon
+from game_store import GameStore
+from hardware import SimulatedHardware
+from scripted_play import ScriptedButtonEvents, VirtualClock
+from timeline import Scheduler
+
+BLACK = (0, 0, 0)
+
+
+class SoakFinished(Exception):
+    pass
+
+
+class SoakHardware(SimulatedHardware):
+    """Launches a long `sleep` in place of mplayer and the sprite overlay, so leaked children are real."""
+
+    def launch(self, args, **popen_kwargs):
+        self.launched.append(args)
+        # Deaf to the overlay's throttle signals, which would kill a plain sleep, and
+        # draining the media player's commands so its pipe never fills up
+        popen_kwargs.setdefault("stdin", subprocess.DEVNULL)
+        return subprocess.Popen(["sh", "-c", "trap '' USR1 USR2; cat >/dev/null; exec sleep 3600"], **popen_kwargs)
+
+
+class SoakPlayer:
+    """
+    Follows the game by watching the pawbeans and answers the game's waits:
+
+      attract    an ANIM went out, tap something after a while
+      cheat      all four beans in their colors, enter this game's cheat code (or nothing)
+      say        single beans lighting up one at a time, remember them
+      ask        the game wants them back, press them (or mess up on the losing round)
+      answered   the last one's scheduled, the previous bean's light may still be on
+      echo       the game took the last press, skip our own light until it goes off
+    """
+
+    def __init__(self, clock: VirtualClock, rng: random.Random, games: int, max_score: int):
+        self._clock = clock
+        self._rng = rng
+        self._games = games
+        self._max_score = max_score
+        self._modes = [None] + list(simon.CHEAT_MODES)
+        self._lit = set()
+        self.phase = "attract"
+        self.said = []
+        self.answered = 0
+        self.code_entered = False
+        self.started = 0
+        self.finished = 0
+        self.mode = None
+        self.target = 0
+        self.lose_by_timeout = False
+
+    def on_lights(self, command, beans) -> None:
+        lit = [bean + 1 for bean, rgb in enumerate(beans) if rgb != BLACK]
+        # The writer thread can fold "blank everything" and the next flash into one FRAME,
+        # so what counts is which bean just came on, not whether it was dark before
+        was_lit, self._lit = self._lit, set(lit)
+        if command.name.startswith("ANIM"):
+            self.phase = "attract"
+        elif self.phase == "attract" and len(lit) == len(set(beans)) == len(beans):
+            self.phase = "cheat"
+            self.code_entered = False
+        elif self.phase == "echo" and not lit:
+            self.phase = "say"
+            self.said = []
+        elif self.phase == "cheat" and len(lit) == 1:
+            # Nothing else in the cheat zone lights exactly one bean, so this is the first SAY
+            self.phase = "say"
+            self.said = lit
+        elif self.phase == "say" and len(lit) == 1 and lit[0] not in was_lit:
+            self.said.append(lit[0])
+
+    def __call__(self, events: ScriptedButtonEvents, waiting_for: str) -> None:
+        if self.phase == "answered" and waiting_for == "release":
+            self.phase = "echo"
+        if events.pending:
+            return
+        now = self._clock.monotonic()
+        if self.phase == "attract" and waiting_for == "press":
+            if self.finished >= self._games:
+                raise SoakFinished()
+            self.mode = self._modes[self.started % len(self._modes)]
+            self.target = self._rng.randint(0, self._max_score)
+            self.lose_by_timeout = self._rng.random() < 0.2
+            self.said = []
+            self.started += 1
+            events.tap(self._rng.randint(1, 4), now + self._rng.uniform(0.5, 30))
+        elif self.phase == "cheat" and not self.code_entered:
+            self.code_entered = True
+            for step, button in enumerate(simon.CHEAT_MODES.get(self.mode, ())):
+                events.tap(button, now + 0.3 * (step + 1))
+        elif self.phase in ("say", "ask") and waiting_for in ("press", "peek"):
+            if self.phase == "say":
+                if waiting_for != "press":
+                    return
+                self.phase = "ask"
+                self.answered = 0
+            reaction = now + self._rng.uniform(0.15, 0.8)
+            if len(self.said) > self.target:
+                if not self.lose_by_timeout:
+                    wrong = self._rng.choice([b for b in range(1, 5) if b != self.said[self.answered]])
+                    events.tap(wrong, reaction)
+                return
+            events.tap(self.said[self.answered], reaction)
+            self.answered += 1
+            if self.answered == len(self.said):
+                self.phase = "answered"
+
+
+def child_processes():
+    """(running, zombie) children of this process, straight out of /proc."""
+    running = zombies = 0
+    me = os.getpid()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue  # gone already
+        # The command name can have spaces and parens in it, everything after the last ")" is safe
+        fields = stat[stat.rindex(")") + 2:].split()
+        if int(fields[1]) == me:
+            if fields[0] == "Z":
+                zombies += 1
+            else:
+                running += 1
+    return running, zombies
+
+
+def rss_kib():
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--max-score", type=int, default=12, help="longest sequence the player gets right")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    clock = VirtualClock()
+    player = SoakPlayer(clock, random.Random(args.seed), args.games, args.max_score)
+    hardware = SoakHardware()
+    hardware.pawbeans.listeners.append(player.on_lights)
+
+    # The game's module-level helpers get swapped for virtual-time ones before main() builds anything
+    simon.ButtonEvents = lambda buttons: ScriptedButtonEvents(clock, player)
+    simon.SCHEDULER = Scheduler(spin=0.0, clock=clock.monotonic, sleep=clock.sleep)
+    store_dir = tempfile.TemporaryDirectory(prefix="simon-soak-")
+    simon.STORE = GameStore(os.path.join(store_dir.name, "games.sqlite3"))
+    simon.METRICS_ADDRESS = None  # not fighting a real cabinet on the same box for the port
+    # The player has to see every flash, so let the writer thread catch up before time moves on
+    framebuffers = []
+
+    class SoakFramebuffer(simon.Framebuffer):
+        def start(self):
+            framebuffers.append(self)
+            return super().start()
+
+    simon.Framebuffer = SoakFramebuffer
+    clock.before_advance.append(lambda: [framebuffer.sync(timeout=1.0) for framebuffer in framebuffers])
+
+    samples = []
+    desyncs = []
+    record_game = simon.record_game
+
+    def soak_record_game(cheat_mode_str, score, duration, reaction_times):
+        record_game(cheat_mode_str, score, duration, reaction_times)
+        player.finished += 1
+        if (cheat_mode_str, score) != (player.mode, player.target):
+            desyncs.append((player.finished, player.mode, player.target, cheat_mode_str, score))
+        if player.finished % args.sample_every == 0:
+            running, zombies = child_processes()
+            samples.append(
+                (player.finished, clock.monotonic() - 1000.0, time.perf_counter(), rss_kib(), open_fds(), running, zombies)
+            )
+            games, game_seconds, real, rss, fds, running, zombies = samples[-1]
+            previous_games, _, previous_real, *_ = samples[-2] if len(samples) > 1 else (0, 0, started_real)
+            per_game = (real - previous_real) / (games - previous_games) * 1000
+            print(
+                f"Soak: {games:6d} games {game_seconds / 3600:7.1f} game hours {per_game:6.1f}ms/game "
+                f"rss {rss} KiB fds {fds} children {running} zombies {zombies}",
+                file=sys.stderr,
+            )
+
+    simon.record_game = soak_record_game
+
+    # The game is chatty, only the soak's own lines go to stderr
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    clock.install()
+    started_real = time.perf_counter()
+    try:
+        simon.main(hardware)
+    except SoakFinished:
+        pass
+    finally:
+        clock.uninstall()
+        sys.stdout.close()
+        sys.stdout = real_stdout
+        simon.reset_to_normal_mode()
+        simon.MEDIA_PLAYER.close()
+        simon.STORE.close()
+        store_dir.cleanup()
+
+    elapsed = time.perf_counter() - started_real
+    print(f"{player.finished} games, {(clock.monotonic() - 1000.0) / 3600:.1f} game hours in {elapsed:.1f}s")
+    if len(samples) > 1:
+        first, last = samples[0], samples[-1]
+        print(f"RSS: {first[3]} -> {last[3]} KiB ({last[3] - first[3]:+d})")
+        print(f"Open fds: {first[4]} -> {last[4]} ({last[4] - first[4]:+d})")
+        print(f"Children: {first[5]} -> {last[5]} running, most zombies at once {max(s[6] for s in samples)}")
+        first_rate = (samples[1][2] - first[2]) / (samples[1][0] - first[0])
+        last_rate = (last[2] - samples[-2][2]) / (last[0] - samples[-2][0])
+        print(f"Real time per game: {first_rate * 1000:.1f}ms -> {last_rate * 1000:.1f}ms")
+    print(f"Desyncs: {len(desyncs)}")
+    for finished, mode, target, got_mode, got_score in desyncs[:10]:
+        print(f"  game {finished}: wanted {mode} score {target}, game recorded {got_mode} score {got_score}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import typing
+
+import numpy
+
+if typing.TYPE_CHECKING:
+    import pygame
+
+
+class RenderedSequence(typing.NamedTuple):
+    sound: "pygame.mixer.Sound"  # the whole SAY sequence as one sound
+    offsets: typing.Tuple[int, ...]  # sample each bean's clip starts at
+    lengths: typing.Tuple[int, ...]  # samples each bean stays lit for, its clip plus any silence up to on_time
+    samples: int  # total length, trailing gap included
+    frequency: int  # mixer samples per second, to turn the above into seconds
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.frequency
+
+
+class SequenceRenderer:
+    """
+    Mixes a whole SAY sequence into one buffer with NumPy, so the gaps between beans
+    are exact sample counts instead of however long the game loop took to get around
+    to the next sound.play().
+
+    The buffer is kept between renders. Every level replays the previous sequence plus
+    one bean, so only the part that differs from last time gets written: normally just
+    the new bean, and in speedrun mode whatever changed because the flashes got shorter.
+
+    :param registry: the SoundRegistry the sounds came from, so it's the same mixer (real or NullMixer)
+    :param sounds: the four bean sounds, in bean order
+    """
+
+    def __init__(self, registry, sounds: typing.Sequence["pygame.mixer.Sound"]):
+        self._mixer = registry.mixer
+        self._frequency = registry.audio.frequency
+        self._clips = [self._mixer.sound_array(sound) for sound in sounds]
+        # Same shape as a clip, (samples,) for mono or (samples, channels), room to grow
+        self._buffer = numpy.zeros((self._frequency * 10,) + self._clips[0].shape[1:], dtype=self._clips[0].dtype)
+        self._steps: typing.List[typing.Tuple[int, int, int]] = []  # (bean, clip samples, gap samples)
+        self._offsets: typing.List[int] = []
+        self._length = 0
+        self._rendered: typing.Optional[RenderedSequence] = None
+
+    def _reserve(self, samples: int) -> None:
+        if samples <= len(self._buffer):
+            return
+        bigger = numpy.zeros((max(samples, len(self._buffer) * 2),) + self._buffer.shape[1:], dtype=self._buffer.dtype)
+        bigger[: self._length] = self._buffer[: self._length]
+        self._buffer = bigger
+
+    def render(self, flashes: typing.Sequence[typing.Tuple[int, float]], gap_ms: int = 100) -> RenderedSequence:
+        """
+        :param flashes: (1-indexed bean, seconds it stays lit) for every bean in the sequence,
+            sounds get cut short to match (speedrun) but never stretched, and a sound shorter
+            than that is followed by silence, like on the per-bean channels
+        :param int gap_ms: silence after each bean
+        """
+        gap = round(gap_ms * self._frequency / 1000)
+        steps = [(bean, round(on_time * self._frequency), gap) for bean, on_time in flashes]
+
+        # Keep however much of last time's buffer still matches, redo the rest
+        keep = 0
+        while keep < min(len(steps), len(self._steps)) and steps[keep] == self._steps[keep]:
+            keep += 1
+        if keep == len(steps) == len(self._steps) and self._rendered is not None:
+            return self._rendered
+        del self._steps[keep:]
+        del self._offsets[keep:]
+        self._length = self._offsets[-1] + sum(self._steps[-1][1:]) if self._steps else 0
+
+        for bean, samples, gap in steps[keep:]:
+            self._reserve(self._length + samples + gap)
+            clip = self._clips[bean - 1][:samples]
+            self._buffer[self._length : self._length + len(clip)] = clip
+            self._buffer[self._length + len(clip) : self._length + samples + gap] = 0
+            self._offsets.append(self._length)
+            self._steps.append((bean, samples, gap))
+            self._length += samples + gap
+
+        self._rendered = RenderedSequence(
+            sound=self._mixer.make_sound(self._buffer[: self._length]),
+            offsets=tuple(self._offsets),
+            lengths=tuple(samples for _, samples, _ in self._steps),
+            samples=self._length,
+            frequency=self._frequency,
+        )
+        return self._rendered
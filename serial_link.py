@@ -0,0 +1,239 @@
+"""
+Both directions of the pawbean serial port. Writes go out with a window of
+unacknowledged commands instead of a flush() after every one, and a reader thread
+drains everything the firmware says back so the host's receive buffer never fills.
+
+With acks on (ACKS 1, see the sketch) the firmware answers every command with one
+OK or ERR line once it's been handled. Serial is in order, so every answer belongs
+to the oldest command still waiting for one. That gets us:
+
+  * round trip times, command written to answer read, into TRACER's "serial_rtt"
+    span and stats()
+  * ERR for anything the firmware didn't like, printed as it happens
+  * lost commands, the ones nothing came back for within ack_timeout
+  * flow control: write() waits while `window` commands are unanswered, so a slow
+    board pushes back on the writer thread rather than piling up bytes in buffers
+
+Firmware from before ACKS never answers the handshake, and then this is just a
+reader for its debug chatter and write() flushes like it always did. Nobody waits on
+the handshake: until the firmware answers, writes flush like they would without
+acks (while still being lined up for answers), so the boot color goes out right
+away either way.
+"""
+import collections
+import statistics
+import threading
+import time
+import typing
+
+from pawbeans import encode_acks
+from tracing import TRACER
+
+_RTT = TRACER.span("serial_rtt")
+
+
+class SerialLink:
+    """
+    Quacks like the serial.Serial it wraps as far as Framebuffer (and bench_serial.py)
+    are concerned: write() and flush().
+
+    :param ser: an open serial.Serial, or anything with write(), flush() and readline()
+    :param int window: commands allowed to be waiting for an answer before write() waits
+    :param float ack_timeout: seconds before an unanswered command counts as lost
+    :param int give_up_after: lost commands in a row before deciding acks aren't coming
+    :param bool debug: print what the firmware says besides OK and ERR
+    :param int history: round trip times kept for stats()
+    """
+
+    def __init__(
+        self,
+        ser,
+        window: int = 4,
+        ack_timeout: float = 0.5,
+        give_up_after: int = 8,
+        debug: bool = False,
+        history: int = 1000,
+    ):
+        self._ser = ser
+        self._window = window
+        self._ack_timeout = ack_timeout
+        self._give_up_after = give_up_after
+        self._debug = debug
+        self._cond = threading.Condition()
+        # Held from taking a slot to the bytes being written, so slots are in wire order
+        self._write_lock = threading.Lock()
+        self._in_flight: typing.Deque[typing.Tuple[str, float]] = collections.deque()  # (command name, perf_counter sent)
+        self._acking = False
+        self._handshake_deadline: typing.Optional[float] = None  # perf_counter, while ACKS 1 is unanswered
+        self._handshake_done = threading.Event()
+        self._lost_in_a_row = 0
+        self._running = False
+        self._thread: typing.Optional[threading.Thread] = None
+        self._rtts: typing.Deque[float] = collections.deque(maxlen=history)
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.lost = 0
+        self.chatter = 0  # lines that weren't OK or ERR
+
+    @property
+    def acking(self) -> bool:
+        """Whether the firmware is answering commands, i.e. whether there's flow control."""
+        return self._acking
+
+    def start(self, handshake_timeout: float = 0.5) -> "SerialLink":
+        """
+        Starts the reader and asks the firmware for acks, without waiting for the answer.
+        If none comes within handshake_timeout it stays flushing every write.
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="pawbean-reader", daemon=True)
+        self._thread.start()
+        with self._write_lock, self._cond:
+            self._handshake_deadline = time.perf_counter() + handshake_timeout
+            self._send(encode_acks(True))
+        self._ser.flush()
+        return self
+
+    def wait_for_handshake(self, timeout: typing.Optional[float] = None) -> bool:
+        """Blocks until the firmware has answered ACKS 1 or been given up on. Returns acking."""
+        self._handshake_done.wait(timeout)
+        return self._acking
+
+    def stop(self) -> None:
+        if self._acking or self._handshake_deadline is not None:
+            with self._write_lock:
+                self._ser.write(encode_acks(False).encode("latin1"))
+                self._ser.flush()
+        with self._cond:
+            self._running = False
+            self._acking = False
+            self._handshake_deadline = None
+            self._in_flight.clear()
+            self._cond.notify_all()
+        self._handshake_done.set()
+        if hasattr(self._ser, "cancel_read"):
+            self._ser.cancel_read()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def __enter__(self) -> "SerialLink":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _expire(self) -> None:
+        """Gives up on the oldest command if it's been waiting too long. Call with the lock held."""
+        now = time.perf_counter()
+        if self._handshake_deadline is not None:
+            if now > self._handshake_deadline:
+                # Old firmware, nothing we sent while asking is ever getting an answer
+                self._handshake_deadline = None
+                self._in_flight.clear()
+                self._handshake_done.set()
+                self._cond.notify_all()
+                print("Pawbeans: firmware doesn't ack, flushing every write instead")
+            return
+        while self._in_flight and now - self._in_flight[0][1] > self._ack_timeout:
+            name, _ = self._in_flight.popleft()
+            self.lost += 1
+            self._lost_in_a_row += 1
+            print(f"Pawbeans: no answer to {name}, counting it as lost")
+            if self._lost_in_a_row >= self._give_up_after:
+                print(f"Pawbeans: {self._lost_in_a_row} lost in a row, giving up on acks and flushing every write")
+                self._acking = False
+                self._in_flight.clear()
+            self._cond.notify_all()
+
+    def _send(self, line: str) -> None:
+        """Writes one command, once there's room in the window. Call with both locks held."""
+        self._expire()
+        while self._acking and len(self._in_flight) >= self._window:
+            oldest_sent = self._in_flight[0][1]
+            self._cond.wait(max(0.0, oldest_sent + self._ack_timeout - time.perf_counter()))
+            self._expire()
+        if self._acking or self._handshake_deadline is not None:
+            self._in_flight.append((line.split(" ", 1)[0].strip(), time.perf_counter()))
+        self.sent += 1
+        self._ser.write(line.encode("latin1"))
+
+    def write(self, data: bytes) -> int:
+        with self._write_lock:
+            for line in data.decode("latin1").splitlines(keepends=True):
+                with self._cond:
+                    self._send(line)
+        return len(data)
+
+    def flush(self) -> None:
+        # With acks, the window already keeps the writer from getting ahead of the board
+        if not self._acking:
+            self._ser.flush()
+
+    def _answer(self, ok: bool) -> None:
+        with self._cond:
+            if not self._in_flight:
+                return  # the answer to something we already gave up on
+            if self._handshake_deadline is not None:
+                # The answer to ACKS 1, and everything since is lined up for its own
+                self._handshake_deadline = None
+                self._acking = True
+                self._handshake_done.set()
+            name, sent = self._in_flight.popleft()
+            rtt = time.perf_counter() - sent
+            self._rtts.append(rtt)
+            self._lost_in_a_row = 0
+            if ok:
+                self.acked += 1
+            else:
+                self.errors += 1
+            self._cond.notify_all()
+        TRACER.record(_RTT, time.perf_counter_ns() - round(rtt * 1e9), round(rtt * 1e9))
+        if not ok:
+            print(f"Pawbeans: firmware couldn't do {name}")
+
+    def _run(self) -> None:
+        pending = b""
+        while self._running:
+            try:
+                pending += self._ser.readline()
+            except (OSError, TypeError) as e:  # pyserial raises TypeError when the port's closed under it
+                if self._running:
+                    print(f"Pawbean read failed: {e}")
+                return
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                text = line.decode("latin1").strip()
+                if text in ("OK", "ERR"):
+                    self._answer(text == "OK")
+                elif text:
+                    self.chatter += 1
+                    if self._debug:
+                        print(f"Pawbeans said: {text}")
+            with self._cond:
+                self._expire()
+
+    def stats(self) -> typing.Dict[str, float]:
+        """Counts so far, and median / p99 / max round trip in ms over the last `history` answers."""
+        with self._cond:
+            rtts = sorted(self._rtts)
+        stats = {"sent": self.sent, "acked": self.acked, "errors": self.errors, "lost": self.lost, "chatter": self.chatter}
+        if rtts:
+            stats["rtt_median_ms"] = statistics.median(rtts) * 1000
+            stats["rtt_p99_ms"] = rtts[min(len(rtts) - 1, int(len(rtts) * 0.99))] * 1000
+            stats["rtt_max_ms"] = rtts[-1] * 1000
+        return stats
+
+    def report(self) -> None:
+        stats = self.stats()
+        line = (
+            f"Pawbeans: {stats['sent']} sent, {stats['acked']} acked, {stats['errors']} errors, "
+            f"{stats['lost']} lost, {stats['chatter']} chatter lines"
+        )
+        if "rtt_median_ms" in stats:
+            line += (
+                f", round trip median {stats['rtt_median_ms']:.2f}ms p99 {stats['rtt_p99_ms']:.2f}ms "
+                f"max {stats['rtt_max_ms']:.2f}ms"
+            )
+        print(line)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+The same game as LegallyDistinctSimon.main(), on asyncio instead of one big blocking loop.
+
+Each state (ATTRACT, CHEAT, SAY, ASK, GAME_OVER) is a coroutine, and whatever has
+to happen at the same time runs as tasks: attract animations until a press comes
+in, a sound playing out while we watch for the release and the next press, a SAY
+sequence's lights and sounds on their deadlines. Every wait on a player is an
+asyncio.wait_for() with a real timeout, so a stuck button or a walk-away ends the
+game instead of hanging it.
+
+Button edges still come from gpiozero's thread. AsyncButtonEvents hops them onto
+the event loop with call_soon_threadsafe, and the rest of the game never touches
+a lock. Lights go through the same Framebuffer (its writer thread never blocks
+us), sounds through the same SoundRegistry, and the rules, sounds, cheat codes and
+game store are all the ones in LegallyDistinctSimon.py.
+
+Game state lives on the AsyncGame, not in module globals, and each one gets its
+pins, serial port and mixer channels from a hardware.Cabinet, so cabinets.py can
+run several side by side. Not supported here (yet): PRERENDERED_SAY_AUDIO, SAY is
+always played bean by bean.
+
+Usage: python3 simon_async.py [--simulate] [--low-latency-audio] [--audio-buffer N]
+"""
+import argparse
+import asyncio
+import collections
+import enum
+import os
+import random
+import signal
+import subprocess
+import time
+import typing
+
+import LegallyDistinctSimon as simon
+from button_events import ButtonEvent, ButtonEvents
+from cheat_codes import CheatCodeMatcher, MatchState
+from hardware import Cabinet, PiHardware, SimulatedHardware
+from media_player import MediaPlayer
+from pawbeans import Framebuffer, encode_anim, encode_quiet
+from recording import new_seed
+from serial_link import SerialLink
+from timeline import Timeline
+from tracing import TRACER
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class GameState(enum.Enum):
+    ATTRACT = "attract"
+    CHEAT = "cheat"
+    SAY = "say"
+    ASK = "ask"
+    GAME_OVER = "game_over"
+
+
+class AsyncButtonEvents(ButtonEvents):
+    """
+    ButtonEvents for a coroutine: same edge detection, but edges land in a queue on
+    the event loop instead of behind a condition variable. None of the waits here
+    take a deadline, wrap them in asyncio.wait_for() instead.
+
+    :param loop: the event loop the game runs on
+    """
+
+    def __init__(self, buttons: typing.Sequence, loop: asyncio.AbstractEventLoop, clock=time.monotonic):
+        self._loop = loop
+        self._queue: typing.Deque[ButtonEvent] = collections.deque()
+        self._arrived = asyncio.Event()
+        # What's held as of the last edge the loop has seen, which can be behind gpiozero
+        self._loop_held = [False] * len(buttons)
+        super().__init__(buttons, clock)
+        self._loop_held = list(self._held)
+
+    def _deliver(self, event: ButtonEvent) -> None:
+        self._loop.call_soon_threadsafe(self._arrive, event)
+
+    def _arrive(self, event: ButtonEvent) -> None:
+        self._queue.append(event)
+        self._loop_held[event.button - 1] = event.pressed
+        self._arrived.set()
+
+    async def _wait(self) -> None:
+        while not self._queue:
+            self._arrived.clear()
+            await self._arrived.wait()
+
+    def clear(self) -> None:
+        self._queue.clear()
+
+    async def get(self) -> ButtonEvent:
+        await self._wait()
+        return self._queue.popleft()
+
+    async def peek(self) -> ButtonEvent:
+        await self._wait()
+        return self._queue[0]
+
+    async def wait_for_press(self) -> ButtonEvent:
+        while True:
+            event = await self.get()
+            if event.pressed:
+                return event
+
+    async def wait_for_release(self, button: int) -> ButtonEvent:
+        """The button's release edge, or a made up one straight away if it isn't held."""
+        while True:
+            for event in self._queue:
+                if event.button == button and not event.pressed:
+                    self._queue.remove(event)
+                    return event
+            if not self._loop_held[button - 1]:
+                return ButtonEvent(button, False, self._clock())
+            self._arrived.clear()
+            await self._arrived.wait()
+
+
+class _AnimationPicker(simon.AttractMode):
+    """AttractMode's animations with their random parameters, but handing back the command instead of playing it."""
+
+    def _animate(self, name: str, duration_ms: int, *params) -> bool:
+        self.picked = (encode_anim(name, duration_ms, *params), duration_ms)
+        return True
+
+
+def prepare_sounds(hardware, cabinets: int = 1) -> None:
+    """Opens the mixer with a channel group per cabinet and decodes the usual sounds. Once per host."""
+    simon.SOUNDS.use_mixer(hardware.mixer)
+    simon.SOUNDS.reserve_channels(simon.NUM_BEANS * cabinets)
+    simon.SOUNDS.preload(modes=("normal",), effects=simon.SOUND_EFFECTS)
+    for mode in simon.VOICED_MODES:
+        simon.get_voiced_soundboard(mode)
+    simon.SOUNDS.report()
+
+
+async def sound_finished(channel, limit: typing.Optional[float] = None) -> None:
+    """Returns once a channel stops playing, or after `limit` seconds if that's sooner."""
+    deadline = None if limit is None else time.monotonic() + limit
+    while channel.get_busy() and (deadline is None or time.monotonic() < deadline):
+        await asyncio.sleep(0.01)
+
+
+async def first_of(*awaitables) -> None:
+    """Runs them all and returns as soon as one finishes, cancelling the rest."""
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class AsyncGame:
+    """
+    One cabinet's game. Everything a cheat mode changes is in here, and reset() puts it back.
+    The sounds have to be set up first, see prepare_sounds().
+
+    :param hardware: a hardware.PiHardware or hardware.SimulatedHardware
+    :param cabinet: which pins, port and channel group, LegallyDistinctSimon.CABINET if not given
+    """
+
+    def __init__(self, hardware, cabinet: typing.Optional[Cabinet] = None):
+        self._hardware = hardware
+        self.cabinet = cabinet or simon.CABINET
+        self._matcher = CheatCodeMatcher(simon.CHEAT_MODES)
+        self.state = GameState.ATTRACT
+        self.lights = None
+        self.buttons: typing.Optional[AsyncButtonEvents] = None
+        self.media_player = MediaPlayer(hardware.launch)
+        self.lights_and_sound: typing.List[typing.Tuple[str, typing.Any]] = []
+        self.speedrun_timer: typing.Optional[int] = None
+        self.overlay = None
+        self.game_memory: typing.List[int] = []
+        self.seed: typing.Optional[int] = None  # this game's, see recording.new_seed()
+
+    def reset(self) -> None:
+        """Everything back to normal mode, the async version of reset_to_normal_mode()."""
+        self.lights_and_sound = list(zip(simon.COLORS, simon.get_soundboard()))
+        self.media_player.stop()
+        self.speedrun_timer = None
+        if self.overlay is not None:
+            self.overlay.terminate()
+            try:
+                self.overlay.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.overlay.kill()
+                self.overlay.wait()
+            self.overlay = None
+
+    def log(self, message: str) -> None:
+        print(f"[{self.cabinet.name}] {message}" if self.cabinet.name else message)
+
+    def bean_channel(self, index: int):
+        """This cabinet's reserved channel for a 1-indexed bean"""
+        return simon.SOUNDS.channel(self.cabinet.channel_group * simon.NUM_BEANS + index - 1)
+
+    def _throttle_overlay(self, throttled: bool) -> None:
+        if self.overlay is not None and self.overlay.poll() is None:
+            self.overlay.send_signal(signal.SIGUSR1 if throttled else signal.SIGUSR2)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.buttons is None:
+            self.buttons = AsyncButtonEvents(self._hardware.buttons(self.cabinet.button_pins), loop)
+        self.media_player.start()
+        try:
+            with self._hardware.serial(self.cabinet.serial_port) as ser, SerialLink(ser, debug=simon.DEBUG) as link, Framebuffer(
+                link, debug=simon.DEBUG
+            ) as lights:
+                self.lights = lights
+                await asyncio.to_thread(lights.send, encode_quiet(True))
+                while True:
+                    await self.play_one()
+        finally:
+            self.reset()
+            self.media_player.close()
+
+    async def play_one(self) -> None:
+        """Attract mode through to game over, one whole game."""
+        simon.blank_all_beans(self.lights)
+        self.reset()
+        self.buttons.clear()
+        await self.attract()
+        cheat_mode_str = await self.cheat()
+        started = time.monotonic()
+        reaction_times: typing.List[float] = []
+        self.game_memory = []
+        # Every game's sequence comes from its own seed, same as LegallyDistinctSimon.main()
+        self.seed = new_seed()
+        rng = random.Random(self.seed)
+        while True:
+            self.game_memory.append(simon.next_value(rng))
+            await self.say()
+            if not await self.ask(reaction_times):
+                break
+        await self.game_over(cheat_mode_str, time.monotonic() - started, reaction_times)
+
+    async def attract(self) -> None:
+        """Firmware animations one after another, until somebody presses something."""
+        self.state = GameState.ATTRACT
+        picker = _AnimationPicker(lights=None, dummy=True)
+        sending = None
+
+        def show(command: str) -> None:
+            self.lights.send(command)
+            self.lights.invalidate()
+
+        async def animate():
+            nonlocal sending
+            while True:
+                picker._rng.shuffle(picker._all_animations)
+                for animation in picker._all_animations:
+                    animation()
+                    command, duration_ms = picker.picked
+                    # send() is a blocking serial write, and the other cabinets share this loop
+                    sending = asyncio.ensure_future(asyncio.to_thread(show, command))
+                    await asyncio.shield(sending)
+                    await asyncio.sleep(duration_ms / 1000)
+
+        await first_of(animate(), self.buttons.wait_for_press())
+        if sending is not None:
+            # A press can land mid-send, the animation has to be out before we blank over it
+            await sending
+        simon.blank_all_beans(self.lights)
+        self.log("Attract mode is over! Starting in 3 seconds...")
+
+    async def cheat(self) -> typing.Optional[str]:
+        """The cheat zone: all beans lit, a few seconds to punch in a code. Returns the mode, if any."""
+        self.state = GameState.CHEAT
+        simon.light_all_beans(self.lights)
+        matcher = self._matcher
+        matcher.reset()
+        cheat_memory = []
+        cheat_input_deadline = time.monotonic() + simon.CHEAT_TIMEOUT_VALUE
+        deadline = cheat_input_deadline
+        while True:
+            try:
+                event = await asyncio.wait_for(self.buttons.get(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if not event.pressed:
+                continue
+            cheat_memory.append(event.button)
+            self.log(f"BUTTON {event.button} PRESSED!")
+            match_state = matcher.press(event.button)
+            if match_state in (MatchState.complete, MatchState.no_match):
+                break
+            if match_state == MatchState.complete_prefix:
+                deadline = min(cheat_input_deadline, time.monotonic() + simon.CHEAT_TAIL_TIMEOUT_VALUE)
+            else:
+                deadline = cheat_input_deadline
+        self.log(f"CHEAT MEMORY: {cheat_memory}")
+        simon.blank_all_beans(self.lights)
+
+        mode = matcher.mode
+        if mode:
+            channel = simon.play_sound(simon.SOUNDS.effect("cheat_unlocked"))
+
+            async def flash_green():
+                for _ in range(3):
+                    self.lights.set(0, simon.BeanColors.green.value)
+                    await asyncio.sleep(0.2)
+                    simon.blank_all_beans(self.lights)
+                    await asyncio.sleep(0.2)
+
+            # The flashes and the fanfare at the same time, done when both are
+            await asyncio.gather(flash_green(), sound_finished(channel))
+            self.apply_cheat_mode(mode)
+        return mode
+
+    def apply_cheat_mode(self, mode: str) -> None:
+        self.log(f"CHEAT MODE UNLOCKED: {mode.replace('_', ' ').upper()}!!")
+        if mode in simon.VOICED_MODES:
+            self.lights_and_sound = list(zip(simon.COLORS, simon.get_voiced_soundboard(mode)))
+        elif mode == "blue_mode":
+            self.lights_and_sound = list(zip([simon.BeanColors.blue.value] * simon.NUM_BEANS, simon.get_soundboard()))
+            self.media_player.play(os.path.join(ROOT_DIR, "videos", "blue.webm"))
+        elif mode == "ogre_mode":
+            self.lights_and_sound = list(zip([simon.BeanColors.green.value] * simon.NUM_BEANS, simon.get_ogre_soundboard()))
+            self.media_player.play(os.path.join(ROOT_DIR, "videos", "ogre.mp4"))
+        elif mode == "speedrun_mode":
+            self.speedrun_timer = 500
+            self.overlay = simon.launch_overlay(self._hardware)
+
+    def say_timeline(self, gap_ms: int = 100) -> Timeline:
+        """say_timeline() off this game's state instead of the globals."""
+        timeline = Timeline()
+        at = 0.0
+        for index in self.game_memory:
+            light, sound = self.lights_and_sound[index - 1]
+            if self.speedrun_timer:
+                on_time = self.speedrun_timer / 1000
+                if self.speedrun_timer > 50:
+                    self.speedrun_timer -= 10
+                    self.log(f"Decreasing flash time to {self.speedrun_timer}ms!")
+            else:
+                on_time = sound.get_length()
+            channel = self.bean_channel(index)
+            timeline.add(at, "light_on", lambda index=index, light=light: self.lights.set(index, light))
+            timeline.add(at, "sound_start", lambda sound=sound, channel=channel: simon.play_sound(sound, channel))
+            timeline.add(at + on_time, "sound_stop", channel.stop)
+            timeline.add(at + on_time, "light_off", lambda index=index: self.lights.set(index, simon.BeanColors.off.value))
+            at += on_time + gap_ms / 1000
+        timeline.end = at
+        return timeline
+
+    async def say(self) -> None:
+        """Plays the sequence on the event loop's clock, every event against its own deadline."""
+        self.state = GameState.SAY
+        self.log("SAY")
+        timeline = self.say_timeline()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self._throttle_overlay(True)
+        try:
+            for event in timeline.events():
+                delay = start + event.at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                event.action()
+            await asyncio.sleep(max(0.0, start + timeline.end - loop.time()))
+        finally:
+            self._throttle_overlay(False)
+        # Mashing during SAY doesn't count as an answer
+        self.buttons.clear()
+
+    async def ask(self, reaction_times: typing.List[float]) -> bool:
+        """The player repeats the sequence back. False if they got it wrong or ran out of time."""
+        self.state = GameState.ASK
+        self.log("ASK")
+        for expected in self.game_memory:
+            prompt_time = time.monotonic()
+            try:
+                event = await asyncio.wait_for(self.buttons.wait_for_press(), simon.TIMEOUT_VALUE)
+            except asyncio.TimeoutError:
+                return False
+            TRACER.since(simon.PRESS_TO_DEQUEUE_SPAN, event.timestamp)
+            if event.button != expected:
+                return False
+            reaction_times.append(event.timestamp - prompt_time)
+            await self.echo(event)
+        await asyncio.sleep(0.5)
+        return True
+
+    async def echo(self, event: ButtonEvent) -> None:
+        """Light and sound for a right answer, for as long as they hold it and the sound lasts."""
+        index = event.button
+        light, sound = self.lights_and_sound[index - 1]
+        self.lights.set(index, light)
+        TRACER.since(simon.PRESS_TO_LIGHT_SPAN, event.timestamp)
+        channel = simon.play_sound(sound, self.bean_channel(index))
+        TRACER.since(simon.PRESS_TO_SOUND_SPAN, event.timestamp)
+        try:
+            await asyncio.wait_for(self.buttons.wait_for_release(index), simon.TIMEOUT_VALUE)
+        except asyncio.TimeoutError:
+            self.log(f"Button {index} stuck down, carrying on without it")
+        # The next press cuts the sound short, and stays queued for ask()
+        limit = self.speedrun_timer / 1000 if self.speedrun_timer else None
+        await first_of(sound_finished(channel, limit), self.buttons.peek())
+        channel.stop()
+        self.lights.set(index, simon.BeanColors.off.value)
+
+    async def game_over(self, cheat_mode_str: typing.Optional[str], duration: float, reaction_times: typing.List[float]) -> None:
+        self.state = GameState.GAME_OVER
+        self.lights.set(0, simon.BeanColors.red.value)
+        # Resampling a fail cue and the game store's fsync would hold up every cabinet on
+        # this loop, so they happen on a worker thread
+        cue = await asyncio.to_thread(simon.get_fail_cue) if cheat_mode_str in simon.VOICED_MODES else None
+        await sound_finished(simon.play_sound(cue or simon.SOUNDS.effect("game_over")))
+        simon.blank_all_beans(self.lights)
+        score = len(self.game_memory) - 1
+        await asyncio.to_thread(simon.record_game, cheat_mode_str, score, duration, reaction_times)
+        self.log(f"{cheat_mode_str} GAME OVER!" if cheat_mode_str else "GAME OVER!")
+        self.log(f"YOUR SCORE: {score}")
+        self.log("JOIN PAWPRINT PROTOTYPING AT PAWPRINTPROTOTYPING.ORG\n\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--low-latency-audio", action="store_true", help="open the mixer with LOW_LATENCY_AUDIO_CONFIG")
+    parser.add_argument("--audio-buffer", type=int, help="mixer buffer in samples, see scripts/audio_latency.py")
+    parser.add_argument("--simulate", action="store_true", help="fake buttons, pawbeans and audio, type button numbers to play")
+    args = parser.parse_args()
+    audio = simon.LOW_LATENCY_AUDIO_CONFIG if args.low_latency_audio else simon.SOUNDS.audio
+    if args.audio_buffer:
+        audio = audio._replace(buffer=args.audio_buffer)
+    simon.SOUNDS.use_audio(audio)
+    if args.simulate:
+        hardware = SimulatedHardware(verbose=True)
+        hardware.tap_from_stdin()
+    else:
+        hardware = PiHardware()
+    TRACER.install()
+    prepare_sounds(hardware)
+    try:
+        asyncio.run(AsyncGame(hardware).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import collections
+import json
+import os
+import threading
+import time
+import typing
+
+from hardware import PygameMixer, wav_info
+
+if typing.TYPE_CHECKING:
+    import pygame
+
+
+class AudioConfig(typing.NamedTuple):
+    """What the mixer gets opened with, see pygame.mixer.init()."""
+
+    frequency: int = 8000
+    size: int = -16  # bits per sample, negative for signed
+    channels: int = 2
+    # Samples per mixer callback. Also the floor on flash-to-tone delay: buffer / frequency seconds
+    buffer: int = 512
+
+    @property
+    def buffer_ms(self) -> float:
+        return self.buffer * 1000 / self.frequency
+
+
+# What scripts/build_assets.py built from what, in every directory it builds into
+CACHE_MANIFEST = ".build_assets.json"
+
+
+def cache_path(cache_dir: str, audio: AudioConfig, asset: str) -> str:
+    """Where the copy of `asset` (relative to root_dir) converted for `audio` lives in a cache directory."""
+    return os.path.join(cache_dir, f"{audio.frequency}Hz-{abs(audio.size)}bit-{audio.channels}ch", asset)
+
+
+def source_stamp(path: str) -> typing.Dict[str, int]:
+    """
+    Size and mtime of a WAV, as build_assets records them next to the copy it made. If the
+    WAV still matches, the copy is of what's there now. Hashing it again would cost about
+    as much as decoding it, which is what the cache is there to save.
+    """
+    stat = os.stat(path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+class SoundRegistry:
+    """
+    One place that owns the mixer and every decoded pygame.mixer.Sound.
+
+    The mixer gets initialised once, each WAV gets decoded once, and soundboards
+    are handed back by mode name. Pinned packs (the normal soundboard) and the one-off
+    effects stay resident forever; the other mode packs live in an LRU and get
+    dropped, least recently played first, once we go over the memory budget.
+
+    :param str root_dir: directory the asset paths are relative to
+    :param dict soundboards: mode name -> list of WAV paths, or a directory to list once
+    :param dict effects: effect name -> WAV path
+    :param int memory_budget: decoded bytes allowed before unpinned packs get evicted
+    :param pinned: mode names that are never evicted
+    :param AudioConfig audio: what the mixer gets opened with
+    :param int reserved_channels: mixer channels kept out of sound.play()'s way, for channel()
+    :param mixer: what actually decodes and plays sounds, see hardware.PygameMixer and hardware.NullMixer
+    :param str cache_dir: where scripts/build_assets.py put WAVs already at the mixer's rate, None for no cache
+
+    Every WAV is converted to the mixer's rate and format by SDL as it's decoded, so
+    nothing gets resampled at play time. report() says which ones needed it. A WAV with
+    an up to date copy in cache_dir (see cache_path()) gets that decoded instead, which
+    is a straight copy for SDL. Up to date means build_assets' manifest has the copy, made
+    from a WAV the same size and mtime as this one (see source_stamp()). A copied over,
+    edited or checked out WAV doesn't match, and gets decoded from the original.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        soundboards: typing.Dict[str, typing.Union[str, typing.Sequence[str]]],
+        effects: typing.Dict[str, str],
+        memory_budget: int,
+        pinned: typing.Iterable[str] = ("normal",),
+        audio: AudioConfig = AudioConfig(),
+        reserved_channels: int = 0,
+        mixer=None,
+        cache_dir: typing.Optional[str] = None,
+    ):
+        self._root_dir = root_dir
+        self._cache_dir = cache_dir
+        self._soundboards = soundboards
+        self._effect_paths = effects
+        self._memory_budget = memory_budget
+        self._pinned = set(pinned)
+        self._audio = audio
+        self._reserved_channels = reserved_channels
+        self._mixer = mixer if mixer is not None else PygameMixer()
+        self._mixer_ready = False
+        # Loads can come from a background thread as well as the game loop
+        self._lock = threading.RLock()
+        self._packs: typing.OrderedDict[str, typing.List["pygame.mixer.Sound"]] = collections.OrderedDict()
+        self._pack_bytes: typing.Dict[str, int] = {}
+        self._effects: typing.Dict[str, "pygame.mixer.Sound"] = {}
+        self._channels: typing.List["pygame.mixer.Channel"] = []
+        self._resampled: typing.Dict[str, int] = {}  # asset path -> the rate it was at before decoding
+        self._from_cache: typing.Set[str] = set()  # asset paths decoded from cache_dir
+        self._cache_manifest: typing.Optional[typing.Dict[str, typing.Dict]] = None  # cached path -> entry
+        self.load_times: typing.Dict[str, float] = {}  # asset path -> seconds spent decoding
+
+    def init_mixer(self) -> None:
+        with self._lock:
+            if not self._mixer_ready:
+                self._mixer.init(self._audio)  # raises exception on fail
+                if self._reserved_channels:
+                    # The default 8 channels, plus however many we keep to ourselves
+                    self._mixer.set_num_channels(8 + self._reserved_channels)
+                    self._mixer.set_reserved(self._reserved_channels)
+                    self._channels = [self._mixer.Channel(index) for index in range(self._reserved_channels)]
+                self._mixer_ready = True
+
+    @property
+    def mixer(self):
+        """Whatever's decoding and playing sounds, opened if it wasn't already."""
+        with self._lock:
+            self.init_mixer()
+            return self._mixer
+
+    @property
+    def audio(self) -> AudioConfig:
+        return self._audio
+
+    def use_audio(self, audio: AudioConfig) -> None:
+        """Changes what the mixer gets opened with. Only works before anything's been loaded."""
+        with self._lock:
+            if self._mixer_ready:
+                raise RuntimeError("The mixer is already open")
+            self._audio = audio
+
+    def reserve_channels(self, count: int) -> None:
+        """Changes how many channels channel() has to hand out. Only works before the mixer's open."""
+        with self._lock:
+            if self._mixer_ready:
+                raise RuntimeError("The mixer is already open")
+            self._reserved_channels = count
+
+    def channel(self, index: int) -> "pygame.mixer.Channel":
+        """
+        One of the reserved channels. Playing on it cuts off whatever it was playing and
+        nothing else ever gets mixed onto it, so there's never a hunt for a free channel.
+        """
+        with self._lock:
+            self.init_mixer()
+            return self._channels[index]
+
+    def use_mixer(self, mixer) -> None:
+        """Swaps in another mixer (the simulated one, say). Everything decoded so far gets dropped."""
+        with self._lock:
+            self._mixer = mixer
+            self._mixer_ready = False
+            self._channels = []
+            self._packs.clear()
+            self._pack_bytes.clear()
+            self._effects.clear()
+            self.load_times.clear()
+            self._resampled.clear()
+            self._from_cache.clear()
+            self._cache_manifest = None
+
+    def _pack_paths(self, mode: str) -> typing.List[str]:
+        paths = self._soundboards[mode]
+        if isinstance(paths, str):
+            # A whole directory, in whatever order the filesystem hands it to us
+            directory = os.path.join(self._root_dir, paths)
+            return [os.path.join(directory, f) for f in os.listdir(directory)]
+        return [os.path.join(self._root_dir, path) for path in paths]
+
+    def load(self, path: str) -> "pygame.mixer.Sound":
+        """Decodes one WAV, relative to root_dir, without keeping it. For whoever wants to do their own caching."""
+        with self._lock:
+            self.init_mixer()
+            return self._load(os.path.join(self._root_dir, path))
+
+    def _manifest(self) -> typing.Dict[str, typing.Dict]:
+        if self._cache_manifest is None:
+            try:
+                with open(os.path.join(self._cache_dir, CACHE_MANIFEST)) as manifest_file:
+                    entries = json.load(manifest_file)
+            except (OSError, ValueError):
+                entries = {}  # never built, or mangled, either way nothing in there can be trusted
+            # Keyed by wherever build_assets thought the cache was, which may not be how we spell it
+            self._cache_manifest = {os.path.abspath(key): entry for key, entry in entries.items()}
+        return self._cache_manifest
+
+    def _cached(self, asset: str, path: str) -> typing.Optional[str]:
+        """The pre-converted copy of an asset, if there is one and it was built from the asset as it is now."""
+        if self._cache_dir is None or asset.startswith(os.pardir):
+            return None
+        cached = cache_path(self._cache_dir, self._audio, asset)
+        entry = self._manifest().get(os.path.abspath(cached))
+        if entry is None:
+            return None
+        try:
+            stamp = source_stamp(path)
+        except OSError:
+            return None
+        if not os.path.exists(cached) or any(entry.get(key) != value for key, value in stamp.items()):
+            return None
+        return cached
+
+    def _load(self, path: str) -> "pygame.mixer.Sound":
+        start = time.perf_counter()
+        asset = os.path.relpath(path, self._root_dir)
+        cached = self._cached(asset, path)
+        sound = self._mixer.Sound(cached or path)
+        self.load_times[asset] = time.perf_counter() - start
+        if cached:
+            self._from_cache.add(asset)
+            return sound
+        try:
+            source_frequency = wav_info(path).frequency
+        except (OSError, ValueError):
+            source_frequency = self._audio.frequency  # not a WAV we can read the header of, whatever SDL says goes
+        if source_frequency != self._audio.frequency:
+            self._resampled[asset] = source_frequency
+        return sound
+
+    def _sound_bytes(self, sound: "pygame.mixer.Sound") -> int:
+        frequency, size, channels = self._mixer.get_init()
+        return round(sound.get_length() * frequency) * channels * abs(size) // 8
+
+    def _evict(self, keep: str) -> None:
+        for mode in list(self._packs):
+            if self.memory_used <= self._memory_budget:
+                return
+            if mode in self._pinned or mode == keep:
+                continue
+            print(f"Sound registry: evicting {mode} ({self._pack_bytes[mode]} bytes)")
+            del self._packs[mode]
+            del self._pack_bytes[mode]
+
+    @property
+    def memory_used(self) -> int:
+        return sum(self._pack_bytes.values()) + sum(self._sound_bytes(s) for s in self._effects.values())
+
+    def soundboard(self, mode: str) -> typing.List["pygame.mixer.Sound"]:
+        """Returns the four bean sounds for a mode, decoding them only if we haven't already."""
+        with self._lock:
+            if mode in self._packs:
+                self._packs.move_to_end(mode)
+                return self._packs[mode]
+            self.init_mixer()
+            sounds = [self._load(path) for path in self._pack_paths(mode)]
+            self._packs[mode] = sounds
+            self._pack_bytes[mode] = sum(self._sound_bytes(s) for s in sounds)
+            self._evict(keep=mode)
+            return sounds
+
+    def effect(self, name: str) -> "pygame.mixer.Sound":
+        """Returns a one-off sound (game over buzzer, cheat jingle), decoded once and kept."""
+        with self._lock:
+            if name not in self._effects:
+                self.init_mixer()
+                self._effects[name] = self._load(os.path.join(self._root_dir, self._effect_paths[name]))
+            return self._effects[name]
+
+    def preload(self, modes: typing.Iterable[str] = (), effects: typing.Iterable[str] = ()) -> None:
+        for mode in modes:
+            self.soundboard(mode)
+        for name in effects:
+            self.effect(name)
+
+    def report(self) -> None:
+        with self._lock:
+            for path, seconds in sorted(self.load_times.items(), key=lambda item: -item[1]):
+                if path in self._from_cache:
+                    resampled = ", pre-converted"
+                elif path in self._resampled:
+                    resampled = f", resampled from {self._resampled[path]}Hz"
+                else:
+                    resampled = ""
+                print(f"Sound registry: {path} decoded in {seconds * 1000:.1f}ms{resampled}")
+            audio = self._audio
+            print(
+                f"Sound registry: mixer at {audio.frequency}Hz {abs(audio.size)}-bit x{audio.channels}, "
+                f"{audio.buffer} sample buffer ({audio.buffer_ms:.1f}ms)"
+            )
+            print(
+                f"Sound registry: {sum(self.load_times.values()) * 1000:.1f}ms total, "
+                f"{self.memory_used} of {self._memory_budget} bytes used"
+            )
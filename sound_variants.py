@@ -0,0 +1,120 @@
+import collections
+import random
+import threading
+import typing
+
+import numpy
+import pygame
+
+# The pitches the dog and cat boards always used, in bean order (espeak -p values)
+BOARD_PITCHES = (0, 50, 75, 100)
+FAIL_CUE_PITCHES = (0, 25, 50, 75, 100)
+# The bases are the espeak default, -p 50
+BASE_PITCH = 50
+# Measured on the shipped clips: every 25 steps of espeak -p is about x1.31 on the
+# fundamental, which works out to an octave per 64 steps
+PITCH_STEPS_PER_OCTAVE = 64
+
+
+def pitch_ratio(pitch: int) -> float:
+    """How much faster to play the base recording to land on an espeak -p pitch."""
+    return 2 ** ((pitch - BASE_PITCH) / PITCH_STEPS_PER_OCTAVE)
+
+
+def resample(samples: numpy.ndarray, ratio: float) -> numpy.ndarray:
+    """
+    Plays samples back `ratio` times faster by linear interpolation, so the pitch goes
+    up by that much and the length down by the same. Works on (samples,) or (samples, channels).
+    """
+    length = max(1, int(len(samples) / ratio))
+    positions = numpy.arange(length) * ratio
+    source = numpy.arange(len(samples))
+    if samples.ndim == 1:
+        resampled = numpy.interp(positions, source, samples)
+    else:
+        resampled = numpy.stack(
+            [numpy.interp(positions, source, samples[:, channel]) for channel in range(samples.shape[1])], axis=1
+        )
+    return numpy.ascontiguousarray(resampled.astype(samples.dtype))
+
+
+class SoundVariants:
+    """
+    One espeak recording per word, and every other pitch of it made on demand with NumPy,
+    instead of a WAV on disk (and a decoded Sound in memory) for every word at every pitch.
+
+    Base samples are decoded once and kept. Pitched variants go in an LRU that drops
+    the least recently played once they're over the memory budget, so any word can be
+    a four-bean board or a fail cue without every combination sitting in RAM.
+
+    Variants play faster as well as higher, like a record sped up. At board pitches
+    a 0.66s woof comes out anywhere from 0.39s (p100) to 1.14s (p0).
+
+    :param registry: the SoundRegistry to decode through, so it's the same mixer
+    :param dict words: word -> its base WAV (espeak -p 50), relative to the registry's root_dir
+    :param int memory_budget: bytes of generated variants kept before the oldest go
+    """
+
+    def __init__(self, registry, words: typing.Dict[str, str], memory_budget: int):
+        self._registry = registry
+        self._words = words
+        self._memory_budget = memory_budget
+        self._lock = threading.RLock()
+        self._mixer = None
+        self._bases: typing.Dict[str, numpy.ndarray] = {}
+        self._variants: typing.OrderedDict[typing.Tuple[str, int], pygame.mixer.Sound] = collections.OrderedDict()
+        self._variant_bytes: typing.Dict[typing.Tuple[str, int], int] = {}
+
+    @property
+    def words(self) -> typing.List[str]:
+        return list(self._words)
+
+    def _check_mixer(self) -> None:
+        # Everything we made belongs to the old mixer if the registry got a new one
+        mixer = self._registry.mixer
+        if mixer is not self._mixer:
+            self._mixer = mixer
+            self._bases.clear()
+            self._variants.clear()
+            self._variant_bytes.clear()
+
+    def _base(self, word: str) -> numpy.ndarray:
+        if word not in self._bases:
+            self._bases[word] = self._mixer.sound_array(self._registry.load(self._words[word]))
+        return self._bases[word]
+
+    @property
+    def memory_used(self) -> int:
+        with self._lock:
+            return sum(base.nbytes for base in self._bases.values()) + sum(self._variant_bytes.values())
+
+    def variant(self, word: str, pitch: int) -> pygame.mixer.Sound:
+        """The word at an espeak -p pitch (0 to 100), made the first time it's asked for."""
+        with self._lock:
+            self._check_mixer()
+            key = (word, pitch)
+            if key in self._variants:
+                self._variants.move_to_end(key)
+                return self._variants[key]
+            base = self._base(word)
+            samples = base if pitch == BASE_PITCH else resample(base, pitch_ratio(pitch))
+            sound = self._mixer.make_sound(samples)
+            self._variants[key] = sound
+            self._variant_bytes[key] = samples.nbytes
+            while sum(self._variant_bytes.values()) > self._memory_budget and len(self._variants) > 1:
+                oldest, _ = self._variants.popitem(last=False)
+                del self._variant_bytes[oldest]
+            return sound
+
+    def board(self, word: str, pitches: typing.Sequence[int] = BOARD_PITCHES) -> typing.List[pygame.mixer.Sound]:
+        """A soundboard out of one word, a pitch per bean."""
+        return [self.variant(word, pitch) for pitch in pitches]
+
+    def fail_cue(
+        self,
+        words: typing.Optional[typing.Sequence[str]] = None,
+        pitches: typing.Sequence[int] = FAIL_CUE_PITCHES,
+        rng: random.Random = random,
+    ) -> pygame.mixer.Sound:
+        """A random word at a random pitch, for when you lose."""
+        return self.variant(rng.choice(words or self.words), rng.choice(pitches))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Speedrun mode's sanic swarm, as one pygame window instead of a hundred xpenguins.
+
+Reads an xpenguins theme (a `config` plus the sprite sheets it names, i.e. exactly
+what scripts/gifToPeng.sh spits out, or one of the themes xpenguins itself installs)
+and walks up to --max-sprites of its walkers across the screen, adding one every
+--spawn-every seconds like sanic.sh used to.
+
+It's built to stay out of the game's way on a Pi:
+
+  * only the rectangles sprites were in or moved to get redrawn each frame
+  * frames are capped at --fps, and sprites move by elapsed time so a slow frame
+    doesn't slow them down, it just makes them jumpier
+  * it renices itself (--nice) so the game's process always wins the CPU
+  * SIGUSR1 drops to --throttled-fps (0 freezes it entirely) and SIGUSR2 goes back
+    to full speed. The game sends those around SAY, where flashes can be 50ms long
+  * SIGTERM/SIGINT exit cleanly, no killall trap needed
+
+Usage: python3 sprite_overlay.py [--theme "Sonic the Hedgehog"] [--max-sprites 101] [--spawn-every 1]
+                                 [--fps 20] [--throttled-fps 2] [--nice 10] [--windowed]
+"""
+import argparse
+import os
+import random
+import signal
+import time
+import typing
+
+
+class Signals:
+    """What the game has asked for by signal so far. The handlers only ever flip these."""
+
+    throttled = False
+    running = True
+
+
+def _on_signal(signum, frame) -> None:
+    if signum == signal.SIGUSR1:
+        Signals.throttled = True
+    elif signum == signal.SIGUSR2:
+        Signals.throttled = False
+    else:
+        Signals.running = False
+
+
+def install_signals() -> None:
+    for signum in (signal.SIGUSR1, signal.SIGUSR2, signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _on_signal)
+    # The game launches us with SIGUSR1/SIGUSR2 blocked, so whatever it sent while the
+    # interpreter was starting up has been waiting for these handlers. Let it through.
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1, signal.SIGUSR2})
+
+
+if __name__ == "__main__":
+    # The game sends SIGUSR1 for the first SAY microseconds after launching us, long
+    # before pygame's imported and the window's up, and SIGUSR1's default is to die.
+    # So the handlers go in before anything else (see LegallyDistinctSimon.launch_overlay()
+    # for what comes in before even that), and SDL is told to keep its own off SIGTERM
+    # and SIGINT.
+    install_signals()
+    os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+
+import pygame
+
+THEME_DIRS = (
+    os.path.expanduser("~/.xpenguins/themes"),
+    "/usr/share/xpenguins/themes",
+    "/usr/local/share/xpenguins/themes",
+)
+DEFAULT_DELAY_MS = 60  # xpenguins' own default frame delay
+WALLPAPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "pawprint-wallpaper.png")
+
+
+class Toon(typing.NamedTuple):
+    """One walker out of a theme: frames[direction][frame], direction 0 walks right and 1 walks left."""
+
+    name: str
+    frames: typing.List[typing.List[pygame.Surface]]
+    speed: int  # pixels per animation frame
+
+
+def find_theme(theme: str) -> str:
+    """A theme name the way xpenguins takes it ("Sonic the Hedgehog"), or a directory."""
+    if os.path.isdir(theme):
+        return theme
+    for themes_dir in THEME_DIRS:
+        path = os.path.join(themes_dir, theme.replace(" ", "_"))
+        if os.path.isfile(os.path.join(path, "config")):
+            return path
+    raise FileNotFoundError(f"No xpenguins theme called {theme!r} in {', '.join(THEME_DIRS)}")
+
+
+def parse_config(path: str) -> typing.Tuple[int, typing.Dict[str, typing.Dict[str, typing.Dict[str, str]]]]:
+    """
+    The bits of an xpenguins config we care about: the frame delay in ms, and for every
+    toon its defines, e.g. {"sanic": {"walker": {"pixmap": "sanic.xpm", "frames": "4", ...}}}.
+    Settings on their own line (like in gifToPeng.sh's "define default" block) belong to
+    the define above them. Anything before the first `toon` line goes under "", which is
+    where theme-wide defaults live (and the only toon, in a theme with no `toon` lines).
+    """
+    delay = DEFAULT_DELAY_MS
+    toons: typing.Dict[str, typing.Dict[str, typing.Dict[str, str]]] = {"": {}}
+    defines = toons[""]
+    current = None
+    with open(path) as config:
+        for line in config:
+            words = line.split("#", 1)[0].split()
+            if not words:
+                continue
+            keyword, rest = words[0], words[1:]
+            if keyword == "delay" and rest:
+                delay = int(rest[0])
+            elif keyword == "toon" and rest:
+                toon_name = rest[0]
+                defines = toons.setdefault(toon_name, {})
+                current = None
+            elif keyword == "define" and rest:
+                current = defines.setdefault(rest[0], {})
+                current.update(zip(rest[1::2], rest[2::2]))
+            elif current is not None:
+                current.update(zip(words[::2], words[1::2]))
+    return delay, toons
+
+
+def load_theme(theme: str) -> typing.Tuple[int, typing.List[Toon]]:
+    """Frame delay and every toon in a theme that has a walker to show."""
+    theme_dir = find_theme(theme)
+    delay, toons = parse_config(os.path.join(theme_dir, "config"))
+    theme_defaults = toons[""].get("default", {})
+    loaded = []
+    for name, defines in toons.items():
+        # gifToPeng.sh puts the real sizes in every define, "define default" is only a fallback
+        walker = {**theme_defaults, **defines.get("default", {}), **defines.get("walker", {})}
+        if "pixmap" not in walker:
+            continue
+        name = name or os.path.basename(theme_dir.rstrip("/"))
+        sheet = pygame.image.load(os.path.join(theme_dir, walker["pixmap"]))
+        frame_count = int(walker.get("frames", 1))
+        directions = int(walker.get("directions", 1))
+        width = int(walker.get("width", sheet.get_width() // frame_count))
+        height = int(walker.get("height", sheet.get_height() // directions))
+        rows = [
+            [sheet.subsurface((frame * width, row * height, width, height)).copy() for frame in range(frame_count)]
+            for row in range(directions)
+        ]
+        if directions == 1:
+            rows.append([pygame.transform.flip(frame, True, False) for frame in rows[0]])
+        loaded.append(Toon(name, rows, int(walker.get("speed", 4))))
+    if not loaded:
+        raise ValueError(f"Theme {theme!r} has no walkers")
+    return delay, loaded
+
+
+class Sprite:
+    def __init__(self, toon: Toon, screen: pygame.Rect, rng: random.Random):
+        self.toon = toon
+        self.direction = rng.randrange(2)
+        width, height = toon.frames[0][0].get_size()
+        # Come in from whichever side we're walking away from, at any height
+        x = -width if self.direction == 0 else screen.width
+        self.rect = pygame.Rect(x, rng.randrange(max(1, screen.height - height)), width, height)
+        self.x = float(x)
+        self.frame = float(rng.randrange(len(toon.frames[0])))
+
+    def step(self, frames: float, screen: pygame.Rect) -> None:
+        """Moves `frames` animation frames' worth, turning around at the edges of the screen."""
+        self.frame = (self.frame + frames) % len(self.toon.frames[self.direction])
+        self.x += self.toon.speed * frames * (1 if self.direction == 0 else -1)
+        if self.direction == 0 and self.x >= screen.width - self.rect.width:
+            self.direction = 1
+        elif self.direction == 1 and self.x <= 0:
+            self.direction = 0
+        self.rect.x = round(self.x)
+
+    @property
+    def image(self) -> pygame.Surface:
+        return self.toon.frames[self.direction][int(self.frame)]
+
+
+class Overlay:
+    """
+    :param list toons: what to spawn, from load_theme()
+    :param int delay_ms: the theme's animation frame delay
+    :param int max_sprites: stop spawning at this many
+    :param float spawn_every: seconds between new sprites
+    :param int fps: frame cap when not throttled
+    :param int throttled_fps: frame cap after SIGUSR1, 0 to stop drawing altogether
+    """
+
+    def __init__(
+        self,
+        toons: typing.List[Toon],
+        delay_ms: int,
+        max_sprites: int = 101,
+        spawn_every: float = 1.0,
+        fps: int = 20,
+        throttled_fps: int = 2,
+        rng: random.Random = random,
+    ):
+        self._toons = toons
+        self._delay = delay_ms / 1000
+        self._max_sprites = max_sprites
+        self._spawn_every = spawn_every
+        self._fps = fps
+        self._throttled_fps = throttled_fps
+        self._rng = rng
+        self.sprites: typing.List[Sprite] = []
+        self.frames_drawn = 0
+
+    @property
+    def throttled(self) -> bool:
+        return Signals.throttled
+
+    @property
+    def running(self) -> bool:
+        return Signals.running
+
+    def run(self, screen: pygame.Surface, background: pygame.Surface) -> None:
+        bounds = screen.get_rect()
+        screen.blit(background, (0, 0))
+        pygame.display.flip()
+        clock = pygame.time.Clock()
+        last = time.monotonic()
+        next_spawn = last
+        while self.running:
+            if self.throttled and not self._throttled_fps:
+                # Frozen: nothing moves, nothing draws, just wait to be let go
+                time.sleep(0.25)
+                last = time.monotonic()
+                next_spawn = max(next_spawn, last)
+                continue
+            clock.tick(self._throttled_fps if self.throttled else self._fps)
+            pygame.event.pump()
+            now = time.monotonic()
+            while len(self.sprites) < self._max_sprites and now >= next_spawn:
+                self.sprites.append(Sprite(self._rng.choice(self._toons), bounds, self._rng))
+                next_spawn += self._spawn_every
+            frames = (now - last) / self._delay
+            last = now
+
+            dirty = []
+            for sprite in self.sprites:
+                dirty.append(sprite.rect.copy())
+                screen.blit(background, sprite.rect, sprite.rect)
+            for sprite in self.sprites:
+                sprite.step(frames, bounds)
+                screen.blit(sprite.image, sprite.rect)
+                dirty.append(sprite.rect.copy())
+            pygame.display.update(dirty)
+            self.frames_drawn += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--theme", default="Sonic the Hedgehog", help="xpenguins theme name or directory")
+    parser.add_argument("--max-sprites", type=int, default=101)
+    parser.add_argument("--spawn-every", type=float, default=1.0, help="seconds between new sprites")
+    parser.add_argument("--fps", type=int, default=20)
+    parser.add_argument("--throttled-fps", type=int, default=2, help="frame cap after SIGUSR1, 0 freezes")
+    parser.add_argument("--nice", type=int, default=10, help="how much lower than the game to run")
+    parser.add_argument("--windowed", action="store_true", help="a window instead of the whole screen")
+    args = parser.parse_args()
+
+    os.nice(args.nice)
+    os.environ.setdefault("DISPLAY", ":0")
+    overlay = None
+    pygame.display.init()
+    try:
+        if args.windowed:
+            screen = pygame.display.set_mode((800, 480))
+        else:
+            screen = pygame.display.set_mode((0, 0), pygame.NOFRAME)
+        pygame.display.set_caption("GOTTA GO FAST")
+        pygame.mouse.set_visible(False)
+        delay, toons = load_theme(args.theme)
+        # The cabinet's desktop is the wallpaper, so "over the desktop" is just drawing on it
+        background = pygame.Surface(screen.get_size())
+        if os.path.exists(WALLPAPER):
+            background.blit(pygame.transform.smoothscale(pygame.image.load(WALLPAPER).convert(), screen.get_size()), (0, 0))
+        print(f"Sprite overlay: {len(toons)} toons from {args.theme}, {screen.get_width()}x{screen.get_height()}")
+        overlay = Overlay(toons, delay, args.max_sprites, args.spawn_every, args.fps, args.throttled_fps)
+        overlay.run(screen, background.convert())
+    finally:
+        if overlay is not None:
+            print(f"Sprite overlay: drew {overlay.frames_drawn} frames of {len(overlay.sprites)} sprites")
+        pygame.display.quit()
+
+
+if __name__ == "__main__":
+    main()
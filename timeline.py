@@ -0,0 +1,111 @@
+import collections
+import statistics
+import time
+import typing
+
+
+class TimelineEvent(typing.NamedTuple):
+    at: float  # seconds after the timeline starts
+    label: str  # what kind of event this is, lateness stats are kept per label
+    action: typing.Callable[[], typing.Any]
+
+
+class Timeline:
+    """
+    A precomputed list of things to do at fixed offsets, e.g. a whole SAY sequence
+    of light on / sound start / sound stop / light off. Events at the same offset
+    run in the order they were added.
+    """
+
+    def __init__(self):
+        self._events: typing.List[TimelineEvent] = []
+        self.end: float = 0.0  # play() doesn't return before this, for trailing gaps
+
+    def add(self, at: float, label: str, action: typing.Callable[[], typing.Any]) -> None:
+        self._events.append(TimelineEvent(at, label, action))
+        self.end = max(self.end, at)
+
+    def events(self) -> typing.List[TimelineEvent]:
+        return sorted(self._events, key=lambda event: event.at)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class Scheduler:
+    """
+    Plays Timelines against absolute time.monotonic() deadlines, so one late event
+    doesn't push every event after it back the way chained waits do.
+
+    Sleeping is coarse, so we sleep until just before each deadline and spin the
+    rest of the way. How much the OS oversleeps gets measured on every sleep and
+    fed back into the next one, and how late every event actually ran gets kept per
+    label for stats().
+
+    :param float spin: how close to a deadline we stop sleeping and start spinning
+    :param int history: lateness samples kept per label
+    """
+
+    def __init__(
+        self,
+        spin: float = 0.001,
+        history: int = 1000,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ):
+        self._spin = spin
+        self._clock = clock
+        self._sleep = sleep
+        self._oversleep = 0.0  # running estimate of how much longer sleep() takes than asked
+        self._history = history
+        self._lateness: typing.Dict[str, typing.Deque[float]] = {}
+
+    def _sleep_until(self, deadline: float) -> None:
+        while True:
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                return
+            asked = remaining - self._oversleep - self._spin
+            if asked <= 0:
+                continue  # close enough to spin
+            started = self._clock()
+            self._sleep(asked)
+            overslept = max(0.0, self._clock() - started - asked)
+            # Exponentially weighted, so one bad wakeup doesn't wreck the next ten
+            self._oversleep += (overslept - self._oversleep) / 8
+
+    def play(self, timeline: Timeline, start: typing.Optional[float] = None) -> float:
+        """Runs every event at start + event.at. Returns when the timeline ends."""
+        if start is None:
+            start = self._clock()
+        for event in timeline.events():
+            deadline = start + event.at
+            self._sleep_until(deadline)
+            lateness = self._clock() - deadline
+            event.action()
+            samples = self._lateness.get(event.label)
+            if samples is None:
+                samples = self._lateness[event.label] = collections.deque(maxlen=self._history)
+            samples.append(lateness)
+        self._sleep_until(start + timeline.end)
+        return start + timeline.end
+
+    def stats(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        """Per label: how many events, and median / p95 / max lateness in ms."""
+        stats = {}
+        for label, samples in self._lateness.items():
+            ordered = sorted(samples)
+            stats[label] = {
+                "count": len(ordered),
+                "median_ms": statistics.median(ordered) * 1000,
+                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return stats
+
+    def report(self) -> None:
+        for label, stat in sorted(self.stats().items()):
+            print(
+                f"Scheduler: {label} x{stat['count']} late by median {stat['median_ms']:.2f}ms "
+                f"p95 {stat['p95_ms']:.2f}ms max {stat['max_ms']:.2f}ms"
+            )
@@ -0,0 +1,179 @@
+"""
+Cheap latency tracing for the hot paths: how long presses, serial writes and sound
+calls take, so when the cabinet feels laggy we can tell whether it's GPIO, the serial
+port or the mixer.
+
+Off unless SIMON_TRACE is set in the environment, and then every traced call costs a
+couple of perf_counter_ns() calls and some array writes. Nothing gets allocated per
+event: spans go into a preallocated ring buffer (the last `capacity` of them, for
+seeing what order things happened in) and into a per-span log-bucketed histogram in
+the style of HdrHistogram (for percentiles over the whole run, at ~3% precision).
+
+Histograms and the tail of the ring get printed on SIGUSR1 and at exit:
+
+    SIMON_TRACE=1 python3 LegallyDistinctSimon.py
+    kill -USR1 <pid>
+"""
+import array
+import atexit
+import functools
+import os
+import signal
+import threading
+import time
+import typing
+
+# Values below SUB_BUCKETS microseconds are exact, above that every power of two is
+# split into SUB_BUCKETS / 2 buckets
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_BUCKETS = SUB_BUCKETS // 2
+# Enough magnitudes to reach a couple of days in microseconds, anything longer is clamped
+MAGNITUDES = 32
+NUM_BUCKETS = SUB_BUCKETS + MAGNITUDES * HALF_BUCKETS
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9, 100.0)
+
+
+def bucket_index(micros: int) -> int:
+    if micros < SUB_BUCKETS:
+        return max(micros, 0)
+    # Keep the top SUB_BUCKET_BITS bits, the first of which is always set
+    shift = micros.bit_length() - SUB_BUCKET_BITS
+    top = micros >> shift
+    return min(SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + top - HALF_BUCKETS, NUM_BUCKETS - 1)
+
+
+def bucket_value(index: int) -> int:
+    """The smallest value, in microseconds, that lands in a bucket."""
+    if index < SUB_BUCKETS:
+        return index
+    shift, top = divmod(index - SUB_BUCKETS, HALF_BUCKETS)
+    return (top + HALF_BUCKETS) << (shift + 1)
+
+
+class Tracer:
+    """
+    :param int capacity: spans kept in the ring buffer
+    :param bool enabled: record anything at all
+    """
+
+    def __init__(self, capacity: int = 65536, enabled: bool = False):
+        self.enabled = enabled
+        self._capacity = capacity
+        # Reentrant, because the SIGUSR1 dump can land while this same thread is mid-record()
+        self._lock = threading.RLock()
+        self._names: typing.List[str] = []
+        self._ids: typing.Dict[str, int] = {}
+        self._histograms: typing.List[array.array] = []
+        self._max: typing.List[int] = []
+        # The ring: which span, when it started, how long it took (both ns)
+        self._ring_span = array.array("H", bytes(2 * capacity))
+        self._ring_start = array.array("q", bytes(8 * capacity))
+        self._ring_duration = array.array("q", bytes(8 * capacity))
+        self._recorded = 0
+        self._epoch = time.perf_counter_ns()
+
+    def span(self, name: str) -> int:
+        """Registers a span name (once, up front) and returns the id to record it with."""
+        with self._lock:
+            if name not in self._ids:
+                self._ids[name] = len(self._names)
+                self._names.append(name)
+                self._histograms.append(array.array("Q", bytes(8 * NUM_BUCKETS)))
+                self._max.append(0)
+            return self._ids[name]
+
+    def begin(self) -> int:
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def end(self, span: int, started: int) -> None:
+        if self.enabled:
+            self.record(span, started, time.perf_counter_ns() - started)
+
+    def record(self, span: int, started: int, duration: int) -> None:
+        """For when the start came from somewhere else, e.g. the timestamp on a button edge."""
+        if not self.enabled:
+            return
+        with self._lock:
+            slot = self._recorded % self._capacity
+            self._ring_span[slot] = span
+            self._ring_start[slot] = started
+            self._ring_duration[slot] = duration
+            self._recorded += 1
+            self._histograms[span][bucket_index(duration // 1000)] += 1
+            if duration > self._max[span]:
+                self._max[span] = duration
+
+    def since(self, span: int, monotonic_start: float) -> None:
+        """Records a span that started on the time.monotonic() clock, like a ButtonEvent timestamp."""
+        if not self.enabled:
+            return
+        duration = round((time.monotonic() - monotonic_start) * 1e9)
+        self.record(span, time.perf_counter_ns() - duration, duration)
+
+    def traced(self, name: str):
+        """Decorator that records every call of a function as one span."""
+        span = self.span(name)
+
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                started = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(span, started, time.perf_counter_ns() - started)
+
+            return wrapper
+
+        return decorate
+
+    def percentiles(self, span: int) -> typing.Tuple[int, typing.Dict[float, float]]:
+        """How many times a span was recorded, and PERCENTILES of its duration in ms."""
+        with self._lock:
+            histogram = list(self._histograms[span])
+            longest = self._max[span]
+        count = sum(histogram)
+        results = {}
+        if not count:
+            return 0, results
+        seen = 0
+        index = 0
+        for percentile in PERCENTILES:
+            wanted = max(1, -(-count * percentile // 100))
+            while seen + histogram[index] < wanted:
+                seen += histogram[index]
+                index += 1
+            results[percentile] = bucket_value(index) / 1000
+        results[100.0] = longest / 1e6
+        return count, results
+
+    def dump(self, tail: int = 32) -> None:
+        print(f"Trace: {self._recorded} spans recorded")
+        for span, name in enumerate(list(self._names)):
+            count, results = self.percentiles(span)
+            if count:
+                spread = " ".join(f"p{p:g} {ms:.3f}ms" for p, ms in results.items() if p != 100.0)
+                print(f"Trace: {name} x{count} {spread} max {results[100.0]:.3f}ms")
+        with self._lock:
+            newest = self._recorded
+            oldest = max(0, newest - min(tail, self._capacity))
+            recent = [
+                (self._ring_span[i % self._capacity], self._ring_start[i % self._capacity], self._ring_duration[i % self._capacity])
+                for i in range(oldest, newest)
+            ]
+        for span, started, duration in sorted(recent, key=lambda entry: entry[1]):
+            print(f"Trace: @{(started - self._epoch) / 1e6:12.3f}ms {self._names[span]} {duration / 1e6:.3f}ms")
+
+    def install(self) -> None:
+        """Dump on SIGUSR1 and at exit. Only does anything when tracing is on."""
+        if not self.enabled:
+            return
+        atexit.register(self.dump)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump())
+
+
+TRACER = Tracer(enabled=bool(os.environ.get("SIMON_TRACE")))